@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class BillingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.billing'
\ No newline at end of file
+    name = 'apps.billing'
+    
+    def ready(self):
+        from apps.billing import signals  # noqa: F401
\ No newline at end of file
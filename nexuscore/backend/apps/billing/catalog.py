@@ -0,0 +1,206 @@
+"""
+In-process plan catalog for NexusCore billing.
+
+Active plans are loaded once per process and their derived values (monthly/annual
+pairing, annual amounts, savings, feature and limit maps) are precomputed. A version
+token in Redis is rotated whenever a Plan changes so every process reloads lazily.
+"""
+
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'billing:plan_catalog:version'
+
+_lock = threading.Lock()
+_catalog = None
+_checked_at = 0.0
+
+
+def base_sku(sku):
+    """Return the SKU family shared by the monthly and annual variants of a plan."""
+    return sku.split('-')[0]
+
+
+def compute_savings_percentage(annual_amount_cents, monthly_amount_cents):
+    """Percentage saved by paying annually instead of twelve monthly payments."""
+    if not monthly_amount_cents:
+        return 0
+    monthly_equivalent = annual_amount_cents / 12
+    return int(((monthly_amount_cents - monthly_equivalent) / monthly_amount_cents) * 100)
+
+
+@dataclass(frozen=True)
+class CatalogPlan:
+    """Immutable snapshot of a Plan with its derived pricing values."""
+    
+    id: str
+    sku: str
+    name: str
+    description: str
+    billing_period: str
+    amount_cents: int
+    currency: str
+    annual_amount_cents: int
+    savings_percentage: int
+    features: MappingProxyType
+    limits: MappingProxyType
+    is_visible: bool
+    display_order: int
+    stripe_price_id: str
+    monthly_sku: str
+    annual_sku: str
+    
+    @property
+    def amount_dollars(self):
+        """Return amount in dollars (SGD)."""
+        return self.amount_cents / 100
+    
+    def has_feature(self, name):
+        """Check whether the plan enables a boolean feature flag."""
+        return bool(self.features.get(name, False))
+    
+    def limit(self, name, default=None):
+        """Return a plan limit such as seats or API calls."""
+        return self.limits.get(name, default)
+
+
+class PlanCatalog:
+    """All active plans indexed by SKU and id, with visible plans pre-sorted."""
+    
+    def __init__(self, plans, version):
+        self.version = version
+        monthly_by_base = {
+            base_sku(plan.sku): plan
+            for plan in plans
+            if plan.billing_period == 'month'
+        }
+        annual_by_base = {
+            base_sku(plan.sku): plan
+            for plan in plans
+            if plan.billing_period == 'year'
+        }
+        
+        entries = []
+        for plan in plans:
+            family = base_sku(plan.sku)
+            monthly = monthly_by_base.get(family)
+            annual = annual_by_base.get(family)
+            if plan.billing_period == 'year':
+                annual_amount_cents = plan.amount_cents
+                savings = (
+                    compute_savings_percentage(plan.amount_cents, monthly.amount_cents)
+                    if monthly else 0
+                )
+            else:
+                annual_amount_cents = plan.amount_cents * 12
+                savings = 0
+            entries.append(CatalogPlan(
+                id=str(plan.id),
+                sku=plan.sku,
+                name=plan.name,
+                description=plan.description,
+                billing_period=plan.billing_period,
+                amount_cents=plan.amount_cents,
+                currency=plan.currency,
+                annual_amount_cents=annual_amount_cents,
+                savings_percentage=savings,
+                features=MappingProxyType(dict(plan.features or {})),
+                limits=MappingProxyType(dict(plan.limits or {})),
+                is_visible=plan.is_visible,
+                display_order=plan.display_order,
+                stripe_price_id=plan.stripe_price_id,
+                monthly_sku=monthly.sku if monthly else '',
+                annual_sku=annual.sku if annual else '',
+            ))
+        
+        self._by_sku = {entry.sku: entry for entry in entries}
+        self._by_id = {entry.id: entry for entry in entries}
+        self._monthly_by_base = {
+            family: self._by_sku[plan.sku] for family, plan in monthly_by_base.items()
+        }
+        # Plans arrive in Plan.Meta.ordering (display_order, created_at)
+        self.visible = tuple(entry for entry in entries if entry.is_visible)
+    
+    def __len__(self):
+        return len(self._by_sku)
+    
+    def __iter__(self):
+        return iter(self._by_sku.values())
+    
+    def get(self, sku):
+        """Return the catalog entry for a SKU, or None if inactive/unknown."""
+        return self._by_sku.get(sku)
+    
+    def get_by_id(self, plan_id):
+        """Return the catalog entry for a plan id, or None if inactive/unknown."""
+        return self._by_id.get(str(plan_id))
+    
+    def monthly_for(self, sku):
+        """Return the active monthly plan in the same SKU family."""
+        return self._monthly_by_base.get(base_sku(sku))
+    
+    def pairs(self):
+        """Yield (monthly, annual) entries for every SKU family; either may be None."""
+        families = {}
+        for entry in self._by_sku.values():
+            slot = 0 if entry.billing_period == 'month' else 1
+            families.setdefault(base_sku(entry.sku), [None, None])[slot] = entry
+        for monthly, annual in families.values():
+            yield monthly, annual
+
+
+def _current_version():
+    """Read the shared catalog version, creating one if Redis has none."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def _load_catalog(version):
+    from apps.billing.models import Plan
+    
+    plans = list(Plan.objects.filter(is_active=True))
+    return PlanCatalog(plans, version)
+
+
+def get_plan_catalog():
+    """
+    Return the process-local plan catalog, reloading it if the shared version moved.
+    
+    The Redis version is consulted at most once per
+    PLAN_CATALOG_VERSION_CHECK_SECONDS, so steady-state lookups touch neither
+    Postgres nor Redis.
+    """
+    global _catalog, _checked_at
+    
+    interval = getattr(settings, 'PLAN_CATALOG_VERSION_CHECK_SECONDS', 5)
+    now = time.monotonic()
+    catalog = _catalog
+    if catalog is not None and now - _checked_at < interval:
+        return catalog
+    
+    with _lock:
+        if _catalog is not None and now - _checked_at < interval:
+            return _catalog
+        version = _current_version()
+        if _catalog is None or _catalog.version != version:
+            _catalog = _load_catalog(version)
+        _checked_at = now
+        return _catalog
+
+
+def invalidate_plan_catalog():
+    """Rotate the shared version so every process reloads on its next check."""
+    global _catalog
+    
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    with _lock:
+        _catalog = None
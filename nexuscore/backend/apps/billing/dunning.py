@@ -0,0 +1,182 @@
+"""
+Dunning pipeline for overdue invoices.
+
+Open invoices past due are streamed with a keyset scan over the idx_overdue_invoices
+partial index in (organization, due_date, id) order, so each organization's overdue
+invoices arrive contiguously and become one reminder. Reminders are sent in batches
+over a reused mail connection, and the DunningRun checkpoint is advanced after every
+organization so a crashed run resumes where it stopped. Delivery is at-least-once:
+a crash between sending a reminder and checkpointing it resends that one reminder.
+"""
+
+import logging
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from apps.billing.models import DunningRun, Invoice
+from apps.billing.pdf import format_cents
+
+logger = logging.getLogger(__name__)
+
+OVERDUE_INVOICE_FIELDS = (
+    'id', 'organization_id', 'organization__name', 'organization__billing_email',
+    'stripe_invoice_id', 'currency', 'due_date', 'total_amount_cents', 'amount_paid_cents',
+)
+
+
+def iter_overdue_invoices(as_of, after_organization_id=None, page_size=1000):
+    """Yield overdue open invoices as dicts, ordered by (organization, due_date, id)."""
+    base = Invoice.objects.filter(status='open', due_date__lt=as_of)
+    if after_organization_id is not None:
+        base = base.filter(organization_id__gt=after_organization_id)
+    
+    cursor = None
+    while True:
+        queryset = base
+        if cursor is not None:
+            org_id, due_date, invoice_id = cursor
+            queryset = queryset.filter(
+                Q(organization_id__gt=org_id)
+                | Q(organization_id=org_id, due_date__gt=due_date)
+                | Q(organization_id=org_id, due_date=due_date, id__gt=invoice_id)
+            )
+        page = list(
+            queryset.order_by('organization_id', 'due_date', 'id')
+            .values(*OVERDUE_INVOICE_FIELDS)[:page_size]
+        )
+        if not page:
+            return
+        yield from page
+        last = page[-1]
+        cursor = (last['organization_id'], last['due_date'], last['id'])
+
+
+def iter_overdue_groups(as_of, after_organization_id=None, page_size=1000):
+    """Yield (organization_id, [invoice dicts]) with one group per organization."""
+    current_org = None
+    group = []
+    for invoice in iter_overdue_invoices(as_of, after_organization_id, page_size):
+        if invoice['organization_id'] != current_org and group:
+            yield current_org, group
+            group = []
+        current_org = invoice['organization_id']
+        group.append(invoice)
+    if group:
+        yield current_org, group
+
+
+def build_reminder(invoices, as_of):
+    """Build the reminder email for one organization's overdue invoices."""
+    first = invoices[0]
+    outstanding_by_currency = defaultdict(int)
+    lines = []
+    for invoice in invoices:
+        outstanding = invoice['total_amount_cents'] - invoice['amount_paid_cents']
+        outstanding_by_currency[invoice['currency']] += outstanding
+        lines.append({
+            'reference': invoice['stripe_invoice_id'],
+            'currency': invoice['currency'],
+            'outstanding': format_cents(outstanding),
+            'due_date': invoice['due_date'],
+            'days_overdue': (as_of - invoice['due_date']).days,
+        })
+    supplier_name = getattr(settings, 'INVOICE_SUPPLIER', {}).get('name', 'NexusCore')
+    body = render_to_string('billing/dunning_reminder.txt', {
+        'organization_name': first['organization__name'],
+        'invoices': lines,
+        'total_outstanding': ', '.join(
+            f"{currency} {format_cents(cents)}"
+            for currency, cents in sorted(outstanding_by_currency.items())
+        ),
+        'supplier_name': supplier_name,
+    })
+    subject = (
+        f"Payment reminder: {len(invoices)} overdue invoice"
+        f"{'' if len(invoices) == 1 else 's'}"
+    )
+    return EmailMessage(
+        subject=subject,
+        body=body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[first['organization__billing_email']],
+    )
+
+
+def _get_or_resume_run(as_of):
+    run, created = DunningRun.objects.get_or_create(
+        run_date=timezone.localdate(as_of),
+        defaults={'as_of': as_of},
+    )
+    if not created and run.status == 'running':
+        logger.info(
+            f"Resuming dunning run {run.run_date} after organization "
+            f"{run.last_organization_id} ({run.organizations_notified} already notified)"
+        )
+    return run
+
+
+def run_dunning(as_of=None, batch_size=None, connection=None, page_size=1000):
+    """
+    Send one reminder per organization with overdue open invoices.
+    
+    Runs are keyed by calendar day; calling this again on the same day resumes an
+    interrupted run and is a no-op once the run has completed.
+    """
+    run = _get_or_resume_run(as_of or timezone.now())
+    if run.status == 'completed':
+        logger.info(f"Dunning run {run.run_date} already completed")
+        return run
+    
+    batch_size = batch_size or getattr(settings, 'DUNNING_EMAIL_BATCH_SIZE', 100)
+    connection = connection or get_connection()
+    started = time.perf_counter()
+    sent = 0
+    
+    groups = iter_overdue_groups(run.as_of, run.last_organization_id, page_size)
+    in_batch = 0
+    try:
+        for organization_id, invoices in groups:
+            if invoices[0]['organization__billing_email']:
+                if in_batch == 0:
+                    connection.open()
+                connection.send_messages([build_reminder(invoices, run.as_of)])
+                in_batch += 1
+                sent += 1
+                run.organizations_notified += 1
+            else:
+                logger.warning(f"Organization {organization_id} has no billing email; skipping")
+            run.invoices_included += len(invoices)
+            
+            # Checkpoint right after sending: a crash before this line resends only
+            # this organization's reminder on resume (at-least-once delivery)
+            DunningRun.objects.filter(pk=run.pk).update(
+                last_organization_id=organization_id,
+                organizations_notified=run.organizations_notified,
+                invoices_included=run.invoices_included,
+                updated_at=timezone.now(),
+            )
+            
+            if in_batch >= batch_size:
+                connection.close()
+                in_batch = 0
+                logger.info(f"Dunning: {sent} reminders sent ({sent / (time.perf_counter() - started):.1f}/s)")
+    finally:
+        if in_batch:
+            connection.close()
+    
+    run.refresh_from_db()
+    run.status = 'completed'
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'finished_at', 'updated_at'])
+    logger.info(
+        f"Dunning run {run.run_date} complete: {run.organizations_notified} organizations, "
+        f"{run.invoices_included} invoices, {sent} reminders this pass in "
+        f"{time.perf_counter() - started:.2f}s"
+    )
+    return run
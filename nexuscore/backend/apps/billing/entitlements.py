@@ -0,0 +1,171 @@
+"""
+Compiled per-organization entitlements for NexusCore.
+
+An organization's effective features and limits are compiled once from its active
+Subscription's Plan into an immutable Entitlements object. Compiled objects are
+cached per process and in Redis under a key built from two version tokens: one per
+organization (rotated on subscription changes) and one shared by all organizations
+(rotated on plan changes). Feature checks are then dictionary lookups.
+"""
+
+import threading
+import time
+import uuid
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import cache
+
+ORG_VERSION_KEY = 'entitlements:version:{organization_id}'
+PLAN_VERSION_KEY = 'entitlements:version:plans'
+COMPILED_KEY = 'entitlements:{organization_id}:{org_version}:{plan_version}'
+
+ENTITLED_STATUSES = ('active', 'trialing')
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+class Entitlements:
+    """Immutable, compiled view of what an organization's plan allows."""
+    
+    __slots__ = ('organization_id', 'plan_sku', 'status', 'features', 'limits', 'version')
+    
+    def __init__(self, organization_id, plan_sku, status, features, limits, version):
+        object.__setattr__(self, 'organization_id', organization_id)
+        object.__setattr__(self, 'plan_sku', plan_sku)
+        object.__setattr__(self, 'status', status)
+        object.__setattr__(self, 'features', MappingProxyType(dict(features)))
+        object.__setattr__(self, 'limits', MappingProxyType(dict(limits)))
+        object.__setattr__(self, 'version', version)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError('Entitlements are immutable')
+    
+    def __repr__(self):
+        return f"<Entitlements {self.organization_id} plan={self.plan_sku or '-'} status={self.status or '-'}>"
+    
+    def has(self, feature):
+        """Whether a feature flag is enabled."""
+        return bool(self.features.get(feature, False))
+    
+    def limit(self, name, default=None):
+        """A numeric plan limit (seats, API calls, storage ...)."""
+        return self.limits.get(name, default)
+    
+    def as_dict(self):
+        return {
+            'organization_id': self.organization_id,
+            'plan_sku': self.plan_sku,
+            'status': self.status,
+            'features': dict(self.features),
+            'limits': dict(self.limits),
+        }
+
+
+def _organization_id(organization):
+    return str(getattr(organization, 'pk', organization))
+
+
+def _versions(organization_id):
+    """Fetch both version tokens in one round trip, creating any that are missing."""
+    org_key = ORG_VERSION_KEY.format(organization_id=organization_id)
+    found = cache.get_many([org_key, PLAN_VERSION_KEY])
+    for key in (org_key, PLAN_VERSION_KEY):
+        if key not in found:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            found[key] = cache.get(key)
+    return found[org_key], found[PLAN_VERSION_KEY]
+
+
+def compile_entitlements(organization_id, version=None):
+    """Build Entitlements from the organization's active subscription (hits the database)."""
+    from apps.billing.models import Subscription
+    
+    # Read the plan straight from the database: a process-local plan catalog may
+    # lag a plan change and would pin stale values under the new version key.
+    subscription = (
+        Subscription.objects
+        .filter(organization_id=organization_id, status__in=ENTITLED_STATUSES)
+        .order_by('-created_at')
+        .values('status', 'plan__sku', 'plan__features', 'plan__limits')
+        .first()
+    )
+    defaults = getattr(settings, 'DEFAULT_ENTITLEMENTS', {})
+    features = dict(defaults.get('features', {}))
+    limits = dict(defaults.get('limits', {}))
+    plan_sku = ''
+    status = ''
+    
+    if subscription:
+        status = subscription['status']
+        plan_sku = subscription['plan__sku']
+        features.update(subscription['plan__features'] or {})
+        limits.update(subscription['plan__limits'] or {})
+    
+    return Entitlements(organization_id, plan_sku, status, features, limits, version)
+
+
+def get_entitlements(organization):
+    """
+    Return the compiled Entitlements for an organization.
+    
+    Within ENTITLEMENTS_VERSION_CHECK_SECONDS of the last check the process-local
+    copy is returned without any I/O; otherwise one Redis round trip validates it.
+    """
+    organization_id = _organization_id(organization)
+    interval = getattr(settings, 'ENTITLEMENTS_VERSION_CHECK_SECONDS', 5)
+    now = time.monotonic()
+    
+    cached = _local.get(organization_id)
+    if cached is not None and now - cached[1] < interval:
+        return cached[0]
+    
+    org_version, plan_version = _versions(organization_id)
+    version = (org_version, plan_version)
+    if cached is not None and cached[0].version == version:
+        entitlements = cached[0]
+    else:
+        compiled_key = COMPILED_KEY.format(
+            organization_id=organization_id,
+            org_version=org_version,
+            plan_version=plan_version,
+        )
+        data = cache.get(compiled_key)
+        if data is None:
+            entitlements = compile_entitlements(organization_id, version)
+            cache.set(
+                compiled_key,
+                entitlements.as_dict(),
+                timeout=getattr(settings, 'ENTITLEMENTS_CACHE_TIMEOUT', 24 * 3600),
+            )
+        else:
+            entitlements = Entitlements(version=version, **data)
+    
+    with _local_lock:
+        if len(_local) >= getattr(settings, 'ENTITLEMENTS_LOCAL_CACHE_SIZE', 10000):
+            _local.clear()
+        _local[organization_id] = (entitlements, now)
+    return entitlements
+
+
+def has_feature(organization, feature):
+    return get_entitlements(organization).has(feature)
+
+
+def get_limit(organization, name, default=None):
+    return get_entitlements(organization).limit(name, default)
+
+
+def invalidate_entitlements(organization):
+    """Rotate an organization's version after its subscription changes."""
+    organization_id = _organization_id(organization)
+    cache.set(ORG_VERSION_KEY.format(organization_id=organization_id), uuid.uuid4().hex, timeout=None)
+    _local.pop(organization_id, None)
+
+
+def invalidate_all_entitlements():
+    """Rotate the shared plan version after any plan's features or limits change."""
+    cache.set(PLAN_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    with _local_lock:
+        _local.clear()
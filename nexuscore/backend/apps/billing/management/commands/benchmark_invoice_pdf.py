@@ -0,0 +1,93 @@
+"""
+Benchmark invoice PDF rendering throughput per core.
+
+Renders synthetic invoices in memory (no database or storage access) across a pool
+of worker processes, each holding its own pre-loaded InvoicePDFRenderer.
+"""
+
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.billing.models import Invoice
+from apps.billing.pdf import get_renderer
+from apps.organizations.models import Organization
+
+
+def _synthetic_invoice(index):
+    organization = Organization(
+        id=uuid.uuid4(),
+        name=f"Benchmark Customer {index} Pte. Ltd.",
+        uen='201912345K',
+        billing_email='billing@example.com',
+    )
+    now = timezone.now()
+    invoice = Invoice(
+        id=uuid.uuid4(),
+        organization=organization,
+        subtotal_cents=12900,
+        status='open',
+        due_date=now + timezone.timedelta(days=7),
+        stripe_invoice_id=f"bench_{index}",
+        line_items=[{
+            'description': 'Professional (monthly)',
+            'amount_cents': 12900,
+            'period_start': now.isoformat(),
+            'period_end': (now + timezone.timedelta(days=30)).isoformat(),
+        }],
+    )
+    invoice.created_at = now
+    # Generated columns are normally returned by PostgreSQL
+    invoice.gst_amount_cents = round(invoice.subtotal_cents * float(invoice.gst_rate))
+    invoice.total_amount_cents = invoice.subtotal_cents + invoice.gst_amount_cents
+    return invoice
+
+
+def _render_many(count):
+    renderer = get_renderer()
+    invoices = [_synthetic_invoice(index) for index in range(count)]
+    started = time.perf_counter()
+    total_bytes = 0
+    for invoice in invoices:
+        total_bytes += len(renderer.render(invoice))
+    return count, time.perf_counter() - started, total_bytes
+
+
+class Command(BaseCommand):
+    help = 'Measure invoice PDFs rendered per second per core.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200,
+                            help='Invoices rendered by each process')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    
+    def handle(self, *args, **options):
+        count = options['count']
+        processes = options['processes']
+        context = multiprocessing.get_context('fork')
+        
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=context,
+            initializer=get_renderer,
+        ) as executor:
+            started = time.perf_counter()
+            results = list(executor.map(_render_many, [count] * processes))
+            wall_seconds = time.perf_counter() - started
+        
+        rendered = sum(result[0] for result in results)
+        for index, (done, seconds, total_bytes) in enumerate(results, start=1):
+            self.stdout.write(
+                f"process {index}: {done} PDFs in {seconds:.2f}s "
+                f"({done / seconds:.1f}/s, avg {total_bytes // max(done, 1)} bytes)"
+            )
+        per_core = sum(done / seconds for done, seconds, _ in results) / len(results)
+        self.stdout.write(self.style.SUCCESS(
+            f"{rendered} PDFs on {processes} processes in {wall_seconds:.2f}s: "
+            f"{rendered / wall_seconds:.1f}/s aggregate, {per_core:.1f}/s per core"
+        ))
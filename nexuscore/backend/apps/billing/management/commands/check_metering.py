@@ -0,0 +1,62 @@
+"""
+Exercise usage metering against a real Redis and Postgres, including a flush that
+"crashes" after committing to Postgres but before cleaning up Redis.
+"""
+
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.billing import metering
+from apps.billing.models import UsageRecord
+
+
+class Command(BaseCommand):
+    help = 'Verify that metered usage is flushed exactly once across a simulated crash.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('organization', help='Organization id to record usage against')
+        parser.add_argument('--metric', default='api_calls')
+        parser.add_argument('--increments', type=int, default=1000)
+    
+    def _flushed(self, organization_id, metric, period):
+        return UsageRecord.objects.filter(
+            organization_id=organization_id, metric=metric, period=period
+        ).values_list('quantity', flat=True).first() or 0
+    
+    def handle(self, *args, **options):
+        organization_id = options['organization']
+        metric = options['metric']
+        increments = options['increments']
+        period = metering.metric_period(metric)
+        
+        metering.flush_usage()
+        before = self._flushed(organization_id, metric, period)
+        
+        for _ in range(increments):
+            metering.record_usage(organization_id, metric, enforce=False)
+        
+        # Claim and apply a batch, then "crash" before the Redis cleanup
+        redis = metering._redis()
+        batch_id = uuid.uuid4().hex
+        batch_key = metering.FLUSHING_KEY.format(batch_id=batch_id)
+        metering._script('claim', metering.CLAIM_PENDING_SCRIPT)(
+            keys=[metering.PENDING_KEY, batch_key, metering.FLUSHING_SET_KEY],
+        )
+        deltas = {
+            (k.decode() if isinstance(k, bytes) else k): int(v)
+            for k, v in redis.hgetall(batch_key).items()
+        }
+        metering._apply_batch(batch_id, deltas)
+        self.stdout.write(f"Simulated crash after committing batch {batch_id}")
+        
+        # The next flush finds the leftover batch and must not apply it twice
+        metering.flush_usage()
+        after = self._flushed(organization_id, metric, period)
+        
+        counted = after - before
+        if counted != increments:
+            raise CommandError(f"Expected {increments} flushed units, found {counted}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{increments} increments flushed exactly once ({metric} {period} = {after})"
+        ))
@@ -0,0 +1,45 @@
+"""
+Inspect, verify and rebuild GST daily rollups.
+"""
+
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.billing.reporting import f5_box_totals, rebuild_rollups, verify_rollups
+
+
+class Command(BaseCommand):
+    help = 'Report GST F5 totals from rollups, or verify/rebuild rollups against invoices.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['f5', 'verify', 'rebuild'])
+        parser.add_argument('--start', required=True, help='First day (YYYY-MM-DD), inclusive')
+        parser.add_argument('--end', required=True, help='Last day (YYYY-MM-DD), inclusive')
+        parser.add_argument('--organization', default=None, help='Organization id')
+        parser.add_argument('--currency', default='SGD')
+    
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start'])
+            end = date.fromisoformat(options['end'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        organization = options['organization']
+        
+        if options['action'] == 'f5':
+            totals = f5_box_totals(start, end, organization, currency=options['currency'])
+            self.stdout.write(json.dumps(totals, indent=2))
+        
+        elif options['action'] == 'verify':
+            mismatches = verify_rollups(start, end, organization)
+            for mismatch in mismatches:
+                self.stdout.write(json.dumps(mismatch, default=str))
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} rollup buckets differ from the invoices table")
+            self.stdout.write(self.style.SUCCESS('GST rollups match the invoices table'))
+        
+        else:
+            written = rebuild_rollups(start, end, organization)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} GST rollup rows"))
@@ -0,0 +1,31 @@
+"""
+Run subscription renewal invoicing and print per-chunk timings.
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+
+from apps.billing.renewals import renew_due_subscriptions
+
+
+class Command(BaseCommand):
+    help = 'Invoice due subscriptions in bulk and report throughput.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--as-of', type=str, default=None,
+                            help='ISO timestamp to renew up to (defaults to now)')
+    
+    def handle(self, *args, **options):
+        as_of = parse_datetime(options['as_of']) if options['as_of'] else None
+        report = renew_due_subscriptions(as_of=as_of, chunk_size=options['chunk_size'])
+        
+        for index, chunk in enumerate(report.chunks, start=1):
+            self.stdout.write(
+                f"chunk {index:>4} [{chunk['status']}] "
+                f"{chunk['invoiced']:>6}/{chunk['scanned']:<6} {chunk['seconds'] * 1000:8.1f}ms"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.invoices_created} invoices in {report.elapsed_seconds:.2f}s "
+            f"({report.invoices_per_second:.1f} invoices/s), {report.canceled} subscriptions canceled"
+        ))
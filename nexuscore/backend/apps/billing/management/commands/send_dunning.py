@@ -0,0 +1,40 @@
+"""
+Run the dunning pipeline, optionally against a local SMTP stand-in.
+
+For local testing start a debugging SMTP server, for example
+``python -m aiosmtpd -n -l localhost:1025``, and pass ``--smtp-port 1025``.
+"""
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from apps.billing.dunning import run_dunning
+
+
+class Command(BaseCommand):
+    help = 'Send overdue invoice reminders grouped by organization.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Reminders sent per SMTP connection')
+        parser.add_argument('--smtp-host', default=None,
+                            help='Send through this SMTP server instead of EMAIL_BACKEND')
+        parser.add_argument('--smtp-port', type=int, default=25)
+    
+    def handle(self, *args, **options):
+        connection = None
+        if options['smtp_host'] or options['smtp_port'] != 25:
+            connection = get_connection(
+                'django.core.mail.backends.smtp.EmailBackend',
+                host=options['smtp_host'] or 'localhost',
+                port=options['smtp_port'],
+                username='',
+                password='',
+                use_tls=False,
+            )
+        
+        run = run_dunning(batch_size=options['batch_size'], connection=connection)
+        self.stdout.write(self.style.SUCCESS(
+            f"Dunning run {run.run_date} {run.status}: "
+            f"{run.organizations_notified} organizations, {run.invoices_included} invoices"
+        ))
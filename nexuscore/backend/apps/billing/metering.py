@@ -0,0 +1,234 @@
+"""
+Redis-backed usage metering for NexusCore.
+
+The hot path is a single Lua call that checks the organization's plan limit,
+increments its running counter and adds the same amount to a pending-delta hash.
+A periodic task moves the pending hash aside under a batch id, upserts the deltas
+into UsageRecord and records the batch id in UsageFlush in the same transaction,
+so a flush retried after a worker crash can tell that it was already applied.
+Deltas Postgres rejects (an organization deleted since, a malformed id) are
+moved to a dead-letter hash rather than dropped or retried forever.
+"""
+
+import logging
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+COUNTER_KEY = 'metering:usage:{organization_id}:{metric}:{period}'
+PENDING_KEY = 'metering:pending'
+FLUSHING_KEY = 'metering:flushing:{batch_id}'
+FLUSHING_SET_KEY = 'metering:flushing'
+DEAD_LETTER_KEY = 'metering:dead_letter'
+
+UNLIMITED = -1
+
+# Returns {1, total} when recorded, {0, total} when over limit, {-1, 0} if unseeded
+RECORD_USAGE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if not current then
+    return {-1, 0}
+end
+current = tonumber(current)
+local amount = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+if limit >= 0 and amount > 0 and current + amount > limit then
+    return {0, current}
+end
+current = redis.call('INCRBY', KEYS[1], amount)
+redis.call('HINCRBY', KEYS[2], ARGV[3], amount)
+return {1, current}
+"""
+
+# Move pending deltas aside under a batch key so new increments start a fresh hash
+CLAIM_PENDING_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('RENAME', KEYS[1], KEYS[2])
+redis.call('SADD', KEYS[3], KEYS[2])
+return redis.call('HLEN', KEYS[2])
+"""
+
+UsageResult = namedtuple('UsageResult', ['allowed', 'used', 'limit'])
+
+_scripts = {}
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    
+    return get_redis_connection('default')
+
+
+def _script(name, source):
+    if name not in _scripts:
+        _scripts[name] = _redis().register_script(source)
+    return _scripts[name]
+
+
+def metric_period(metric, now=None):
+    """Billing period a metric is counted in: 'YYYY-MM' or 'total' for gauges."""
+    periods = getattr(settings, 'METERED_METRICS', {})
+    if periods.get(metric, 'month') == 'month':
+        return timezone.localdate(now).strftime('%Y-%m')
+    return 'total'
+
+
+def _limit_for(organization_id, metric):
+    from apps.billing.entitlements import get_limit
+    
+    limit = get_limit(organization_id, metric)
+    return UNLIMITED if limit is None else int(limit)
+
+
+def _seed_counter(organization_id, metric, period, counter_key):
+    """Initialise a missing counter from the last flushed UsageRecord."""
+    from apps.billing.models import UsageRecord
+    
+    flushed = UsageRecord.objects.filter(
+        organization_id=organization_id, metric=metric, period=period
+    ).values_list('quantity', flat=True).first() or 0
+    ttl = getattr(settings, 'METERING_COUNTER_TTL_SECONDS', 62 * 24 * 3600)
+    _redis().set(counter_key, flushed, nx=True, ex=ttl if period != 'total' else None)
+
+
+def record_usage(organization, metric, amount=1, enforce=True):
+    """
+    Count ``amount`` units of ``metric`` against an organization.
+    
+    With ``enforce`` the increment is refused (``allowed=False``) if it would take
+    usage past the plan limit; check and increment are one atomic round trip.
+    """
+    organization_id = str(getattr(organization, 'pk', organization))
+    period = metric_period(metric)
+    limit = _limit_for(organization_id, metric) if enforce else UNLIMITED
+    counter_key = COUNTER_KEY.format(organization_id=organization_id, metric=metric, period=period)
+    field = f"{organization_id}|{metric}|{period}"
+    
+    script = _script('record', RECORD_USAGE_SCRIPT)
+    status, used = script(keys=[counter_key, PENDING_KEY], args=[amount, limit, field])
+    if status == -1:
+        _seed_counter(organization_id, metric, period, counter_key)
+        status, used = script(keys=[counter_key, PENDING_KEY], args=[amount, limit, field])
+    return UsageResult(status == 1, used, None if limit == UNLIMITED else limit)
+
+
+def check_limit(organization, metric, amount=1):
+    """Whether ``amount`` more units fit under the plan limit, without recording them."""
+    organization_id = str(getattr(organization, 'pk', organization))
+    period = metric_period(metric)
+    limit = _limit_for(organization_id, metric)
+    counter_key = COUNTER_KEY.format(organization_id=organization_id, metric=metric, period=period)
+    
+    used = _redis().get(counter_key)
+    if used is None:
+        _seed_counter(organization_id, metric, period, counter_key)
+        used = _redis().get(counter_key)
+    used = int(used or 0)
+    allowed = limit == UNLIMITED or used + amount <= limit
+    return UsageResult(allowed, used, None if limit == UNLIMITED else limit)
+
+
+def _upsert_usage(rows):
+    values = []
+    params = []
+    for _, organization_id, metric, period, amount in rows:
+        values.append('(gen_random_uuid(), %s, %s, %s, %s, NOW(), NOW())')
+        params.extend([organization_id, metric, period, amount])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO usage_records "
+            "(id, organization_id, metric, period, quantity, created_at, updated_at) "
+            f"VALUES {', '.join(values)} "
+            "ON CONFLICT (organization_id, metric, period) DO UPDATE SET "
+            "quantity = usage_records.quantity + EXCLUDED.quantity, "
+            "updated_at = NOW()",
+            params,
+        )
+
+
+def _apply_batch(batch_id, deltas):
+    """
+    Upsert a batch of deltas. Returns (applied, rejected).
+    
+    ``applied`` is False if the batch had already been flushed. ``rejected`` maps
+    the fields Postgres refused to their amounts; the rest of the batch is applied.
+    """
+    from apps.billing.models import UsageFlush
+    
+    if UsageFlush.objects.filter(batch_id=batch_id).exists():
+        logger.info(f"Usage batch {batch_id} was already flushed; discarding")
+        return False, {}
+    
+    rows = []
+    rejected = {}
+    for field, amount in sorted(deltas.items()):
+        try:
+            organization_id, metric, period = field.split('|')
+        except ValueError:
+            rejected[field] = int(amount)
+            continue
+        rows.append((field, organization_id, metric, period, int(amount)))
+    
+    try:
+        with transaction.atomic():
+            UsageFlush.objects.create(batch_id=batch_id, counters=len(rows))
+            if rows:
+                _upsert_usage(rows)
+        return True, rejected
+    except (IntegrityError, DataError):
+        if UsageFlush.objects.filter(batch_id=batch_id).exists():
+            logger.info(f"Usage batch {batch_id} was flushed concurrently; discarding")
+            return False, {}
+    
+    # One bad row fails the whole statement; apply row by row to isolate it
+    with transaction.atomic():
+        UsageFlush.objects.create(batch_id=batch_id, counters=len(rows))
+        for row in rows:
+            try:
+                with transaction.atomic():
+                    _upsert_usage([row])
+            except (IntegrityError, DataError) as e:
+                logger.error(f"Usage counter {row[0]} rejected by Postgres: {e}")
+                rejected[row[0]] = row[4]
+    return True, rejected
+
+
+def flush_usage():
+    """Move pending Redis deltas into UsageRecord. Safe to retry after a crash."""
+    redis = _redis()
+    batch_id = uuid.uuid4().hex
+    _script('claim', CLAIM_PENDING_SCRIPT)(
+        keys=[PENDING_KEY, FLUSHING_KEY.format(batch_id=batch_id), FLUSHING_SET_KEY],
+    )
+    
+    # Includes batches left behind by a flush that crashed part-way
+    flushed = 0
+    for batch_key in redis.smembers(FLUSHING_SET_KEY):
+        batch_key = batch_key.decode() if isinstance(batch_key, bytes) else batch_key
+        batch = batch_key.rsplit(':', 1)[-1]
+        deltas = {
+            (k.decode() if isinstance(k, bytes) else k): int(v)
+            for k, v in redis.hgetall(batch_key).items()
+        }
+        applied, rejected = _apply_batch(batch, deltas)
+        if applied:
+            flushed += len(deltas) - len(rejected)
+        if rejected:
+            pipe = redis.pipeline()
+            for field, amount in rejected.items():
+                pipe.hincrby(DEAD_LETTER_KEY, field, amount)
+            pipe.execute()
+            logger.error(f"Moved {len(rejected)} usage counters from batch {batch} to {DEAD_LETTER_KEY}")
+        redis.delete(batch_key)
+        redis.srem(FLUSHING_SET_KEY, batch_key)
+    
+    if flushed:
+        logger.info(f"Flushed {flushed} usage counters to Postgres")
+    return flushed
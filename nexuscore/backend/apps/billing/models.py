@@ -3,6 +3,9 @@ Billing models for NexusCore with Singapore GST compliance.
 """
 
 import uuid
+from datetime import timedelta
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
 from django.utils import timezone
@@ -72,18 +75,13 @@ class Plan(models.Model):
     
     @property
     def savings_percentage(self):
-        """Calculate savings for annual billing."""
+        """Calculate savings for annual billing against the cached monthly plan."""
         if self.billing_period == 'year':
-            monthly_equivalent = self.amount_cents / 12
-            try:
-                monthly_plan = Plan.objects.get(
-                    sku=f"{self.sku.split('-')[0]}-month",
-                    is_active=True
-                )
-                if monthly_plan:
-                    return int(((monthly_plan.amount_cents - monthly_equivalent) / monthly_plan.amount_cents) * 100)
-            except Plan.DoesNotExist:
-                pass
+            from apps.billing.catalog import compute_savings_percentage, get_plan_catalog
+            
+            monthly_plan = get_plan_catalog().monthly_for(self.sku)
+            if monthly_plan:
+                return compute_savings_percentage(self.amount_cents, monthly_plan.amount_cents)
         return 0
 
 
@@ -178,6 +176,19 @@ class Subscription(models.Model):
             return False
         return timezone.now() < self.trial_end and self.status == 'trialing'
     
+    def webhook_payload(self):
+        """Data sent to the organization's webhook endpoints for subscription.* events."""
+        return {
+            'id': self.id,
+            'plan_id': self.plan_id,
+            'status': self.status,
+            'cancel_at_period_end': self.cancel_at_period_end,
+            'current_period_start': self.current_period_start,
+            'current_period_end': self.current_period_end,
+            'trial_end': self.trial_end,
+            'canceled_at': self.canceled_at,
+        }
+    
     def clean(self):
         """Django 6.0 model validation."""
         if self.trial_end and self.trial_end <= timezone.now():
@@ -264,8 +275,8 @@ class Invoice(models.Model):
     due_date = models.DateTimeField()
     paid_at = models.DateTimeField(null=True, blank=True)
     
-    # External References
-    pdf_url = models.URLField(blank=True)
+    # External References; the PDF's storage key, presigned on read (pdf_download_url)
+    pdf_name = models.CharField(max_length=255, blank=True)
     stripe_invoice_id = models.CharField(max_length=255, unique=True, db_index=True)
     stripe_payment_intent_id = models.CharField(max_length=255, blank=True)
     
@@ -283,10 +294,12 @@ class Invoice(models.Model):
             models.Index(fields=['status', 'due_date']),
             models.Index(fields=['stripe_invoice_id']),
             models.Index(fields=['created_at']),
-            # Partial index for overdue invoices
+            # Partial index for overdue scans. The due_date cutoff is applied at
+            # query time; a timezone.now() condition here would be frozen at
+            # migration time and stop covering newly overdue invoices.
             models.Index(
-                fields=['due_date'],
-                condition=models.Q(status='open') & models.Q(due_date__lt=timezone.now()),
+                fields=['organization', 'due_date', 'id'],
+                condition=models.Q(status='open'),
                 name='idx_overdue_invoices'
             ),
         ]
@@ -308,6 +321,34 @@ class Invoice(models.Model):
     def __str__(self):
         return f"Invoice {self.id} - {self.organization.name}"
     
+    def pdf_download_url(self):
+        """Short-lived presigned link to the rendered PDF, or '' if none has been stored."""
+        if not self.pdf_name:
+            return ''
+        from apps.core.storage import presigned_url
+        
+        return presigned_url(self.pdf_name, timedelta(seconds=settings.INVOICE_PDF_LINK_TTL_SECONDS))
+    
+    def webhook_payload(self):
+        """Data sent to the organization's webhook endpoints for invoice.* events."""
+        from apps.billing.reporting import gst_cents
+        
+        # Computed like the GeneratedFields, which save() leaves unloaded on updates
+        gst = gst_cents(self.subtotal_cents, self.gst_rate)
+        return {
+            'id': self.id,
+            'subscription_id': self.subscription_id,
+            'number': self.stripe_invoice_id,
+            'status': self.status,
+            'currency': self.currency,
+            'subtotal_cents': self.subtotal_cents,
+            'gst_amount_cents': gst,
+            'total_amount_cents': self.subtotal_cents + gst,
+            'amount_paid_cents': self.amount_paid_cents,
+            'due_date': self.due_date,
+            'paid_at': self.paid_at,
+        }
+    
     @property
     def subtotal_dollars(self):
         """Amount due in dollars."""
@@ -355,7 +396,8 @@ class IdempotencyRecord(models.Model):
     ]
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    key = models.CharField(max_length=255, unique=True, db_index=True)
+    scope = models.CharField(max_length=64, default='')  # SHA256 of the calling principal
+    key = models.CharField(max_length=255, db_index=True)
     request_path = models.CharField(max_length=255)
     request_method = models.CharField(max_length=10)
     request_hash = models.CharField(max_length=64)  # SHA256 of request body
@@ -375,10 +417,132 @@ class IdempotencyRecord(models.Model):
             models.Index(fields=['expires_at']),
             models.Index(fields=['request_path', 'request_method']),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='uniq_idempotency_scope_key'),
+        ]
     
     def __str__(self):
         return f"Idempotency: {self.key}"
     
     def is_expired(self):
         """Check if idempotency record has expired."""
-        return timezone.now() > self.expires_at
\ No newline at end of file
+        return timezone.now() > self.expires_at
+
+
+class GSTDailyRollup(models.Model):
+    """
+    Daily GST totals per organization, IRAS transaction code and currency.
+    
+    Maintained by Invoice save signals only; see apps.billing.reporting for how to
+    repair rollups after writes that bypass save().
+    """
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='gst_rollups'
+    )
+    day = models.DateField()
+    iras_transaction_code = models.CharField(max_length=10)
+    currency = models.CharField(max_length=3, default='SGD')
+    
+    # Totals over reportable (issued, non-void) invoices
+    invoice_count = models.IntegerField(default=0)
+    subtotal_cents = models.BigIntegerField(default=0)
+    gst_amount_cents = models.BigIntegerField(default=0)
+    total_amount_cents = models.BigIntegerField(default=0)
+    amount_paid_cents = models.BigIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'gst_daily_rollups'
+        indexes = [
+            models.Index(fields=['day', 'iras_transaction_code']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['organization', 'day', 'iras_transaction_code', 'currency'],
+                name='unique_gst_rollup_bucket'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"GST {self.day} {self.iras_transaction_code} {self.currency} - {self.organization_id}"
+
+
+class DunningRun(models.Model):
+    """Checkpointed progress of a daily dunning run, so a crashed run can resume."""
+    
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    run_date = models.DateField(unique=True)
+    as_of = models.DateTimeField(help_text="Invoices due before this time are overdue for the run")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    
+    # Last organization whose reminder was sent (scan is ordered by organization)
+    last_organization_id = models.UUIDField(null=True, blank=True)
+    organizations_notified = models.PositiveIntegerField(default=0)
+    invoices_included = models.PositiveIntegerField(default=0)
+    
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'dunning_runs'
+        ordering = ['-run_date']
+    
+    def __str__(self):
+        return f"Dunning {self.run_date} ({self.status})"
+
+
+class UsageRecord(models.Model):
+    """Metered usage per organization, metric and billing period (flushed from Redis)."""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='usage_records'
+    )
+    metric = models.CharField(max_length=50)
+    period = models.CharField(max_length=10, help_text="YYYY-MM for monthly metrics, 'total' otherwise")
+    quantity = models.BigIntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'usage_records'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['organization', 'metric', 'period'],
+                name='unique_usage_bucket'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.organization_id} {self.metric} {self.period}: {self.quantity}"
+
+
+class UsageFlush(models.Model):
+    """Marks a Redis usage batch as applied so a retried flush never double counts."""
+    
+    batch_id = models.CharField(max_length=64, primary_key=True)
+    counters = models.PositiveIntegerField(default=0)
+    flushed_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'usage_flushes'
+        indexes = [
+            models.Index(fields=['flushed_at']),
+        ]
+    
+    def __str__(self):
+        return f"Usage flush {self.batch_id}"
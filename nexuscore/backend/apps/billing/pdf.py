@@ -0,0 +1,198 @@
+"""
+Invoice PDF rendering for NexusCore.
+
+A single InvoicePDFRenderer lives in each worker process. It compiles the invoice
+template, parses the stylesheet and loads fonts once, so rendering a batch of
+invoices only pays for layout. Finished PDFs are uploaded concurrently and every
+Invoice.pdf_name in the batch is set with one UPDATE.
+
+Each invoice's PDF has one deterministic storage key, which a re-render replaces;
+with AWS_S3_FILE_OVERWRITE=False a plain save() would add a random suffix and leave
+the old object behind. Only the key is stored: the bucket is private, so download
+links are presigned when they are served (Invoice.pdf_download_url).
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Case, CharField, Value, When
+from django.template.loader import get_template, render_to_string
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+INVOICE_TEMPLATE = 'billing/invoice_pdf.html'
+INVOICE_STYLESHEET = 'billing/invoice_pdf.css'
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def format_cents(cents):
+    """Format an integer amount in cents as a 2dp string with thousands separators."""
+    return f"{Decimal(cents or 0) / 100:,.2f}"
+
+
+class InvoicePDFRenderer:
+    """Long-lived renderer holding the compiled template, stylesheet and fonts."""
+    
+    def __init__(self):
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+        
+        started = time.perf_counter()
+        self.template = get_template(INVOICE_TEMPLATE)
+        self.font_config = FontConfiguration()
+        self.stylesheet = CSS(
+            string=render_to_string(INVOICE_STYLESHEET),
+            font_config=self.font_config,
+        )
+        self.supplier = getattr(settings, 'INVOICE_SUPPLIER', {})
+        self.base_url = str(settings.BASE_DIR)
+        # Lay out a throwaway page so fontconfig and the text shaper are warm
+        self._render_html('<p>warm-up</p>')
+        logger.info(f"Invoice PDF renderer ready in {(time.perf_counter() - started) * 1000:.0f}ms")
+    
+    def _render_html(self, html):
+        from weasyprint import HTML
+        
+        return HTML(string=html, base_url=self.base_url).write_pdf(
+            stylesheets=[self.stylesheet],
+            font_config=self.font_config,
+        )
+    
+    def context_for(self, invoice):
+        line_items = []
+        for line in invoice.line_items or []:
+            period = ''
+            if line.get('period_start') and line.get('period_end'):
+                period = f"{line['period_start'][:10]} to {line['period_end'][:10]}"
+            line_items.append({
+                'description': line.get('description', ''),
+                'period': period,
+                'amount': format_cents(line.get('amount_cents', 0)),
+            })
+        return {
+            'invoice': invoice,
+            'organization': invoice.organization,
+            'supplier': self.supplier,
+            'issued_at': invoice.created_at or timezone.now(),
+            'line_items': line_items,
+            'subtotal': format_cents(invoice.subtotal_cents),
+            'gst_rate_percent': f"{Decimal(invoice.gst_rate) * 100:.0f}",
+            'gst_amount': format_cents(invoice.gst_amount_cents),
+            'total': format_cents(invoice.total_amount_cents),
+        }
+    
+    def render(self, invoice):
+        """Render a single invoice to PDF bytes."""
+        return self._render_html(self.template.render(self.context_for(invoice)))
+
+
+def get_renderer():
+    """Return this process's renderer, creating it on first use."""
+    global _renderer
+    
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = InvoicePDFRenderer()
+    return _renderer
+
+
+def invoice_pdf_path(invoice):
+    return f"invoices/{invoice.organization_id}/{invoice.id}.pdf"
+
+
+def _store_pdfs(rendered, storage):
+    """Upload rendered PDFs concurrently. Returns ({invoice_id: name}, [failed invoice ids])."""
+    def upload(invoice, pdf):
+        path = invoice_pdf_path(invoice)
+        # Free the key first so the storage cannot pick a suffixed name instead
+        storage.delete(path)
+        name = storage.save(path, ContentFile(pdf))
+        if invoice.pdf_name and invoice.pdf_name != name:
+            storage.delete(invoice.pdf_name)
+        return name
+    
+    names = {}
+    failed = []
+    workers = getattr(settings, 'INVOICE_PDF_UPLOAD_CONCURRENCY', 8)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(upload, invoice, pdf): invoice for invoice, pdf in rendered}
+        for future in as_completed(futures):
+            invoice = futures[future]
+            try:
+                names[invoice.id] = future.result()
+            except Exception:
+                logger.exception(f"Failed to upload PDF for invoice {invoice.id}")
+                failed.append(str(invoice.id))
+    return names, failed
+
+
+def _update_pdf_names(names):
+    """Set pdf_name for every uploaded invoice with a single UPDATE ... CASE."""
+    from apps.billing.models import Invoice
+    
+    if not names:
+        return 0
+    return Invoice.objects.filter(id__in=list(names)).update(
+        pdf_name=Case(
+            *[When(id=invoice_id, then=Value(name)) for invoice_id, name in names.items()],
+            output_field=CharField(),
+        )
+    )
+
+
+def render_invoice_batch(invoice_ids, storage=None):
+    """
+    Render, upload and record PDFs for a batch of invoices.
+    
+    Returns a dict with counts and timings for each phase.
+    """
+    from apps.billing.models import Invoice
+    
+    storage = storage or default_storage
+    renderer = get_renderer()
+    
+    started = time.perf_counter()
+    invoices = list(
+        Invoice.objects.filter(id__in=invoice_ids).select_related('organization')
+    )
+    
+    rendered = []
+    failed = []
+    for invoice in invoices:
+        try:
+            rendered.append((invoice, renderer.render(invoice)))
+        except Exception:
+            logger.exception(f"Failed to render PDF for invoice {invoice.id}")
+            failed.append(str(invoice.id))
+    render_seconds = time.perf_counter() - started
+    
+    names, upload_failed = _store_pdfs(rendered, storage)
+    failed.extend(upload_failed)
+    upload_seconds = time.perf_counter() - started - render_seconds
+    
+    updated = _update_pdf_names(names)
+    total_seconds = time.perf_counter() - started
+    
+    logger.info(
+        f"Rendered {len(rendered)} invoice PDFs in {render_seconds:.2f}s, "
+        f"uploaded {len(names)} in {upload_seconds:.2f}s ({len(failed)} failed)"
+    )
+    return {
+        'requested': len(invoice_ids),
+        'rendered': len(rendered),
+        'updated': updated,
+        'failed': failed,
+        'render_seconds': round(render_seconds, 4),
+        'upload_seconds': round(upload_seconds, 4),
+        'total_seconds': round(total_seconds, 4),
+    }
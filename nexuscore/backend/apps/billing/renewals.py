@@ -0,0 +1,266 @@
+"""
+Bulk renewal invoicing for NexusCore subscriptions.
+
+Due subscriptions are scanned through the (status, current_period_end) index with a
+keyset cursor. Each chunk is locked, invoiced with a single bulk INSERT ... RETURNING
+(which also returns the database-generated GST columns) and has its billing periods
+advanced, all inside one short transaction. The bulk writes skip the model signals,
+so the chunk's invoice.created and subscription.updated webhooks are published here.
+
+A subscription several periods behind gets one invoice per missed period and ends
+the run with current_period_end after ``as_of``. Subscriptions set to
+cancel_at_period_end are not renewed; once their period has ended they are
+canceled, through save() so the entitlement and webhook signals run.
+"""
+
+import logging
+import time
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.billing.models import Invoice, Subscription
+from apps.billing.reporting import record_new_invoices
+from apps.webhooks.outbound import publish_events
+
+logger = logging.getLogger(__name__)
+
+RENEWABLE_STATUSES = ('active', 'past_due')
+# Every status but 'canceled', so cancel_at_period_end is honoured from any state
+CANCELABLE_STATUSES = ('trialing', 'active', 'past_due', 'unpaid')
+
+BILLING_PERIOD_DELTAS = {
+    'month': relativedelta(months=1),
+    'year': relativedelta(years=1),
+}
+
+
+class RenewalReport:
+    """Accumulates per-chunk timings and totals for a renewal run."""
+    
+    def __init__(self, as_of):
+        self.as_of = as_of
+        self.chunks = []
+        self.canceled = 0
+        self.started = time.perf_counter()
+        self.finished = None
+    
+    def add_chunk(self, status, scanned, invoiced, seconds):
+        self.chunks.append({
+            'status': status,
+            'scanned': scanned,
+            'invoiced': invoiced,
+            'seconds': round(seconds, 4),
+        })
+        logger.info(
+            f"Renewal chunk {len(self.chunks)} ({status}): "
+            f"{invoiced}/{scanned} invoiced in {seconds * 1000:.1f}ms"
+        )
+    
+    def finish(self):
+        self.finished = time.perf_counter()
+        return self
+    
+    @property
+    def invoices_created(self):
+        return sum(chunk['invoiced'] for chunk in self.chunks)
+    
+    @property
+    def elapsed_seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+    
+    @property
+    def invoices_per_second(self):
+        elapsed = self.elapsed_seconds
+        return self.invoices_created / elapsed if elapsed > 0 else 0.0
+    
+    def as_dict(self):
+        return {
+            'as_of': self.as_of.isoformat(),
+            'chunks': self.chunks,
+            'invoices_created': self.invoices_created,
+            'subscriptions_canceled': self.canceled,
+            'elapsed_seconds': round(self.elapsed_seconds, 4),
+            'invoices_per_second': round(self.invoices_per_second, 1),
+        }
+
+
+def renewal_invoice_id(subscription, period_start):
+    """Deterministic invoice reference so a renewal can never be invoiced twice."""
+    return f"renewal_{subscription.id.hex}_{period_start:%Y%m%d%H%M%S}"
+
+
+def build_renewal_invoice(subscription, period_start, period_end, due_days):
+    """Build (but do not save) the invoice for the next billing period."""
+    plan = subscription.plan
+    return Invoice(
+        organization_id=subscription.organization_id,
+        subscription=subscription,
+        subtotal_cents=plan.amount_cents,
+        currency=plan.currency,
+        status='open',
+        due_date=period_start + timezone.timedelta(days=due_days),
+        stripe_invoice_id=renewal_invoice_id(subscription, period_start),
+        line_items=[{
+            'description': plan.name,
+            'sku': plan.sku,
+            'amount_cents': plan.amount_cents,
+            'period_start': period_start.isoformat(),
+            'period_end': period_end.isoformat(),
+        }],
+        metadata={'source': 'renewal'},
+    )
+
+
+def _due_chunk(status, as_of, cursor, chunk_size):
+    """Lock the next keyset page of due subscriptions for one status."""
+    queryset = Subscription.objects.filter(
+        status=status,
+        cancel_at_period_end=False,
+        current_period_end__lte=as_of,
+    )
+    if cursor is not None:
+        last_end, last_id = cursor
+        queryset = queryset.filter(
+            Q(current_period_end__gt=last_end)
+            | Q(current_period_end=last_end, id__gt=last_id)
+        )
+    return list(
+        queryset
+        .select_related('plan')
+        .select_for_update(skip_locked=True, of=('self',))
+        .order_by('current_period_end', 'id')[:chunk_size]
+    )
+
+
+def _renew_chunk(subscriptions, due_days, as_of):
+    """
+    Create invoices and advance periods for a locked chunk. Returns invoices.
+    
+    Each subscription is advanced one period at a time, with an invoice for every
+    period, until its current period ends after ``as_of``.
+    """
+    now = timezone.now()
+    invoices = []
+    renewed = []
+    for subscription in subscriptions:
+        delta = BILLING_PERIOD_DELTAS.get(subscription.plan.billing_period)
+        if delta is None:
+            logger.warning(
+                f"Skipping renewal of {subscription.id}: unknown billing period "
+                f"{subscription.plan.billing_period!r}"
+            )
+            continue
+        while subscription.current_period_end <= as_of:
+            period_start = subscription.current_period_end
+            period_end = period_start + delta
+            invoices.append(build_renewal_invoice(subscription, period_start, period_end, due_days))
+            subscription.current_period_start = period_start
+            subscription.current_period_end = period_end
+        subscription.updated_at = now
+        renewed.append(subscription)
+    
+    # PostgreSQL returns the primary key and the GeneratedField columns from the
+    # bulk INSERT, so gst_amount_cents/total_amount_cents need no refresh.
+    Invoice.objects.bulk_create(invoices)
+    # bulk_create bypasses the post_save rollup handler
+    record_new_invoices(invoices)
+    Subscription.objects.bulk_update(
+        subscriptions,
+        ['current_period_start', 'current_period_end', 'updated_at'],
+    )
+    publish_events('invoice.created', (
+        (invoice.organization_id, invoice.webhook_payload()) for invoice in invoices
+    ))
+    publish_events('subscription.updated', (
+        (subscription.organization_id, subscription.webhook_payload()) for subscription in renewed
+    ))
+    return invoices
+
+
+def _ending_chunk(as_of, cursor, chunk_size):
+    """Lock the next keyset page of cancel_at_period_end subscriptions whose period has ended."""
+    queryset = Subscription.objects.filter(
+        status__in=CANCELABLE_STATUSES,
+        cancel_at_period_end=True,
+        current_period_end__lte=as_of,
+    )
+    if cursor is not None:
+        last_end, last_id = cursor
+        queryset = queryset.filter(
+            Q(current_period_end__gt=last_end)
+            | Q(current_period_end=last_end, id__gt=last_id)
+        )
+    return list(
+        queryset
+        .select_for_update(skip_locked=True, of=('self',))
+        .order_by('current_period_end', 'id')[:chunk_size]
+    )
+
+
+def cancel_ended_subscriptions(as_of=None, chunk_size=None):
+    """Cancel subscriptions set to cancel_at_period_end whose period ended by ``as_of``."""
+    as_of = as_of or timezone.now()
+    chunk_size = chunk_size or getattr(settings, 'BILLING_RENEWAL_CHUNK_SIZE', 500)
+    canceled = 0
+    cursor = None
+    while True:
+        with transaction.atomic():
+            subscriptions = _ending_chunk(as_of, cursor, chunk_size)
+            if not subscriptions:
+                break
+            last = subscriptions[-1]
+            cursor = (last.current_period_end, last.id)
+            for subscription in subscriptions:
+                subscription.status = 'canceled'
+                subscription.canceled_at = subscription.current_period_end
+                subscription.save(update_fields=['status', 'canceled_at', 'updated_at'])
+        canceled += len(subscriptions)
+    if canceled:
+        logger.info(f"Canceled {canceled} subscriptions at the end of their period")
+    return canceled
+
+
+def renew_due_subscriptions(as_of=None, chunk_size=None, due_days=None):
+    """
+    Invoice every subscription whose current period has ended by ``as_of``, after
+    canceling those set to cancel at the end of it.
+    
+    Subscriptions locked by a concurrent run are skipped rather than waited on.
+    Returns a RenewalReport with per-chunk timings and overall throughput.
+    """
+    as_of = as_of or timezone.now()
+    chunk_size = chunk_size or getattr(settings, 'BILLING_RENEWAL_CHUNK_SIZE', 500)
+    if due_days is None:
+        due_days = getattr(settings, 'BILLING_RENEWAL_DUE_DAYS', 7)
+    
+    report = RenewalReport(as_of)
+    report.canceled = cancel_ended_subscriptions(as_of, chunk_size)
+    for status in RENEWABLE_STATUSES:
+        cursor = None
+        while True:
+            chunk_started = time.perf_counter()
+            with transaction.atomic():
+                subscriptions = _due_chunk(status, as_of, cursor, chunk_size)
+                if not subscriptions:
+                    break
+                # Keyset position is taken before the periods are advanced
+                last = subscriptions[-1]
+                cursor = (last.current_period_end, last.id)
+                invoices = _renew_chunk(subscriptions, due_days, as_of)
+            report.add_chunk(
+                status,
+                scanned=len(subscriptions),
+                invoiced=len(invoices),
+                seconds=time.perf_counter() - chunk_started,
+            )
+    
+    report.finish()
+    logger.info(
+        f"Renewal run complete: {report.invoices_created} invoices in "
+        f"{report.elapsed_seconds:.2f}s ({report.invoices_per_second:.1f}/s)"
+    )
+    return report
@@ -0,0 +1,317 @@
+"""
+GST F5 reporting for NexusCore.
+
+GSTDailyRollup rows hold per-day totals by organization, IRAS transaction code and
+currency. Invoice saves apply the difference between an invoice's old and new
+contribution with a single UPSERT, so quarterly F5 figures are read from a few
+hundred rollup rows instead of scanning the invoices table.
+
+Rollups are maintained only by the Invoice model signals. Writes that bypass
+save(), such as QuerySet.update(), bulk_update(), raw SQL or a data fix in psql,
+must not touch ROLLUP_SOURCE_FIELDS. If they do, the affected days have to be
+repaired with rebuild_rollups() (``manage.py gst_rollups rebuild``), and
+verify_rollups() (``gst_rollups verify``) reports any drift.
+"""
+
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Draft invoices are not yet issued and void invoices are cancelled supplies
+REPORTABLE_STATUSES = ('open', 'paid', 'uncollectible')
+
+# IRAS transaction codes feeding each GST F5 supply box
+F5_STANDARD_RATED_CODES = ('SR', 'TX')
+F5_ZERO_RATED_CODES = ('ZR',)
+F5_EXEMPT_CODES = ()
+
+ROLLUP_SOURCE_FIELDS = (
+    'organization_id', 'created_at', 'iras_transaction_code', 'currency',
+    'status', 'subtotal_cents', 'gst_rate', 'amount_paid_cents',
+)
+ROLLUP_AMOUNT_FIELDS = (
+    'invoice_count', 'subtotal_cents', 'gst_amount_cents',
+    'total_amount_cents', 'amount_paid_cents',
+)
+
+
+def reporting_day(created_at):
+    """Calendar day (in the platform time zone) an invoice is reported under."""
+    return timezone.localtime(created_at, ZoneInfo(settings.TIME_ZONE)).date()
+
+
+def gst_cents(subtotal_cents, gst_rate):
+    """Mirror of the database ROUND(subtotal_cents * gst_rate) GeneratedField."""
+    amount = Decimal(subtotal_cents) * Decimal(str(gst_rate))
+    return int(amount.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def snapshot_invoice(invoice):
+    """Capture the fields that determine an invoice's rollup contribution."""
+    return {field: getattr(invoice, field) for field in ROLLUP_SOURCE_FIELDS}
+
+
+def invoice_contribution(values):
+    """Return (bucket key, amounts) for an invoice snapshot, or None if not reportable."""
+    if not values or values['status'] not in REPORTABLE_STATUSES or not values['created_at']:
+        return None
+    gst = gst_cents(values['subtotal_cents'], values['gst_rate'])
+    key = (
+        values['organization_id'],
+        reporting_day(values['created_at']),
+        values['iras_transaction_code'],
+        values['currency'],
+    )
+    amounts = (1, values['subtotal_cents'], gst, values['subtotal_cents'] + gst, values['amount_paid_cents'])
+    return key, amounts
+
+
+def contribution_deltas(changes):
+    """
+    Fold (old snapshot, new snapshot) pairs into per-bucket amount deltas.
+    
+    Either snapshot may be None for an invoice that is being created or deleted.
+    """
+    deltas = defaultdict(lambda: [0] * len(ROLLUP_AMOUNT_FIELDS))
+    for old, new in changes:
+        for values, sign in ((old, -1), (new, 1)):
+            contribution = invoice_contribution(values)
+            if contribution is None:
+                continue
+            key, amounts = contribution
+            bucket = deltas[key]
+            for index, amount in enumerate(amounts):
+                bucket[index] += sign * amount
+    return {key: amounts for key, amounts in deltas.items() if any(amounts)}
+
+
+def apply_rollup_deltas(deltas):
+    """Add deltas to their rollup rows with one INSERT ... ON CONFLICT DO UPDATE."""
+    if not deltas:
+        return 0
+    
+    rows = []
+    params = []
+    # Sorted keys give concurrent writers a consistent lock order
+    for key in sorted(deltas, key=lambda k: (str(k[0]), k[1], k[2], k[3])):
+        rows.append('(gen_random_uuid(), %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())')
+        params.extend([*key, *deltas[key]])
+    
+    updates = ', '.join(
+        f"{field} = gst_daily_rollups.{field} + EXCLUDED.{field}"
+        for field in ROLLUP_AMOUNT_FIELDS
+    )
+    sql = (
+        "INSERT INTO gst_daily_rollups "
+        "(id, organization_id, day, iras_transaction_code, currency, "
+        f"{', '.join(ROLLUP_AMOUNT_FIELDS)}, updated_at) "
+        f"VALUES {', '.join(rows)} "
+        "ON CONFLICT (organization_id, day, iras_transaction_code, currency) "
+        f"DO UPDATE SET {updates}, updated_at = NOW()"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+    return len(rows)
+
+
+def record_invoice_changes(changes):
+    """Apply rollup deltas for (old snapshot, new snapshot) pairs."""
+    return apply_rollup_deltas(contribution_deltas(changes))
+
+
+def record_new_invoices(invoices):
+    """Roll up invoices inserted outside save(), e.g. via bulk_create."""
+    return record_invoice_changes((None, snapshot_invoice(invoice)) for invoice in invoices)
+
+
+def _period_rollups(start, end, organization=None):
+    from apps.billing.models import GSTDailyRollup
+    
+    queryset = GSTDailyRollup.objects.filter(day__gte=start, day__lte=end)
+    if organization is not None:
+        queryset = queryset.filter(organization=organization)
+    return queryset
+
+
+def gst_totals_by_code(start, end, organization=None):
+    """Totals per (IRAS transaction code, currency) for an inclusive day range."""
+    rows = (
+        _period_rollups(start, end, organization)
+        .values('iras_transaction_code', 'currency')
+        .annotate(**{field: Sum(field) for field in ROLLUP_AMOUNT_FIELDS})
+        .order_by('iras_transaction_code', 'currency')
+    )
+    return list(rows)
+
+
+def f5_box_totals(start, end, organization=None, currency='SGD'):
+    """
+    GST F5 supply and output tax boxes, in cents, for an inclusive day range.
+    
+    Box 1: standard-rated supplies, Box 2: zero-rated supplies, Box 3: exempt
+    supplies, Box 4: total supplies, Box 6: output tax due. Out-of-scope (OS)
+    supplies are reported separately as they do not enter the F5 boxes.
+    """
+    by_code = defaultdict(lambda: {'subtotal_cents': 0, 'gst_amount_cents': 0})
+    for row in gst_totals_by_code(start, end, organization):
+        if row['currency'] != currency:
+            continue
+        by_code[row['iras_transaction_code']]['subtotal_cents'] += row['subtotal_cents'] or 0
+        by_code[row['iras_transaction_code']]['gst_amount_cents'] += row['gst_amount_cents'] or 0
+    
+    def supplies(codes):
+        return sum(by_code[code]['subtotal_cents'] for code in codes)
+    
+    box_1 = supplies(F5_STANDARD_RATED_CODES)
+    box_2 = supplies(F5_ZERO_RATED_CODES)
+    box_3 = supplies(F5_EXEMPT_CODES)
+    return {
+        'period_start': start.isoformat(),
+        'period_end': end.isoformat(),
+        'currency': currency,
+        'box_1_standard_rated_supplies_cents': box_1,
+        'box_2_zero_rated_supplies_cents': box_2,
+        'box_3_exempt_supplies_cents': box_3,
+        'box_4_total_supplies_cents': box_1 + box_2 + box_3,
+        'box_6_output_tax_cents': sum(row['gst_amount_cents'] for row in by_code.values()),
+        'out_of_scope_supplies_cents': by_code['OS']['subtotal_cents'],
+    }
+
+
+def _raw_invoice_totals(start, end, organization=None):
+    """Aggregate the invoices table directly into rollup-shaped buckets."""
+    from apps.billing.models import Invoice
+    
+    tz = ZoneInfo(settings.TIME_ZONE)
+    # Range on created_at itself so the created_at index can be used
+    queryset = Invoice.objects.filter(
+        status__in=REPORTABLE_STATUSES,
+        created_at__gte=datetime.combine(start, dt_time.min, tzinfo=tz),
+        created_at__lt=datetime.combine(end + timedelta(days=1), dt_time.min, tzinfo=tz),
+    ).annotate(day=TruncDate('created_at', tzinfo=tz))
+    if organization is not None:
+        queryset = queryset.filter(organization=organization)
+    
+    rows = queryset.values(
+        'organization_id', 'day', 'iras_transaction_code', 'currency'
+    ).annotate(
+        invoice_count=Count('id'),
+        sum_subtotal=Sum('subtotal_cents'),
+        sum_gst=Sum('gst_amount_cents'),
+        sum_total=Sum('total_amount_cents'),
+        sum_paid=Sum('amount_paid_cents'),
+    ).order_by()
+    
+    return {
+        (row['organization_id'], row['day'], row['iras_transaction_code'], row['currency']): (
+            row['invoice_count'], row['sum_subtotal'], row['sum_gst'],
+            row['sum_total'], row['sum_paid'],
+        )
+        for row in rows.iterator(chunk_size=2000)
+    }
+
+
+@contextmanager
+def _scan_timeout():
+    """Transaction whose statement_timeout is raised to GST_ROLLUP_SCAN_TIMEOUT_MS."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL statement_timeout = {int(settings.GST_ROLLUP_SCAN_TIMEOUT_MS)}")
+        yield
+
+
+def _stored_rollups(start, end, organization=None):
+    return {
+        (row['organization_id'], row['day'], row['iras_transaction_code'], row['currency']): tuple(
+            row[field] for field in ROLLUP_AMOUNT_FIELDS
+        )
+        for row in _period_rollups(start, end, organization).values(
+            'organization_id', 'day', 'iras_transaction_code', 'currency', *ROLLUP_AMOUNT_FIELDS
+        ).iterator(chunk_size=2000)
+    }
+
+
+def verify_rollups(start, end, organization=None):
+    """Compare rollups with the raw invoices table. Returns a list of mismatches."""
+    with _scan_timeout():
+        raw = _raw_invoice_totals(start, end, organization)
+    stored = {
+        key: amounts for key, amounts in _stored_rollups(start, end, organization).items()
+        if any(amounts)
+    }
+    mismatches = []
+    for key in sorted(set(raw) | set(stored), key=lambda k: (str(k[0]), k[1], k[2], k[3])):
+        expected = raw.get(key, (0,) * len(ROLLUP_AMOUNT_FIELDS))
+        actual = stored.get(key, (0,) * len(ROLLUP_AMOUNT_FIELDS))
+        if tuple(expected) != tuple(actual):
+            mismatches.append({
+                'organization_id': str(key[0]),
+                'day': key[1].isoformat(),
+                'iras_transaction_code': key[2],
+                'currency': key[3],
+                'expected': dict(zip(ROLLUP_AMOUNT_FIELDS, expected)),
+                'actual': dict(zip(ROLLUP_AMOUNT_FIELDS, actual)),
+            })
+    return mismatches
+
+
+def _swap_rollup_day(organization_id, day, batch_size):
+    """Replace one organization-day of rollups with its invoice totals; returns rows written."""
+    from apps.billing.models import GSTDailyRollup
+    
+    with transaction.atomic():
+        # Block incremental upserts so none land between this day's scan and its swap
+        with connection.cursor() as cursor:
+            cursor.execute("LOCK TABLE gst_daily_rollups IN SHARE ROW EXCLUSIVE MODE")
+        raw = _raw_invoice_totals(day, day, organization_id)
+        _period_rollups(day, day, organization_id).delete()
+        GSTDailyRollup.objects.bulk_create(
+            [
+                GSTDailyRollup(
+                    organization_id=key[0],
+                    day=key[1],
+                    iras_transaction_code=key[2],
+                    currency=key[3],
+                    **dict(zip(ROLLUP_AMOUNT_FIELDS, amounts)),
+                )
+                for key, amounts in raw.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(raw)
+
+
+def rebuild_rollups(start, end, organization=None, batch_size=1000):
+    """
+    Replace rollups in an inclusive day range with totals from the invoices table.
+    
+    The range is aggregated once without any lock to find the organization-days
+    whose rollups differ. Each of those is then re-aggregated and swapped in its
+    own short transaction holding the rollup table lock, so saves are blocked for
+    one organization-day at a time rather than for the whole scan. Returns the
+    number of rollup rows written.
+    """
+    with _scan_timeout():
+        raw = _raw_invoice_totals(start, end, organization)
+    stored = _stored_rollups(start, end, organization)
+    empty = (0,) * len(ROLLUP_AMOUNT_FIELDS)
+    drifted = sorted(
+        {key[:2] for key in set(raw) | set(stored)
+         if tuple(raw.get(key, empty)) != tuple(stored.get(key, empty))},
+        key=lambda k: (str(k[0]), k[1]),
+    )
+    written = sum(_swap_rollup_day(organization_id, day, batch_size) for organization_id, day in drifted)
+    logger.info(
+        f"Rebuilt GST rollups {start} to {end}: replaced {len(drifted)} organization-days, wrote {written}"
+    )
+    return written
@@ -0,0 +1,87 @@
+"""
+Billing signal handlers for NexusCore.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.billing import reporting
+from apps.billing.catalog import invalidate_plan_catalog
+from apps.billing.entitlements import invalidate_all_entitlements, invalidate_entitlements
+from apps.billing.models import Invoice, Plan, Subscription
+from apps.webhooks.outbound import publish_event
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def plan_changed(sender, instance, **kwargs):
+    """Invalidate the plan catalog and compiled entitlements once committed."""
+    transaction.on_commit(invalidate_plan_catalog)
+    transaction.on_commit(invalidate_all_entitlements)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def subscription_changed(sender, instance, **kwargs):
+    organization_id = instance.organization_id
+    transaction.on_commit(lambda: invalidate_entitlements(organization_id))
+
+
+@receiver(post_save, sender=Subscription)
+def publish_saved_subscription(sender, instance, created, **kwargs):
+    """Deliver subscription.created / subscription.updated to the organization's endpoints."""
+    event_type = 'subscription.created' if created else 'subscription.updated'
+    publish_event(event_type, instance.organization_id, instance.webhook_payload())
+
+
+@receiver(post_delete, sender=Subscription)
+def publish_deleted_subscription(sender, instance, **kwargs):
+    publish_event('subscription.deleted', instance.organization_id, instance.webhook_payload())
+
+
+@receiver(post_init, sender=Invoice)
+def remember_invoice_rollup_state(sender, instance, **kwargs):
+    """Keep the loaded values so saves can roll up only what changed."""
+    if instance._state.adding:
+        instance._gst_rollup_state = None
+    elif instance.get_deferred_fields().intersection(reporting.ROLLUP_SOURCE_FIELDS):
+        # Loaded with only()/defer(); resolved lazily in pre_save
+        instance._gst_rollup_state = False
+    else:
+        instance._gst_rollup_state = reporting.snapshot_invoice(instance)
+
+
+@receiver(pre_save, sender=Invoice)
+def load_invoice_rollup_state(sender, instance, **kwargs):
+    if getattr(instance, '_gst_rollup_state', None) is False:
+        previous = sender.objects.filter(pk=instance.pk).values(*reporting.ROLLUP_SOURCE_FIELDS).first()
+        instance._gst_rollup_state = previous
+
+
+# Connected before roll_up_saved_invoice, which replaces the loaded state
+@receiver(post_save, sender=Invoice)
+def publish_saved_invoice(sender, instance, created, **kwargs):
+    """Deliver invoice.created, and invoice.<status> when the status changes."""
+    if created:
+        event_type = 'invoice.created'
+    else:
+        previous = getattr(instance, '_gst_rollup_state', None)
+        if not previous or previous['status'] == instance.status:
+            return
+        event_type = f"invoice.{instance.status}"
+    publish_event(event_type, instance.organization_id, instance.webhook_payload())
+
+
+@receiver(post_save, sender=Invoice)
+def roll_up_saved_invoice(sender, instance, created, **kwargs):
+    """Apply the invoice's change in contribution to the GST daily rollups."""
+    old = None if created else getattr(instance, '_gst_rollup_state', None)
+    new = reporting.snapshot_invoice(instance)
+    reporting.record_invoice_changes([(old, new)])
+    instance._gst_rollup_state = new
+
+
+@receiver(post_delete, sender=Invoice)
+def roll_up_deleted_invoice(sender, instance, **kwargs):
+    reporting.record_invoice_changes([(reporting.snapshot_invoice(instance), None)])
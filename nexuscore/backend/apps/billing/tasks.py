@@ -0,0 +1,107 @@
+"""
+Billing tasks for NexusCore.
+"""
+
+from celery import shared_task
+from celery.signals import worker_process_init
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def renew_due_subscriptions(chunk_size=None):
+    """Invoice and advance every subscription whose billing period has ended."""
+    from apps.billing.renewals import renew_due_subscriptions as run_renewals
+    
+    report = run_renewals(chunk_size=chunk_size)
+    return report.as_dict()
+
+
+@worker_process_init.connect
+def warm_invoice_pdf_renderer(**kwargs):
+    """Load templates and fonts once per worker process, before the first task."""
+    from apps.billing.pdf import get_renderer
+    
+    try:
+        get_renderer()
+    except Exception:
+        logger.exception("Could not pre-load invoice PDF renderer")
+
+
+@shared_task
+def generate_invoice_pdf(invoice_id):
+    """Render and store the PDF for a single invoice."""
+    from apps.billing.pdf import render_invoice_batch
+    
+    return render_invoice_batch([invoice_id])
+
+
+@shared_task
+def generate_invoice_pdfs(invoice_ids):
+    """Render and store PDFs for a batch of invoices in one task."""
+    from apps.billing.pdf import render_invoice_batch
+    
+    return render_invoice_batch(invoice_ids)
+
+
+def enqueue_invoice_pdfs(invoice_ids, batch_size=None):
+    """Split invoice ids into batches and queue one rendering task per batch."""
+    from django.conf import settings
+    
+    batch_size = batch_size or getattr(settings, 'INVOICE_PDF_BATCH_SIZE', 200)
+    invoice_ids = [str(invoice_id) for invoice_id in invoice_ids]
+    for start in range(0, len(invoice_ids), batch_size):
+        generate_invoice_pdfs.delay(invoice_ids[start:start + batch_size])
+
+
+@shared_task
+def send_dunning_emails():
+    """Send today's overdue-invoice reminders, resuming an interrupted run."""
+    from apps.billing.dunning import run_dunning
+    
+    run = run_dunning()
+    return {
+        'run_date': run.run_date.isoformat(),
+        'status': run.status,
+        'organizations_notified': run.organizations_notified,
+        'invoices_included': run.invoices_included,
+    }
+
+
+@shared_task
+def persist_idempotency_record(scope, key, request_path, request_method, request_hash,
+                               response_status_code, response_body, expires_at):
+    """Write a completed idempotent response through to IdempotencyRecord."""
+    import json
+    
+    from django.utils.dateparse import parse_datetime
+    
+    from apps.billing.models import IdempotencyRecord
+    
+    try:
+        body = json.loads(response_body) if response_body else None
+    except ValueError:
+        body = {'raw': response_body}
+    
+    IdempotencyRecord.objects.update_or_create(
+        scope=scope,
+        key=key,
+        defaults={
+            'request_path': request_path,
+            'request_method': request_method,
+            'request_hash': request_hash,
+            'status': 'completed',
+            'response_status_code': response_status_code,
+            'response_body': body,
+            'expires_at': parse_datetime(expires_at),
+        },
+    )
+
+
+@shared_task
+def flush_usage_counters():
+    """Flush pending Redis usage counters into UsageRecord."""
+    from apps.billing.metering import flush_usage
+    
+    return flush_usage()
@@ -0,0 +1,126 @@
+"""
+Plan-tiered API quotas for Django REST Framework.
+
+PlanQuotaThrottle limits each organization by the rates in its plan's
+``api_rate`` limit, a mapping of endpoint group to rate:
+
+    Plan.limits = {"api_rate": {"default": "6000/h", "exports": "20/h"}}
+
+Views choose their group with a ``quota_group`` attribute (default 'default').
+Limits come from the compiled entitlements, which are cached in-process, and usage
+is counted in Redis with the same single-call token bucket as RateLimitMiddleware,
+keyed per organization and group.
+
+The organization is taken from the view's ``organization_id`` URL kwarg or the
+X-Organization-ID header when the user is a member of it; otherwise the request
+is charged to the user's earliest membership, so omitting or forging the header
+never escapes the plan quota. Only users with no organization at all are limited
+per user at API_QUOTA_DEFAULT_RATES.
+"""
+
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from apps.billing.entitlements import get_limit
+from apps.core.ratelimit import KEY_PREFIX, get_buckets, parse_rate
+
+QUOTA_LIMIT_NAME = 'api_rate'
+DEFAULT_GROUP = 'default'
+
+_memberships = {}
+_memberships_lock = threading.Lock()
+
+
+def _cached(key, load):
+    """Memoise ``load()`` in-process for API_QUOTA_MEMBERSHIP_CACHE_SECONDS."""
+    now = time.monotonic()
+    cached = _memberships.get(key)
+    if cached is not None and now - cached[1] < settings.API_QUOTA_MEMBERSHIP_CACHE_SECONDS:
+        return cached[0]
+    
+    value = load()
+    with _memberships_lock:
+        if len(_memberships) >= 10000:
+            _memberships.clear()
+        _memberships[key] = (value, now)
+    return value
+
+
+def is_member(user_id, organization_id):
+    """Whether the user belongs to the organization; malformed ids are not members."""
+    from apps.organizations.models import OrganizationMembership
+    
+    try:
+        organization_id = uuid.UUID(str(organization_id))
+    except ValueError:
+        return False
+    return _cached(
+        ('member', str(user_id), str(organization_id)),
+        lambda: OrganizationMembership.objects.filter(
+            user_id=user_id, organization_id=organization_id
+        ).exists(),
+    )
+
+
+def home_organization(user_id):
+    """The organization a user's unscoped requests are charged to: their earliest membership."""
+    from apps.organizations.models import OrganizationMembership
+    
+    def load():
+        organization_id = OrganizationMembership.objects.filter(
+            user_id=user_id
+        ).order_by('joined_at').values_list('organization_id', flat=True).first()
+        return str(organization_id) if organization_id else None
+    
+    return _cached(('home', str(user_id)), load)
+
+
+def quota_rate(organization_id, group):
+    """The rate string for an organization's endpoint group, falling back to the defaults."""
+    defaults = settings.API_QUOTA_DEFAULT_RATES
+    rates = get_limit(organization_id, QUOTA_LIMIT_NAME) if organization_id else None
+    if isinstance(rates, dict):
+        return rates.get(group) or rates.get(DEFAULT_GROUP) or defaults.get(group) or defaults[DEFAULT_GROUP]
+    return defaults.get(group) or defaults[DEFAULT_GROUP]
+
+
+class PlanQuotaThrottle(BaseThrottle):
+    """Per-organization, per-endpoint-group request quotas from the subscribed plan."""
+    
+    def get_organization_id(self, request, view):
+        organization_id = (
+            getattr(view, 'kwargs', {}).get('organization_id')
+            or request.META.get('HTTP_X_ORGANIZATION_ID')
+        )
+        if organization_id and is_member(request.user.pk, organization_id):
+            return str(organization_id)
+        return home_organization(request.user.pk)
+    
+    def allow_request(self, request, view):
+        self.decision = None
+        if not request.user or not request.user.is_authenticated:
+            return True  # Anonymous traffic is left to AnonRateThrottle
+        
+        group = getattr(view, 'quota_group', DEFAULT_GROUP)
+        organization_id = self.get_organization_id(request, view)
+        count, seconds = parse_rate(quota_rate(organization_id, group))
+        if organization_id:
+            key = f"{KEY_PREFIX}:quota:org:{organization_id}:{group}"
+        else:
+            key = f"{KEY_PREFIX}:quota:user:{request.user.pk}:{group}"
+        
+        self.decision = get_buckets().take([(key, count, count, count / (seconds * 1000))])
+        if self.decision is None:
+            return True  # Redis unavailable: fail open
+        # Picked up by RateLimitMiddleware for the RateLimit-* response headers
+        request._request.rate_limit = self.decision
+        return self.decision.allowed
+    
+    def wait(self):
+        if self.decision is None:
+            return None
+        return self.decision.retry_after
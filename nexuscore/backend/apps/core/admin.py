@@ -5,12 +5,15 @@ Django admin configuration for NexusCore.
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
+from django.utils import timezone
+from django.utils.html import format_html
 
 from apps.users.models import User
 from apps.organizations.models import Organization, OrganizationMembership
-from apps.billing.models import Plan, Invoice, Subscription
+from apps.billing.models import DunningRun, GSTDailyRollup, Plan, Invoice, Subscription
 from apps.privacy.models import DSARRequest
 from apps.leads.models import Lead
+from apps.webhooks.models import WebhookEndpoint
 
 
 @admin.register(User)
@@ -109,39 +112,119 @@ class InvoiceAdmin(admin.ModelAdmin):
             'fields': ['amount_paid_cents', 'paid', 'paid_at'],
             'classes': ['collapse']
         }),
-        ('External', {'fields': ['stripe_invoice_id', 'stripe_payment_intent_id', 'pdf_url']}),
+        ('External', {'fields': ['stripe_invoice_id', 'stripe_payment_intent_id', 'pdf_download']}),
         ('Data', {'fields': ['due_date', 'line_items', 'metadata']}),
     ]
     
-    readonly_fields = ['gst_amount_cents', 'total_amount_cents', 'created_at']
+    readonly_fields = ['gst_amount_cents', 'total_amount_cents', 'created_at', 'pdf_download']
+    
+    def pdf_download(self, obj):
+        url = obj.pdf_download_url()
+        return format_html('<a href="{}">Download PDF</a>', url) if url else '-'
+    pdf_download.short_description = 'PDF'
     
     def total_amount_dollars(self, obj):
         return f"${obj.total_amount_cents / 100:.2f}"
     total_amount_dollars.short_description = 'Total (SGD)'
 
 
+@admin.register(GSTDailyRollup)
+class GSTDailyRollupAdmin(admin.ModelAdmin):
+    """Read-only view of GST daily rollups for F5 reporting."""
+    
+    list_display = ['day', 'organization', 'iras_transaction_code', 'currency', 'invoice_count', 'subtotal_cents', 'gst_amount_cents']
+    list_filter = ['iras_transaction_code', 'currency', 'day']
+    search_fields = ['organization__name']
+    ordering = ['-day']
+    list_select_related = ['organization']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DunningRun)
+class DunningRunAdmin(admin.ModelAdmin):
+    """Dunning run checkpoints."""
+    
+    list_display = ['run_date', 'status', 'organizations_notified', 'invoices_included', 'started_at', 'finished_at']
+    list_filter = ['status']
+    ordering = ['-run_date']
+    readonly_fields = ['last_organization_id', 'started_at', 'updated_at']
+
+
+class DSARSLAFilter(admin.SimpleListFilter):
+    """Filter open requests by SLA bucket with requested_at ranges."""
+    
+    title = 'SLA'
+    parameter_name = 'sla'
+    
+    def lookups(self, request, model_admin):
+        return [
+            ('within_sla', 'Within SLA'),
+            ('approaching_sla', 'Approaching SLA'),
+            ('breached_sla', 'Breached SLA'),
+        ]
+    
+    def queryset(self, request, queryset):
+        if self.value() in ('within_sla', 'approaching_sla', 'breached_sla'):
+            return getattr(queryset, self.value())()
+        return queryset
+
+
 @admin.register(DSARRequest)
 class DSARRequestAdmin(admin.ModelAdmin):
     """DSAR request admin for PDPA compliance."""
     
-    list_display = ['id', 'user_email', 'request_type', 'status', 'sla_status', 'requested_at']
-    list_filter = ['request_type', 'status', 'requested_at']
+    list_display = ['id', 'user_email', 'request_type', 'status', 'sla_status', 'sla_deadline', 'requested_at']
+    list_filter = [DSARSLAFilter, 'request_type', 'status', 'requested_at']
+    # Skip the unfiltered COUNT(*) on every changelist page
+    show_full_result_count = False
     search_fields = ['user_email', 'user__email']
     ordering = ['-requested_at']
     
     fieldsets = [
         (None, {'fields': ['user_email', 'user', 'request_type', 'status']}),
         ('Verification', {'fields': ['verified_at', 'verification_method']}),
-        ('Processing', {'fields': ['export_url', 'export_expires_at', 'failure_reason']}),
+        ('Processing', {'fields': ['export_download', 'export_expires_at', 'failure_reason']}),
         ('Deletion Approval', {'fields': ['deletion_approved_by', 'deletion_approved_at']}),
         ('Timestamps', {'fields': ['requested_at', 'processed_at']}),
     ]
     
-    readonly_fields = ['requested_at', 'verification_token']
+    readonly_fields = ['requested_at', 'verification_token', 'export_download']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_sla()
+    
+    def save_model(self, request, obj, form, change):
+        """Queue the erasure as soon as a deletion approval is recorded."""
+        from apps.privacy.erasure import schedule_erasure
+        
+        approval_changed = bool({'deletion_approved_by', 'deletion_approved_at'} & set(form.changed_data))
+        if approval_changed and obj.deletion_approved_by_id and not obj.deletion_approved_at:
+            obj.deletion_approved_at = timezone.now()
+        super().save_model(request, obj, form, change)
+        
+        if (approval_changed and obj.request_type == 'delete' and obj.status != 'completed'
+                and obj.deletion_approved_by_id and obj.deletion_approved_at):
+            schedule_erasure(obj)
+    
+    def export_download(self, obj):
+        url = obj.export_download_url()
+        return format_html('<a href="{}">Download export</a>', url) if url else '-'
+    export_download.short_description = 'Export'
     
     def sla_status(self, obj):
-        return obj.sla_status()
+        return obj.sla_bucket
     sla_status.short_description = 'SLA Status'
+    sla_status.admin_order_field = 'sla_bucket'
+    
+    def sla_deadline(self, obj):
+        return obj.sla_deadline
+    sla_deadline.short_description = 'SLA Deadline'
+    sla_deadline.admin_order_field = 'sla_deadline'
 
 
 @admin.register(Lead)
@@ -167,5 +250,26 @@ class LeadAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
 
 
+@admin.register(WebhookEndpoint)
+class WebhookEndpointAdmin(admin.ModelAdmin):
+    """Customer webhook endpoints; URLs must be public https hosts."""
+    
+    list_display = ['url', 'organization', 'is_active', 'max_concurrency', 'max_batch_size', 'created_at']
+    list_filter = ['is_active', 'created_at']
+    search_fields = ['url', 'organization__name']
+    ordering = ['-created_at']
+    list_select_related = ['organization']
+    raw_id_fields = ['organization']
+    
+    fieldsets = [
+        (None, {'fields': ['organization', 'url', 'event_types', 'is_active']}),
+        ('Signing', {'fields': ['secret']}),
+        ('Delivery Tuning', {'fields': ['max_concurrency', 'max_batch_size']}),
+        ('Timestamps', {'fields': ['created_at', 'updated_at']}),
+    ]
+    
+    readonly_fields = ['secret', 'created_at', 'updated_at']
+
+
 # Unregister the default Group model
 admin.site.unregister(Group)
\ No newline at end of file
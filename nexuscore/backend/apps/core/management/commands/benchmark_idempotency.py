@@ -0,0 +1,73 @@
+"""
+Benchmark the per-request latency added by IdempotencyMiddleware.
+
+Requires a reachable Redis (REDIS_URL). Write-through to Postgres is stubbed out so
+only the middleware's synchronous path is measured.
+"""
+
+import statistics
+import time
+import uuid
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test import RequestFactory
+
+from apps.core.middleware import IdempotencyMiddleware
+
+
+def _view(request):
+    return JsonResponse({'ok': True}, status=201)
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return {
+        'p50': samples[len(samples) // 2] * 1e6,
+        'p99': samples[int(len(samples) * 0.99) - 1] * 1e6,
+        'mean': statistics.fmean(samples) * 1e6,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Measure latency added by IdempotencyMiddleware for new and replayed keys.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+    
+    def _time(self, handler, requests):
+        samples = []
+        for request in requests:
+            started = time.perf_counter()
+            handler(request)
+            samples.append(time.perf_counter() - started)
+        return _percentiles(samples)
+    
+    def handle(self, *args, **options):
+        count = options['requests']
+        factory = RequestFactory()
+        middleware = IdempotencyMiddleware(_view)
+        body = '{"plan": "pro-month"}'
+        
+        def make(key=None):
+            headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+            return factory.post('/api/v1/bench/', body, content_type='application/json', **headers)
+        
+        keys = [f"bench-{uuid.uuid4().hex}" for _ in range(count)]
+        with mock.patch('apps.billing.tasks.persist_idempotency_record.delay'):
+            results = {
+                'baseline (no middleware)': self._time(_view, [make() for _ in range(count)]),
+                'no Idempotency-Key header': self._time(middleware, [make() for _ in range(count)]),
+                'new key (claim, db, store)': self._time(middleware, [make(key) for key in keys]),
+                'replayed key': self._time(middleware, [make(key) for key in keys]),
+            }
+        scope = middleware._scope(make())
+        middleware.redis.delete(*[middleware.redis_key(scope, key) for key in keys])
+        
+        baseline = results['baseline (no middleware)']['p50']
+        for name, stats in results.items():
+            self.stdout.write(
+                f"{name:<28} p50 {stats['p50']:8.1f}us  p99 {stats['p99']:8.1f}us  "
+                f"mean {stats['mean']:8.1f}us  (+{stats['p50'] - baseline:.1f}us p50)"
+            )
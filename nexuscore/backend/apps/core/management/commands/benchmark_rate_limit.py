@@ -0,0 +1,145 @@
+"""
+Benchmark the per-request latency added by RateLimitMiddleware and PlanQuotaThrottle.
+
+Requires a reachable Redis (REDIS_URL). Measures unlimited routes, allowed requests
+(one script call), requests shed by the in-process block, the plan quota throttle,
+and a legacy cache.get + cache.set limiter for comparison. A concurrency check then fires many
+threads at one bucket and confirms that exactly its capacity is admitted.
+"""
+
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework.request import Request
+
+from apps.billing.throttling import PlanQuotaThrottle
+from apps.core.middleware import RateLimitMiddleware
+from apps.core.ratelimit import KEY_PREFIX, RateLimiter
+
+
+def _view(request):
+    return JsonResponse({'ok': True})
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return {
+        'p50': samples[len(samples) // 2] * 1e6,
+        'p99': samples[int(len(samples) * 0.99) - 1] * 1e6,
+        'mean': statistics.fmean(samples) * 1e6,
+    }
+
+
+def _legacy(request):
+    """The previous limiter: two round trips and a window reset on every hit."""
+    key = f"ratelimit-legacy:{request.META.get('REMOTE_ADDR')}:{request.path}"
+    count = cache.get(key, 0)
+    if count >= 10 ** 9:
+        return JsonResponse({}, status=429)
+    cache.set(key, count + 1, timeout=60)
+    return _view(request)
+
+
+class Command(BaseCommand):
+    help = 'Measure latency added by RateLimitMiddleware and check it under concurrency.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--capacity', type=int, default=100)
+    
+    def _time(self, handler, requests):
+        samples = []
+        for request in requests:
+            started = time.perf_counter()
+            handler(request)
+            samples.append(time.perf_counter() - started)
+        return _percentiles(samples)
+    
+    def handle(self, *args, **options):
+        count = options['requests']
+        run = uuid.uuid4().hex[:8]
+        factory = RequestFactory()
+        
+        def make(path, address='10.0.0.1'):
+            request = factory.get(path, REMOTE_ADDR=address)
+            request.user = AnonymousUser()
+            return request
+        
+        middleware = RateLimitMiddleware(_view)
+        middleware.limiter = RateLimiter(rules=[
+            {'name': f'bench-open-{run}', 'path': r'^/bench/open/$', 'key': 'ip', 'rate': f'{count * 10}/m'},
+            {'name': f'bench-tight-{run}', 'path': r'^/bench/tight/$', 'key': 'ip', 'rate': '1/h'},
+        ])
+        middleware.limiter.redis.ping()
+        
+        # Exhaust the tight bucket once so later requests are shed locally
+        middleware(make('/bench/tight/'))
+        middleware(make('/bench/tight/'))
+        
+        results = {
+            'baseline (no middleware)': self._time(_view, [make('/bench/none/') for _ in range(count)]),
+            'unlimited route': self._time(middleware, [make('/bench/none/') for _ in range(count)]),
+            'limited, allowed': self._time(middleware, [make('/bench/open/') for _ in range(count)]),
+            'limited, shed locally': self._time(middleware, [make('/bench/tight/') for _ in range(count)]),
+            'legacy get + set': self._time(_legacy, [make('/bench/open/') for _ in range(count)]),
+        }
+        
+        # Plan quota throttle for an authenticated user without an organization
+        throttle = PlanQuotaThrottle()
+        view = type('BenchView', (), {'kwargs': {}, 'quota_group': f'bench-{run}'})()
+        user = SimpleNamespace(pk=f'bench-{run}', is_authenticated=True)
+        
+        def quota(request):
+            throttle.allow_request(request, view)
+        
+        def make_api():
+            request = Request(make('/api/v1/bench/'))
+            request.user = user
+            return request
+        
+        with override_settings(API_QUOTA_DEFAULT_RATES={'default': f'{count * 10}/m'}):
+            results['plan quota throttle'] = self._time(quota, [make_api() for _ in range(count)])
+        
+        baseline = results['baseline (no middleware)']['p50']
+        for name, stats in results.items():
+            self.stdout.write(
+                f"{name:<26} p50 {stats['p50']:8.1f}us  p99 {stats['p99']:8.1f}us  "
+                f"mean {stats['mean']:8.1f}us  (+{stats['p50'] - baseline:.1f}us p50)"
+            )
+        
+        # Concurrency: the bucket must admit exactly its capacity however requests interleave
+        capacity = options['capacity']
+        limiter = RateLimiter(rules=[
+            {'name': f'bench-burst-{run}', 'path': r'^/bench/burst/$', 'rate': f'{capacity}/h'},
+        ])
+        admitted = []
+        lock = threading.Lock()
+        
+        def hit(_):
+            decision = limiter.check(make('/bench/burst/'))
+            with lock:
+                admitted.append(decision.allowed)
+        
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            list(executor.map(hit, range(capacity * 3)))
+        allowed = sum(admitted)
+        style = self.style.SUCCESS if allowed == capacity else self.style.ERROR
+        self.stdout.write(style(
+            f"Concurrency: {allowed} of {len(admitted)} requests admitted for capacity {capacity}"
+        ))
+        
+        keys = list(middleware.limiter.redis.scan_iter(f"{KEY_PREFIX}:*bench-*{run}*"))
+        if keys:
+            middleware.limiter.redis.delete(*keys)
+        cache.delete_pattern('ratelimit-legacy:*')
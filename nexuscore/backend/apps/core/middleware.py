@@ -2,10 +2,16 @@
 Core middleware for NexusCore with Django 6.0 features.
 """
 
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.conf import settings
+from django.utils import timezone
+import json
+import logging
 import time
 import hashlib
+import uuid
+
+logger = logging.getLogger(__name__)
 
 
 class SecurityHeadersMiddleware:
@@ -41,30 +47,56 @@ class SecurityHeadersMiddleware:
 
 
 class RateLimitMiddleware:
-    """Simple rate limiting middleware for authentication endpoints."""
+    """
+    Token-bucket rate limiting for the routes in settings.RATE_LIMIT_RULES.
+    
+    One atomic Redis call per limited request (see apps.core.ratelimit); clients
+    already known to be over a limit are turned away without touching Redis.
+    Responses carry RateLimit-* headers for the tightest limit that applied,
+    including the plan quotas checked by PlanQuotaThrottle.
+    """
     
     def __init__(self, get_response):
+        from apps.core.ratelimit import RateLimiter
+        
         self.get_response = get_response
+        self.enabled = getattr(settings, 'RATE_LIMIT_ENABLED', True)
+        self.limiter = RateLimiter()
     
     def __call__(self, request):
-        # Only apply to authentication endpoints
-        if request.path in ['/api/v1/auth/login/', '/api/v1/auth/register/']:
-            from django.core.cache import cache
-            
-            cache_key = f"ratelimit:{request.META.get('REMOTE_ADDR')}:{request.path}"
-            
-            # Check rate limit
-            request_count = cache.get(cache_key, 0)
-            if request_count >= 5:  # 5 requests per minute
-                return JsonResponse(
-                    {'error': 'Too many requests. Please try again later.'},
-                    status=429
-                )
-            
-            # Increment counter
-            cache.set(cache_key, request_count + 1, timeout=60)
+        from apps.core.ratelimit import apply_headers
+        
+        decision = self.limiter.check(request) if self.enabled else None
+        if decision is not None and not decision.allowed:
+            response = JsonResponse(
+                {'error': 'Too many requests. Please try again later.'},
+                status=429
+            )
+        else:
+            response = self.get_response(request)
+        
+        # Plan quota throttles record their decision on the request; report the tighter one
+        quota = getattr(request, 'rate_limit', None)
+        if quota is not None and (decision is None or quota.remaining < decision.remaining):
+            decision = quota
+        if decision is not None:
+            apply_headers(response, decision)
+        return response
+
+
+class EventFlushMiddleware:
+    """Write events buffered during the request once the response is ready."""
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        from apps.events.writer import flush_events
         
-        return self.get_response(request)
+        try:
+            return self.get_response(request)
+        finally:
+            flush_events()
 
 
 class CustomCSPMiddleware:
@@ -90,4 +122,205 @@ class CustomCSPMiddleware:
         
         response['Content-Security-Policy'] = csp_header
         
-        return response
\ No newline at end of file
+        return response
+
+
+# Replace the value only if it still holds our claim (compare-and-set)
+IDEMPOTENCY_COMPLETE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+end
+return false
+"""
+
+# Delete the value only if it still holds our claim
+IDEMPOTENCY_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class IdempotencyMiddleware:
+    """
+    Enforce Idempotency-Key on mutating requests with Redis as the fast path.
+    
+    Keys are scoped to the caller (user, Authorization header, session or IP), so
+    two clients that pick the same key never see each other's responses. The
+    first request for a key claims it with SET NX; if Redis has lost the entry
+    the IdempotencyRecord written through by a Celery task is replayed instead,
+    otherwise the view runs and its response is cached. Repeats with the same
+    request hash replay the cached response, concurrent repeats wait for the
+    in-flight request, and a reused key with a different payload is rejected
+    with 422.
+    """
+    
+    HEADER = 'HTTP_IDEMPOTENCY_KEY'
+    METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+    KEY_PREFIX = 'idempotency:'
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.ttl = getattr(settings, 'IDEMPOTENCY_TTL_SECONDS', 24 * 3600)
+        self.lock_ttl = getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 60)
+        self.wait_timeout = getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 10)
+        self._redis = None
+        self._complete = None
+        self._release = None
+    
+    @property
+    def redis(self):
+        if self._redis is None:
+            from django_redis import get_redis_connection
+            
+            self._redis = get_redis_connection('default')
+            self._complete = self._redis.register_script(IDEMPOTENCY_COMPLETE_SCRIPT)
+            self._release = self._redis.register_script(IDEMPOTENCY_RELEASE_SCRIPT)
+        return self._redis
+    
+    def _scope(self, request):
+        """Digest identifying the caller that owns the key."""
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            principal = f"user:{user.pk}"
+        elif request.META.get('HTTP_AUTHORIZATION'):
+            # Token-authenticated API clients are only resolved later, inside DRF
+            principal = f"auth:{request.META['HTTP_AUTHORIZATION']}"
+        elif getattr(request, 'session', None) is not None and request.session.session_key:
+            principal = f"session:{request.session.session_key}"
+        else:
+            principal = f"ip:{request.META.get('REMOTE_ADDR', '')}"
+        return hashlib.sha256(principal.encode()).hexdigest()
+    
+    def redis_key(self, scope, key):
+        return f"{self.KEY_PREFIX}{scope}:{hashlib.sha256(key.encode()).hexdigest()}"
+    
+    def __call__(self, request):
+        key = request.META.get(self.HEADER)
+        if not key or request.method not in self.METHODS:
+            return self.get_response(request)
+        if len(key) > 255:
+            return JsonResponse({'error': 'Idempotency-Key must be at most 255 characters.'}, status=400)
+        
+        request_hash = hashlib.sha256(
+            b'\n'.join([request.method.encode(), request.path.encode(), request.body])
+        ).hexdigest()
+        scope = self._scope(request)
+        redis_key = self.redis_key(scope, key)
+        claim = json.dumps({
+            'status': 'processing',
+            'request_hash': request_hash,
+            'owner': uuid.uuid4().hex,
+        })
+        
+        deadline = time.monotonic() + self.wait_timeout
+        delay = 0.01
+        while True:
+            if self.redis.set(redis_key, claim, nx=True, ex=self.lock_ttl):
+                stored = self._stored(scope, key, redis_key, claim, request_hash)
+                if stored is not None:
+                    return stored
+                return self._execute(request, scope, key, redis_key, claim, request_hash)
+            
+            raw = self.redis.get(redis_key)
+            if raw is None:
+                continue  # Expired or released between SET and GET; claim again
+            state = json.loads(raw)
+            if state['request_hash'] != request_hash:
+                return JsonResponse(
+                    {'error': 'Idempotency-Key was already used with a different request.'},
+                    status=422
+                )
+            if state['status'] == 'completed':
+                return self._replay(state)
+            
+            # Another request with this key is in flight; wait for its result
+            if time.monotonic() >= deadline:
+                return JsonResponse(
+                    {'error': 'A request with this Idempotency-Key is still being processed.'},
+                    status=409
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+    
+    def _stored(self, scope, key, redis_key, claim, request_hash):
+        """Replay a completed IdempotencyRecord that Redis no longer holds, if any."""
+        from apps.billing.models import IdempotencyRecord
+        
+        record = IdempotencyRecord.objects.filter(
+            scope=scope, key=key, status='completed', expires_at__gt=timezone.now()
+        ).first()
+        if record is None:
+            return None
+        if record.request_hash != request_hash:
+            self._release(keys=[redis_key], args=[claim])
+            return JsonResponse(
+                {'error': 'Idempotency-Key was already used with a different request.'},
+                status=422
+            )
+        
+        body = record.response_body
+        if isinstance(body, dict) and list(body) == ['raw']:
+            body, content_type = body['raw'], 'text/plain'
+        else:
+            body, content_type = json.dumps(body), 'application/json'
+        state = {
+            'status': 'completed',
+            'request_hash': request_hash,
+            'status_code': record.response_status_code,
+            'content_type': content_type,
+            'body': body,
+        }
+        ttl = max(int((record.expires_at - timezone.now()).total_seconds()), 1)
+        self._complete(keys=[redis_key], args=[claim, json.dumps(state), ttl])
+        return self._replay(state)
+    
+    def _execute(self, request, scope, key, redis_key, claim, request_hash):
+        try:
+            response = self.get_response(request)
+        except Exception:
+            self._release(keys=[redis_key], args=[claim])
+            raise
+        
+        # Only deterministic outcomes are cached; server errors may be retried
+        if response.status_code >= 500 or response.streaming:
+            self._release(keys=[redis_key], args=[claim])
+            return response
+        
+        body = response.content.decode(response.charset or 'utf-8', errors='replace')
+        completed = {
+            'status': 'completed',
+            'request_hash': request_hash,
+            'status_code': response.status_code,
+            'content_type': response.get('Content-Type', 'application/json'),
+            'body': body,
+        }
+        self._complete(keys=[redis_key], args=[claim, json.dumps(completed), self.ttl])
+        
+        from apps.billing.tasks import persist_idempotency_record
+        
+        # The mutation has already committed; a broker outage must not turn it into a 500
+        try:
+            persist_idempotency_record.delay(
+                scope=scope,
+                key=key,
+                request_path=request.path,
+                request_method=request.method,
+                request_hash=request_hash,
+                response_status_code=response.status_code,
+                response_body=body,
+                expires_at=(timezone.now() + timezone.timedelta(seconds=self.ttl)).isoformat(),
+            )
+        except Exception as e:
+            logger.error(f"Could not queue idempotency record for key {key}: {e}")
+        return response
+    
+    def _replay(self, state):
+        response = HttpResponse(
+            state['body'],
+            status=state['status_code'],
+            content_type=state['content_type'],
+        )
+        response['Idempotent-Replayed'] = 'true'
+        return response
@@ -0,0 +1,268 @@
+"""
+Token-bucket rate limiting in one Redis round trip.
+
+Rules come from settings.RATE_LIMIT_RULES. Each rule matches a path regex (and
+optionally methods) and keys its bucket by any of 'ip', 'user', 'organization'
+(a named ``organization_id`` group in the path, or else an X-Organization-ID
+header, only when the user is a verified member of it; otherwise the user or ip)
+or nothing at all, which makes it a per-route limit. Every bucket a request
+touches is checked and debited by a single Lua script, using Redis' clock, so
+concurrent requests cannot slip past the limit and the window never resets on
+each hit.
+
+A denied client is remembered in-process until its retry-after passes; requests
+in that period are rejected without a Redis call. If Redis is unavailable the
+limiter fails open.
+"""
+
+import logging
+import math
+import re
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'ratelimit'
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# KEYS: buckets; ARGV[1]: cost, then capacity and refill per ms for each bucket.
+# Returns {allowed, retry_after_ms, remaining per bucket...}; buckets are only
+# debited if every one of them has enough tokens.
+TOKEN_BUCKET_SCRIPT = """
+redis.replicate_commands()  -- allow writes after TIME on Redis < 5
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local levels = {}
+local allowed = 1
+local retry_after = 0
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 2])
+    local refill = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local level = tonumber(state[1])
+    if level == nil then
+        level = capacity
+    else
+        level = math.min(capacity, level + math.max(0, now - tonumber(state[2])) * refill)
+    end
+    if level < cost then
+        allowed = 0
+        retry_after = math.max(retry_after, math.ceil((cost - level) / refill))
+    end
+    levels[i] = level
+end
+local result = {allowed, retry_after}
+for i = 1, #KEYS do
+    local level = levels[i]
+    if allowed == 1 then
+        local capacity = tonumber(ARGV[i * 2])
+        local refill = tonumber(ARGV[i * 2 + 1])
+        level = level - cost
+        redis.call('HSET', KEYS[i], 'tokens', tostring(level), 'ts', now)
+        redis.call('PEXPIRE', KEYS[i], math.ceil((capacity - level) / refill) + 1000)
+    end
+    result[#result + 1] = math.floor(level)
+end
+return result
+"""
+
+Rule = namedtuple('Rule', ['name', 'pattern', 'methods', 'key', 'capacity', 'refill_per_ms', 'limit'])
+Decision = namedtuple('Decision', ['allowed', 'limit', 'remaining', 'retry_after', 'reset'])
+
+
+def parse_rate(rate):
+    """'100/m' -> (100, 60); periods may carry a multiplier, e.g. '10/5m'."""
+    count, period = rate.split('/')
+    match = re.fullmatch(r'(\d*)([smhd])', period.strip())
+    if not match:
+        raise ValueError(f"Invalid rate {rate!r}")
+    return int(count), int(match.group(1) or 1) * PERIODS[match.group(2)]
+
+
+def compile_rules(config):
+    rules = []
+    for entry in config:
+        count, seconds = parse_rate(entry['rate'])
+        key = entry.get('key', ())
+        rules.append(Rule(
+            name=entry['name'],
+            pattern=re.compile(entry['path']),
+            methods=frozenset(method.upper() for method in entry.get('methods', ())),
+            key=(key,) if isinstance(key, str) else tuple(key),
+            capacity=entry.get('burst', count),
+            refill_per_ms=count / (seconds * 1000),
+            limit=count,
+        ))
+    return rules
+
+
+class TokenBuckets:
+    """Debits sets of buckets atomically in Redis, with an in-process block for denied ones."""
+    
+    LOCAL_BLOCK_MAX_ENTRIES = 10000
+    
+    def __init__(self, redis=None):
+        self._redis = redis
+        self._script = None
+        self._blocked = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def redis(self):
+        if self._redis is None:
+            from django_redis import get_redis_connection
+            
+            self._redis = get_redis_connection('default')
+        return self._redis
+    
+    @property
+    def script(self):
+        if self._script is None:
+            self._script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+        return self._script
+    
+    def _locally_blocked(self, keys):
+        now = time.monotonic()
+        for key in keys:
+            until = self._blocked.get(key)
+            if until is not None:
+                if until > now:
+                    return until - now
+                self._blocked.pop(key, None)
+        return None
+    
+    def _block_locally(self, keys, seconds):
+        with self._lock:
+            if len(self._blocked) >= self.LOCAL_BLOCK_MAX_ENTRIES:
+                self._blocked.clear()
+            until = time.monotonic() + seconds
+            for key in keys:
+                self._blocked[key] = until
+    
+    def take(self, buckets, cost=1):
+        """
+        Debit ``cost`` from every (key, limit, capacity, refill_per_ms) bucket, or none.
+        
+        Returns a Decision reporting the tightest bucket, or None if Redis is unavailable.
+        """
+        keys = [bucket[0] for bucket in buckets]
+        limit = min(bucket[1] for bucket in buckets)
+        blocked_for = self._locally_blocked(keys)
+        if blocked_for is not None:
+            return Decision(False, limit, 0, blocked_for, blocked_for)
+        
+        args = [cost]
+        for _, _, capacity, refill_per_ms in buckets:
+            args.extend([capacity, repr(refill_per_ms)])
+        try:
+            result = self.script(keys=keys, args=args)
+        except Exception:
+            logger.warning("Rate limiter unavailable; allowing request")
+            return None
+        allowed, retry_after_ms, *remaining = (int(value) for value in result)
+        if not allowed:
+            # Only the buckets that are actually empty justify a local block
+            empty = [key for key, left in zip(keys, remaining) if left < cost]
+            self._block_locally(empty or keys, retry_after_ms / 1000)
+        # Seconds until the tightest bucket is full again
+        reset = max(
+            (capacity - left) / refill_per_ms / 1000
+            for (_, _, capacity, refill_per_ms), left in zip(buckets, remaining)
+        )
+        return Decision(bool(allowed), limit, max(min(remaining), 0), retry_after_ms / 1000, reset)
+
+
+def apply_headers(response, decision):
+    """Standard RateLimit-* headers (plus Retry-After when denied) for a Decision."""
+    response['RateLimit-Limit'] = str(decision.limit)
+    response['RateLimit-Remaining'] = str(decision.remaining)
+    response['RateLimit-Reset'] = str(max(0, math.ceil(decision.reset)))
+    if not decision.allowed:
+        response['Retry-After'] = str(max(1, math.ceil(decision.retry_after)))
+    return response
+
+
+_buckets = None
+
+
+def get_buckets():
+    """Process-wide TokenBuckets, so every limiter shares one script handle and local block."""
+    global _buckets
+    if _buckets is None:
+        _buckets = TokenBuckets()
+    return _buckets
+
+
+class RateLimiter:
+    """Matches requests to rules and checks all their buckets atomically."""
+    
+    def __init__(self, rules=None, buckets=None):
+        self.rules = compile_rules(settings.RATE_LIMIT_RULES if rules is None else rules)
+        self.buckets_backend = buckets or get_buckets()
+    
+    @property
+    def redis(self):
+        return self.buckets_backend.redis
+    
+    def _organization(self, request, match, user):
+        """Organization from the path or header, only if the user's membership is verified."""
+        from apps.billing.throttling import is_member
+        
+        # Both are client-supplied and this runs before the view's permission checks;
+        # trusting them would let a client rotate the id to dodge its own limit or
+        # spend another tenant's bucket
+        organization = match.groupdict().get('organization_id') or request.META.get('HTTP_X_ORGANIZATION_ID')
+        if organization and user is not None and user.is_authenticated and is_member(user.pk, organization):
+            return organization
+        return None
+    
+    def _identity(self, rule, request, match):
+        parts = []
+        user = getattr(request, 'user', None)
+        for part in rule.key:
+            if part == 'ip':
+                parts.append(f"ip:{request.META.get('REMOTE_ADDR', '')}")
+            elif part == 'user':
+                if user is not None and user.is_authenticated:
+                    parts.append(f"user:{user.pk}")
+                else:
+                    parts.append(f"ip:{request.META.get('REMOTE_ADDR', '')}")
+            elif part == 'organization':
+                organization = self._organization(request, match, user)
+                if organization:
+                    parts.append(f"org:{organization}")
+                elif user is not None and user.is_authenticated:
+                    parts.append(f"user:{user.pk}")
+                else:
+                    parts.append(f"ip:{request.META.get('REMOTE_ADDR', '')}")
+            else:
+                raise ValueError(f"Unknown rate limit key {part!r} in rule {rule.name}")
+        return ':'.join(parts) or 'all'
+    
+    def buckets(self, request):
+        """[(rule, redis key)] for every rule that applies to the request."""
+        matched = []
+        for rule in self.rules:
+            if rule.methods and request.method not in rule.methods:
+                continue
+            match = rule.pattern.search(request.path)
+            if match is None:
+                continue
+            identity = self._identity(rule, request, match)
+            if identity is not None:
+                matched.append((rule, f"{KEY_PREFIX}:{rule.name}:{identity}"))
+        return matched
+    
+    def check(self, request, cost=1):
+        """Decision for the request, or None if no rule applies."""
+        matched = self.buckets(request)
+        if not matched:
+            return None
+        return self.buckets_backend.take(
+            [(key, rule.limit, rule.capacity, rule.refill_per_ms) for rule, key in matched], cost,
+        )
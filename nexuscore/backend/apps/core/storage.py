@@ -0,0 +1,23 @@
+"""
+Links to private objects in file storage.
+"""
+
+from django.core.files.storage import default_storage
+
+
+def presigned_url(name, ttl, storage=None):
+    """
+    URL for a stored object that stays valid for ``ttl`` (a timedelta).
+    
+    S3 URLs are signed with the bucket's own client: with AWS_S3_CUSTOM_DOMAIN set,
+    storage.url() returns an unsigned custom-domain URL, which a private bucket
+    rejects. Other backends fall back to storage.url().
+    """
+    storage = storage or default_storage
+    if hasattr(storage, 'bucket_name') and hasattr(storage, 'connection'):
+        return storage.connection.meta.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': storage.bucket_name, 'Key': storage._normalize_name(name)},
+            ExpiresIn=int(ttl.total_seconds()),
+        )
+    return storage.url(name)
@@ -0,0 +1,156 @@
+"""
+Streaming NDJSON export of events.
+
+Events are walked in (created_at, id) order with a keyset cursor: each page is a
+fresh indexed range query read through a server-side cursor, so memory stays
+constant however many rows are exported and no page ever pays an OFFSET. Lines are
+optionally gzip-compressed on the fly and written to a file or streamed over HTTP.
+"""
+
+import time
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+
+from apps.events.models import Event
+
+EXPORT_FIELDS = ('id', 'created_at', 'event_type', 'user_id', 'organization_id', 'data')
+
+
+class ExportStats:
+    """Rows and bytes produced by an export, and how fast."""
+    
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self.finished = None
+    
+    @property
+    def seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+    
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+    
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def export_queryset(organization=None, user=None, event_types=None, start=None, end=None):
+    queryset = Event.objects.all()
+    if organization is not None:
+        queryset = queryset.filter(organization=organization)
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    if event_types:
+        queryset = queryset.filter(event_type__in=event_types)
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+    return queryset
+
+
+def iter_events(queryset, page_size=10000, chunk_size=2000):
+    """Yield event dicts in (created_at, id) order using keyset pagination."""
+    cursor = None
+    while True:
+        page = queryset
+        if cursor is not None:
+            created_at, event_id = cursor
+            page = page.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=event_id)
+            )
+        rows = page.order_by('created_at', 'id').values(*EXPORT_FIELDS)[:page_size]
+        last = None
+        for row in rows.iterator(chunk_size=chunk_size):
+            last = row
+            yield row
+        if last is None:
+            return
+        cursor = (last['created_at'], last['id'])
+
+
+def ndjson_lines(rows, stats=None):
+    """Encode rows as newline-delimited JSON, one bytes object per row."""
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        line = encoder.encode(row).encode('utf-8') + b'\n'
+        if stats is not None:
+            stats.rows += 1
+        yield line
+
+
+def gzip_chunks(chunks, level=6, flush_bytes=64 * 1024):
+    """Incrementally gzip an iterable of bytes, yielding compressed blocks."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    pending = 0
+    for chunk in chunks:
+        pending += len(chunk)
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+        if pending >= flush_bytes:
+            yield compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+    yield compressor.flush()
+
+
+def buffered(chunks, size=64 * 1024):
+    """Coalesce many small byte strings into blocks of roughly ``size`` bytes."""
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def export_stream(queryset, compress=False, stats=None, page_size=10000):
+    """Byte blocks of the NDJSON (or gzipped NDJSON) export of ``queryset``."""
+    stats = stats or ExportStats()
+    blocks = buffered(ndjson_lines(iter_events(queryset, page_size=page_size), stats))
+    if compress:
+        blocks = gzip_chunks(blocks)
+    for block in blocks:
+        stats.bytes += len(block)
+        yield block
+    stats.finished = time.perf_counter()
+
+
+def export_to_file(path, queryset, compress=False, page_size=10000, progress=None):
+    """Write an export to ``path``; returns ExportStats."""
+    stats = ExportStats()
+    with open(path, 'wb') as fh:
+        for block in export_stream(queryset, compress, stats, page_size):
+            fh.write(block)
+            if progress:
+                progress(stats)
+    return stats
+
+
+def streaming_response(queryset, filename, compress=False):
+    """StreamingHttpResponse serving the export as a file download."""
+    if compress:
+        filename = f"{filename}.gz"
+    response = StreamingHttpResponse(
+        export_stream(queryset, compress),
+        content_type='application/gzip' if compress else 'application/x-ndjson',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
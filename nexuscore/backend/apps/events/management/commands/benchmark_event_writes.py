@@ -0,0 +1,76 @@
+"""
+Compare Event write throughput: per-row create() versus the buffered writer.
+
+Each mode writes the same number of synthetic events and reports events per
+second. Synthetic events are deleted afterwards.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from apps.events.models import Event
+from apps.events.writer import emit_event, flush_events, flush_spool
+
+BENCHMARK_EVENT_TYPE = 'benchmark.event_write'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-row Event inserts against the buffered event writer.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10000)
+        parser.add_argument('--buffer-size', type=int, default=500)
+        parser.add_argument('--spool', action='store_true',
+                            help='Also measure the Redis spool path')
+    
+    def _per_row(self, count):
+        for index in range(count):
+            Event.objects.create(event_type=BENCHMARK_EVENT_TYPE, data={'n': index})
+    
+    def _buffered(self, count):
+        for index in range(count):
+            emit_event(BENCHMARK_EVENT_TYPE, data={'n': index})
+        flush_events()
+    
+    def _audit(self, count):
+        with transaction.atomic():
+            for index in range(count):
+                emit_event(BENCHMARK_EVENT_TYPE, data={'n': index}, audit=True)
+    
+    def _spool(self, count):
+        with override_settings(EVENTS_SPOOL_ENABLED=True):
+            for index in range(count):
+                emit_event(BENCHMARK_EVENT_TYPE, data={'n': index})
+        flush_spool()
+    
+    def handle(self, *args, **options):
+        count = options['events']
+        modes = [
+            ('per-row create()', self._per_row),
+            ('buffered', self._buffered),
+            ('audit (flush at commit)', self._audit),
+        ]
+        if options['spool']:
+            modes.append(('redis spool', self._spool))
+        
+        baseline = None
+        try:
+            with override_settings(EVENTS_BUFFER_SIZE=options['buffer_size'],
+                                   EVENTS_BUFFER_MAX_AGE_SECONDS=3600):
+                for label, run in modes:
+                    Event.objects.filter(event_type=BENCHMARK_EVENT_TYPE).delete()
+                    started = time.perf_counter()
+                    run(count)
+                    elapsed = time.perf_counter() - started
+                    written = Event.objects.filter(event_type=BENCHMARK_EVENT_TYPE).count()
+                    rate = written / elapsed
+                    baseline = baseline or rate
+                    self.stdout.write(
+                        f"{label:<26} {written} events in {elapsed:.2f}s "
+                        f"= {rate:10.1f} events/s (x{rate / baseline:.1f})"
+                    )
+        finally:
+            Event.objects.filter(event_type=BENCHMARK_EVENT_TYPE).delete()
@@ -0,0 +1,102 @@
+"""
+Manage monthly partitions of the events table.
+
+Converting an existing table online:
+
+    event_partitions prepare     # staging table + mirror trigger
+    event_partitions copy        # resumable chunked backfill (re-run until done)
+    event_partitions verify      # per-month counts, legacy vs staging
+    event_partitions swap        # brief exclusive lock, rename tables
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.events import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create, expire and migrate monthly partitions of the events table.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=['status', 'create', 'maintain', 'drop-expired', 'prepare', 'copy', 'verify', 'swap'],
+        )
+        parser.add_argument('--months-ahead', type=int, default=None)
+        parser.add_argument('--retention-months', type=int, default=None)
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between copied chunks')
+        parser.add_argument('--max-chunks', type=int, default=None)
+    
+    def handle(self, *args, **options):
+        action = options['action']
+        
+        if action == 'status':
+            state = 'partitioned' if partitions.is_partitioned() else 'not partitioned'
+            self.stdout.write(f"events is {state}")
+            for month, name in partitions.list_partitions():
+                self.stdout.write(f"  {month:%Y-%m}  {name}")
+            return
+        
+        if action == 'create':
+            if partitions.is_partitioned():
+                raise CommandError('events is already partitioned')
+            partitions.create_parent()
+            created = partitions.ensure_partitions(options['months_ahead'])
+            self.stdout.write(self.style.SUCCESS(f"Created partitioned events with {len(created)} partitions"))
+            return
+        
+        if action in ('maintain', 'drop-expired'):
+            if not partitions.is_partitioned():
+                raise CommandError("events is not partitioned; run 'prepare', 'copy' and 'swap' first")
+            if action == 'maintain':
+                created = partitions.ensure_partitions(options['months_ahead'])
+                self.stdout.write(f"Created {len(created)} partitions: {', '.join(created) or '-'}")
+                return
+            # Normally done by the 'events' retention policy; this is the manual override
+            dropped = partitions.drop_expired_partitions(options['retention_months'], options['dry_run'])
+            verb = 'Would drop' if options['dry_run'] else 'Dropped'
+            self.stdout.write(f"{verb} {len(dropped)} partitions: {', '.join(dropped) or '-'}")
+            return
+        
+        if partitions.is_partitioned():
+            raise CommandError('events is already partitioned')
+        
+        if action == 'prepare':
+            partitions.prepare_conversion()
+            self.stdout.write(self.style.SUCCESS(
+                f"Created {partitions.STAGING_TABLE} and started mirroring writes into it"
+            ))
+        
+        elif action == 'copy':
+            def progress(chunk, rows, cursor, seconds):
+                self.stdout.write(
+                    f"chunk {chunk}: {rows} rows in {seconds * 1000:.0f}ms "
+                    f"({rows / seconds:,.0f} rows/s), up to {cursor[0].isoformat()}"
+                )
+            
+            copied = partitions.copy_history(
+                chunk_size=options['chunk_size'],
+                pause=options['pause'],
+                max_chunks=options['max_chunks'],
+                progress=progress,
+            )
+            self.stdout.write(self.style.SUCCESS(f"Copied {copied} rows"))
+        
+        elif action == 'verify':
+            mismatched = 0
+            for month, legacy, staged in partitions.compare_counts():
+                marker = '' if legacy == staged else '  <- differs'
+                mismatched += bool(marker)
+                self.stdout.write(f"{month:%Y-%m}  {legacy:>12}  {staged:>12}{marker}")
+            if mismatched:
+                raise CommandError(f"{mismatched} months differ; re-run 'copy' before swapping")
+            self.stdout.write(self.style.SUCCESS('Row counts match'))
+        
+        else:
+            partitions.swap_tables()
+            self.stdout.write(self.style.SUCCESS(
+                f"events is now partitioned; drop {partitions.LEGACY_TABLE} once satisfied"
+            ))
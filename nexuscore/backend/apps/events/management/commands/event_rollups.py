@@ -0,0 +1,81 @@
+"""
+Run, compact and query event analytics rollups.
+"""
+
+import json
+from datetime import datetime, time as dt_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.events.rollups import (
+    compact_rollups,
+    event_series,
+    event_totals,
+    reconcile_rollups,
+    rollup_events,
+)
+
+
+class Command(BaseCommand):
+    help = 'Advance, reconcile or compact hourly event rollups, or print a series.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['run', 'reconcile', 'compact', 'series', 'totals'])
+        parser.add_argument('--event-type', help='Event type for series')
+        parser.add_argument('--start', help='First day (YYYY-MM-DD), inclusive')
+        parser.add_argument('--end', help='Last day (YYYY-MM-DD), exclusive')
+        parser.add_argument('--granularity', choices=['hour', 'day'], default='day')
+        parser.add_argument('--organization', default=None, help='Organization id')
+        parser.add_argument('--dimension', default=None, help='Event.data key, or key=value')
+        parser.add_argument('--hours', type=int, default=None, help='Closed hours to reconcile')
+    
+    def _range(self, options):
+        if not options['start'] or not options['end']:
+            raise CommandError('--start and --end are required')
+        tz = timezone.get_current_timezone()
+        try:
+            return tuple(
+                datetime.combine(datetime.strptime(options[name], '%Y-%m-%d').date(), dt_time.min, tzinfo=tz)
+                for name in ('start', 'end')
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+    
+    def handle(self, *args, **options):
+        action = options['action']
+        
+        if action == 'run':
+            result = rollup_events()
+            self.stdout.write(self.style.SUCCESS(
+                f"Processed {result['windows']} windows, {result['buckets']} bucket upserts"
+            ))
+        
+        elif action == 'reconcile':
+            rebuilt = reconcile_rollups(options['hours'])
+            for bucket in rebuilt:
+                self.stdout.write(f"  rebuilt {bucket.isoformat()}")
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(rebuilt)} hourly buckets"))
+        
+        elif action == 'compact':
+            compacted = compact_rollups()
+            self.stdout.write(self.style.SUCCESS(f"Wrote {compacted} daily rollup rows"))
+        
+        elif action == 'series':
+            if not options['event_type']:
+                raise CommandError('--event-type is required')
+            start, end = self._range(options)
+            dimension = options['dimension']
+            if dimension and '=' in dimension:
+                dimension = tuple(dimension.split('=', 1))
+            for bucket, count in event_series(
+                options['event_type'], start, end,
+                granularity=options['granularity'],
+                organization=options['organization'],
+                dimension=dimension,
+            ):
+                self.stdout.write(f"{bucket.isoformat()}  {count}")
+        
+        else:
+            start, end = self._range(options)
+            self.stdout.write(json.dumps(event_totals(start, end, options['organization']), indent=2))
@@ -10,8 +10,33 @@ from apps.users.models import User
 from apps.organizations.models import Organization
 
 
+class EventQuerySet(models.QuerySet):
+    """Query helpers that bound created_at so Postgres can prune partitions."""
+    
+    def between(self, start, end):
+        """Events with start <= created_at < end."""
+        return self.filter(created_at__gte=start, created_at__lt=end)
+    
+    def in_month(self, year, month):
+        start = timezone.datetime(year, month, 1, tzinfo=timezone.get_current_timezone())
+        end = (
+            start.replace(year=year + 1, month=1) if month == 12
+            else start.replace(month=month + 1)
+        )
+        return self.between(start, end)
+    
+    def recent(self, days):
+        return self.filter(created_at__gte=timezone.now() - timezone.timedelta(days=days))
+
+
 class Event(models.Model):
-    """System events for analytics and auditing."""
+    """
+    System events for analytics and auditing.
+    
+    The events table is range-partitioned by month (see apps.events.partitions), so
+    its physical primary key is (id, created_at). Filter on created_at wherever
+    possible so queries only touch the partitions they need.
+    """
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     event_type = models.CharField(max_length=100, db_index=True)
@@ -20,14 +45,107 @@ class Event(models.Model):
     data = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = EventQuerySet.as_manager()
+    
     class Meta:
         db_table = 'events'
         indexes = [
             models.Index(fields=['event_type', 'created_at']),
             models.Index(fields=['user', 'created_at']),
             models.Index(fields=['organization', 'created_at']),
+            # Keyset order of retention purges and exports
+            models.Index(fields=['created_at', 'id'], name='idx_events_created_id'),
         ]
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"Event: {self.event_type} - {self.created_at}"
\ No newline at end of file
+        return f"Event: {self.event_type} - {self.created_at}"
+
+
+class EventHourlyRollup(models.Model):
+    """Event counts per hour, event type and organization, optionally split by a data key."""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    bucket = models.DateTimeField(help_text="Start of the hour (UTC)")
+    event_type = models.CharField(max_length=100)
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='event_hourly_rollups'
+    )
+    # Empty for the plain count; otherwise the Event.data key this row is split by
+    dimension_key = models.CharField(max_length=100, blank=True, default='')
+    dimension_value = models.CharField(max_length=255, blank=True, default='')
+    count = models.BigIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'event_rollups_hourly'
+        indexes = [
+            models.Index(fields=['event_type', 'bucket']),
+            models.Index(fields=['organization', 'bucket']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['bucket', 'event_type', 'organization', 'dimension_key', 'dimension_value'],
+                name='unique_event_hourly_rollup',
+                nulls_distinct=False,
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.bucket:%Y-%m-%d %H}:00 - {self.organization_id}: {self.count}"
+
+
+class EventDailyRollup(models.Model):
+    """Hourly rollups compacted into calendar days once they age out."""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    day = models.DateField()
+    event_type = models.CharField(max_length=100)
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='event_daily_rollups'
+    )
+    dimension_key = models.CharField(max_length=100, blank=True, default='')
+    dimension_value = models.CharField(max_length=255, blank=True, default='')
+    count = models.BigIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'event_rollups_daily'
+        indexes = [
+            models.Index(fields=['event_type', 'day']),
+            models.Index(fields=['organization', 'day']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'event_type', 'organization', 'dimension_key', 'dimension_value'],
+                name='unique_event_daily_rollup',
+                nulls_distinct=False,
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.day} - {self.organization_id}: {self.count}"
+
+
+class EventRollupState(models.Model):
+    """High-water mark of events already folded into the hourly rollups."""
+    
+    name = models.CharField(max_length=50, primary_key=True)
+    high_water_mark = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'event_rollup_state'
+    
+    def __str__(self):
+        return f"{self.name}: {self.high_water_mark}"
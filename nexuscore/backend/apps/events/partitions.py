@@ -0,0 +1,327 @@
+"""
+Monthly range partitioning of the events table.
+
+events is a declaratively partitioned table with one partition per calendar month
+(events_y2026m10 ...), created EVENTS_PARTITION_MONTHS_AHEAD in advance. There is
+no default partition, which would rule out DETACH ... CONCURRENTLY. Because
+Postgres requires the partition key in every unique constraint, the physical
+primary key is (id, created_at); the ORM still treats ``id`` as the primary key.
+
+Retention detaches and drops whole partitions instead of deleting rows; the
+'events' retention policy (apps.privacy.retention) drives it from its cutoff. An
+existing unpartitioned events table is converted online: a trigger mirrors writes
+into the new table while history is copied across in keyset-ordered chunks, then
+the two tables are swapped in one short transaction.
+"""
+
+import logging
+import re
+import time
+from datetime import date, datetime, time as dt_time, timezone as dt_timezone
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'events'
+STAGING_TABLE = 'events_partitioned'
+LEGACY_TABLE = 'events_legacy'
+PARTITION_SUFFIX = re.compile(r'_y(\d{4})m(\d{2})$')
+MIGRATION_CURSOR_KEY = 'events:partition_migration:cursor'
+
+COLUMNS = ('id', 'event_type', 'user_id', 'organization_id', 'data', 'created_at')
+
+PARENT_DDL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id uuid NOT NULL,
+    event_type varchar(100) NOT NULL,
+    user_id uuid NULL REFERENCES users (id) DEFERRABLE INITIALLY DEFERRED,
+    organization_id uuid NULL REFERENCES organizations (id) DEFERRABLE INITIALLY DEFERRED,
+    data jsonb NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    CONSTRAINT {table}_pkey PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at)
+"""
+
+PARENT_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS {table}_type_created_idx ON {table} (event_type, created_at)",
+    "CREATE INDEX IF NOT EXISTS {table}_user_created_idx ON {table} (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS {table}_org_created_idx ON {table} (organization_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS {table}_created_id_idx ON {table} (created_at, id)",
+)
+
+# Mirror writes on the legacy table into the partitioned copy during conversion
+MIRROR_TRIGGER_DDL = """
+CREATE OR REPLACE FUNCTION events_mirror_to_partitioned() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO {staging} ({columns}) VALUES (NEW.id, NEW.event_type, NEW.user_id,
+            NEW.organization_id, NEW.data, NEW.created_at) ON CONFLICT DO NOTHING;
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE {staging} SET event_type = NEW.event_type, user_id = NEW.user_id,
+            organization_id = NEW.organization_id, data = NEW.data
+        WHERE id = OLD.id AND created_at = OLD.created_at;
+    ELSE
+        DELETE FROM {staging} WHERE id = OLD.id AND created_at = OLD.created_at;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS events_mirror ON {table};
+CREATE TRIGGER events_mirror AFTER INSERT OR UPDATE OR DELETE ON {table}
+    FOR EACH ROW EXECUTE FUNCTION events_mirror_to_partitioned();
+"""
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def partition_name(month, table=TABLE):
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+
+def _month_start_at(month):
+    return datetime.combine(month, dt_time.min, tzinfo=dt_timezone.utc)
+
+
+def _bound(month):
+    return _month_start_at(month).isoformat()
+
+
+def is_partitioned(table=TABLE):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relkind FROM pg_class c WHERE c.relname = %s "
+            "AND c.relnamespace = current_schema()::regnamespace",
+            [table],
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def child_tables(table=TABLE, detach_pending=False):
+    """
+    Names of every partition attached to ``table``, whatever they are called.
+    
+    With detach_pending, only those an interrupted DETACH ... CONCURRENTLY left
+    half-detached; they must be finished with DETACH ... FINALIZE.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s "
+            "AND parent.relnamespace = current_schema()::regnamespace"
+            + (" AND pg_inherits.inhdetachpending" if detach_pending else ""),
+            [table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def list_partitions(table=TABLE):
+    """Monthly partitions of ``table`` as [(month, name)] in month order."""
+    partitions = []
+    for name in child_tables(table):
+        match = PARTITION_SUFFIX.search(name)
+        if not match:
+            continue
+        month = date(int(match.group(1)), int(match.group(2)), 1)
+        if name == partition_name(month, table):
+            partitions.append((month, name))
+    return sorted(partitions)
+
+
+def create_parent(table=TABLE):
+    with connection.cursor() as cursor:
+        cursor.execute(PARENT_DDL.format(table=table))
+        for ddl in PARENT_INDEXES:
+            cursor.execute(ddl.format(table=table))
+
+
+def ensure_partitions(months_ahead=None, start=None, table=TABLE):
+    """Create monthly partitions from ``start`` (default: this month) to months_ahead."""
+    if months_ahead is None:
+        months_ahead = settings.EVENTS_PARTITION_MONTHS_AHEAD
+    current = month_start(timezone.now())
+    month = month_start(start) if start else current
+    last = current + relativedelta(months=months_ahead)
+    existing = {name for _, name in list_partitions(table)}
+    
+    created = []
+    with connection.cursor() as cursor:
+        while month <= last:
+            name = partition_name(month, table)
+            if name not in existing:
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                    "FOR VALUES FROM (%s) TO (%s)",
+                    [_bound(month), _bound(month + relativedelta(months=1))],
+                )
+                created.append(name)
+            month += relativedelta(months=1)
+    if created:
+        logger.info(f"Created event partitions: {', '.join(created)}")
+    return created
+
+
+def drop_expired_partitions(retention_months=None, dry_run=False, cutoff=None):
+    """
+    Detach and drop partitions that lie entirely before the retention cutoff.
+    
+    ``cutoff`` is a datetime (the retention policy's); without it the cutoff is
+    the start of the month ``retention_months`` (EVENTS_RETENTION_MONTHS) ago.
+    
+    DETACH ... CONCURRENTLY cannot run inside a transaction block, so this must be
+    called in autocommit mode (not from within transaction.atomic()). It waits for
+    every transaction that can still see the partition, so the session's
+    statement_timeout is raised to EVENTS_MAINTENANCE_STATEMENT_TIMEOUT_MS meanwhile.
+    A detach interrupted on an earlier run is completed with DETACH ... FINALIZE.
+    """
+    if cutoff is None:
+        if retention_months is None:
+            retention_months = settings.EVENTS_RETENTION_MONTHS
+        cutoff = _month_start_at(month_start(timezone.now()) - relativedelta(months=retention_months))
+    pending = set(child_tables(detach_pending=True))
+    expired = [
+        name for month, name in list_partitions()
+        if _month_start_at(month + relativedelta(months=1)) <= cutoff or name in pending
+    ]
+    if dry_run:
+        return expired
+    
+    with connection.cursor() as cursor:
+        cursor.execute(f"SET statement_timeout = {int(settings.EVENTS_MAINTENANCE_STATEMENT_TIMEOUT_MS)}")
+        try:
+            for name in expired:
+                started = time.perf_counter()
+                mode = 'FINALIZE' if name in pending else 'CONCURRENTLY'
+                cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name} {mode}")
+                cursor.execute(f"DROP TABLE {name}")
+                logger.info(f"Dropped event partition {name} in {time.perf_counter() - started:.2f}s")
+        finally:
+            cursor.execute("RESET statement_timeout")
+    return expired
+
+
+def maintain_partitions():
+    """Create upcoming partitions; expired ones are dropped by the events retention policy."""
+    if not is_partitioned():
+        logger.warning(
+            "events is not partitioned yet; convert it with "
+            "'event_partitions prepare', 'copy', 'verify' and 'swap'"
+        )
+        return {'created': []}
+    return {'created': ensure_partitions()}
+
+
+# Online conversion of an unpartitioned events table
+
+def prepare_conversion():
+    """Create the partitioned staging table and start mirroring new writes into it."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(created_at) FROM {TABLE}")
+        oldest = cursor.fetchone()[0] or timezone.now()
+    with transaction.atomic():
+        create_parent(STAGING_TABLE)
+        ensure_partitions(start=oldest, table=STAGING_TABLE)
+        with connection.cursor() as cursor:
+            cursor.execute(MIRROR_TRIGGER_DDL.format(
+                table=TABLE, staging=STAGING_TABLE, columns=', '.join(COLUMNS),
+            ))
+
+
+def copy_chunk(after, chunk_size):
+    """Copy the next chunk after the (created_at, id) cursor; returns the new cursor or None."""
+    columns = ', '.join(COLUMNS)
+    where = "WHERE (created_at, id) > (%s, %s)" if after else ""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH batch AS ("
+            f"    SELECT {columns} FROM {TABLE} {where} ORDER BY created_at, id LIMIT %s"
+            f"), copied AS ("
+            f"    INSERT INTO {STAGING_TABLE} ({columns}) SELECT {columns} FROM batch "
+            f"    ON CONFLICT DO NOTHING"
+            f") SELECT created_at, id, count(*) OVER () FROM batch "
+            f"ORDER BY created_at DESC, id DESC LIMIT 1",
+            [*(after or ()), chunk_size],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return None, 0
+    return (row[0], row[1]), row[2]
+
+
+def copy_history(chunk_size=None, pause=0.0, max_chunks=None, progress=None):
+    """
+    Backfill the staging table in (created_at, id) order, one short transaction per chunk.
+    
+    The cursor is checkpointed after each chunk so an interrupted copy resumes; chunks
+    that are copied twice are absorbed by ON CONFLICT DO NOTHING.
+    """
+    chunk_size = chunk_size or settings.EVENTS_MIGRATION_CHUNK_SIZE
+    after = cache.get(MIGRATION_CURSOR_KEY)
+    copied = 0
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        started = time.perf_counter()
+        with transaction.atomic():
+            cursor, rows = copy_chunk(after, chunk_size)
+        if cursor is None:
+            break
+        after = cursor
+        cache.set(MIGRATION_CURSOR_KEY, after, timeout=None)
+        copied += rows
+        chunks += 1
+        if progress:
+            progress(chunks, rows, after, time.perf_counter() - started)
+        if pause:
+            time.sleep(pause)
+    return copied
+
+
+def swap_tables():
+    """Replace the legacy table with the partitioned copy. Takes a brief exclusive lock."""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+            cursor.execute(f"DROP TRIGGER IF EXISTS events_mirror ON {TABLE}")
+            cursor.execute("DROP FUNCTION IF EXISTS events_mirror_to_partitioned()")
+            cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}")
+            cursor.execute(f"ALTER TABLE {STAGING_TABLE} RENAME TO {TABLE}")
+            # The children still carry the staging prefix; read them from pg_inherits
+            # rather than by name so none is missed.
+            for name in child_tables(TABLE):
+                if name.startswith(f"{STAGING_TABLE}_"):
+                    cursor.execute(f"ALTER TABLE {name} RENAME TO {TABLE}{name[len(STAGING_TABLE):]}")
+    cache.delete(MIGRATION_CURSOR_KEY)
+    logger.info(f"events is now partitioned; the old table was kept as {LEGACY_TABLE}")
+
+
+def compare_counts():
+    """
+    Per-month row counts of legacy and staging tables, for checking before the swap.
+    
+    One bounded count per table and month (the staging partitions cover every month
+    the legacy table has), each in its own transaction with a raised statement_timeout.
+    """
+    counts = []
+    for month, _ in list_partitions(STAGING_TABLE):
+        bounds = [_bound(month), _bound(month + relativedelta(months=1))]
+        row = [month]
+        for table in (TABLE, STAGING_TABLE):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"SET LOCAL statement_timeout = {int(settings.EVENTS_MAINTENANCE_STATEMENT_TIMEOUT_MS)}"
+                )
+                cursor.execute(
+                    f"SELECT count(*) FROM {table} WHERE created_at >= %s AND created_at < %s", bounds,
+                )
+                row.append(cursor.fetchone()[0])
+        counts.append(tuple(row))
+    return counts
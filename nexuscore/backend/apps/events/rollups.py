@@ -0,0 +1,290 @@
+"""
+Incremental event analytics rollups.
+
+rollup_events() folds events into EventHourlyRollup in (hour, event_type,
+organization) buckets, advancing a high-water mark on created_at so each run
+only reads events it has not seen. Events newer than EVENTS_ROLLUP_LAG_SECONDS are
+left for the next run so that buffered writes can land first. EVENTS_ROLLUP_DIMENSIONS
+maps event types to Event.data keys that get their own per-value counts.
+
+Buffered, spooled and audit events carry their emission time but can commit well
+after the lag has passed them. reconcile_rollups() therefore compares the closed
+hours of the last EVENTS_ROLLUP_RECONCILE_HOURS against the raw events and
+rebuilds any hour whose totals differ.
+
+compact_rollups() moves hourly rows older than EVENTS_ROLLUP_HOURLY_RETENTION_DAYS
+into EventDailyRollup. Dashboards read from these tables through event_series()
+and event_totals() instead of grouping raw events.
+"""
+
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.events.models import EventDailyRollup, EventHourlyRollup, EventRollupState
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = 'hourly'
+BUCKET_COLUMNS = 'event_type, organization_id, dimension_key, dimension_value'
+
+
+def _local_tz():
+    return ZoneInfo(settings.TIME_ZONE)
+
+
+def _floor_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _rollup_select(dimensions):
+    """SELECT producing hourly counts for a created_at window, plus dimension splits."""
+    parts = [
+        "SELECT date_trunc('hour', created_at) AS bucket, event_type, organization_id, "
+        "'' AS dimension_key, '' AS dimension_value, count(*) AS count "
+        "FROM events WHERE created_at >= %(start)s AND created_at < %(end)s "
+        "GROUP BY 1, 2, 3"
+    ]
+    params = {}
+    pairs = sorted({(event_type, key) for event_type, keys in dimensions.items() for key in keys})
+    for index, (event_type, key) in enumerate(pairs):
+        # Group on the stored (truncated) value so two long values that share a
+        # prefix fold into one row instead of conflicting twice in the upsert
+        parts.append(
+            f"SELECT bucket, event_type, organization_id, dimension_key, dimension_value, count(*) "
+            f"FROM (SELECT date_trunc('hour', created_at) AS bucket, event_type, organization_id, "
+            f"%(key_{index})s AS dimension_key, "
+            f"coalesce(left(data->>%(key_{index})s, 255), '') AS dimension_value "
+            f"FROM events WHERE created_at >= %(start)s AND created_at < %(end)s "
+            f"AND event_type = %(type_{index})s AND data ? %(key_{index})s) AS dimensioned "
+            f"GROUP BY bucket, event_type, organization_id, dimension_key, dimension_value"
+        )
+        params[f'key_{index}'] = key
+        params[f'type_{index}'] = event_type
+    return ' UNION ALL '.join(parts), params
+
+
+def _apply_window(start, end, dimensions):
+    select, params = _rollup_select(dimensions)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO event_rollups_hourly "
+            f"(id, bucket, {BUCKET_COLUMNS}, count, updated_at) "
+            f"SELECT gen_random_uuid(), bucket, {BUCKET_COLUMNS}, count, NOW() FROM ({select}) AS counts "
+            f"ON CONFLICT (bucket, {BUCKET_COLUMNS}) DO UPDATE SET "
+            "count = event_rollups_hourly.count + EXCLUDED.count, updated_at = NOW()",
+            {**params, 'start': start, 'end': end},
+        )
+        return cursor.rowcount
+
+
+def _initial_mark():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT min(created_at) FROM events")
+        oldest = cursor.fetchone()[0]
+    return _floor_hour(oldest or timezone.now())
+
+
+def rollup_events(until=None, window_hours=None, dimensions=None):
+    """
+    Fold events between the high-water mark and ``until`` into hourly rollups.
+    
+    Each window is applied and the mark advanced in one transaction, with the state
+    row locked so concurrent runs serialise instead of double counting.
+    """
+    lag = timedelta(seconds=getattr(settings, 'EVENTS_ROLLUP_LAG_SECONDS', 120))
+    until = until or timezone.now() - lag
+    window = timedelta(hours=window_hours or getattr(settings, 'EVENTS_ROLLUP_WINDOW_HOURS', 6))
+    if dimensions is None:
+        dimensions = getattr(settings, 'EVENTS_ROLLUP_DIMENSIONS', {})
+    
+    EventRollupState.objects.get_or_create(
+        name=STATE_NAME, defaults={'high_water_mark': _initial_mark()}
+    )
+    windows = 0
+    buckets = 0
+    while True:
+        with transaction.atomic():
+            state = EventRollupState.objects.select_for_update().get(name=STATE_NAME)
+            start = state.high_water_mark
+            if start >= until:
+                break
+            end = min(start + window, until)
+            started = time.perf_counter()
+            buckets += _apply_window(start, end, dimensions)
+            state.high_water_mark = end
+            state.save(update_fields=['high_water_mark', 'updated_at'])
+        windows += 1
+        logger.info(
+            f"Rolled up events {start.isoformat()} to {end.isoformat()} "
+            f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+    return {'windows': windows, 'buckets': buckets}
+
+
+def _compaction_cutoff(older_than_days=None):
+    """Start of the first local day whose hourly rollups are kept."""
+    if older_than_days is None:
+        older_than_days = getattr(settings, 'EVENTS_ROLLUP_HOURLY_RETENTION_DAYS', 14)
+    tz = _local_tz()
+    cutoff_day = timezone.localdate(timezone.now(), tz) - timedelta(days=older_than_days)
+    return cutoff_day, datetime.combine(cutoff_day, dt_time.min, tzinfo=tz)
+
+
+def _hourly_totals(cursor, sql, start, end):
+    cursor.execute(sql, [start, end])
+    return dict(cursor.fetchall())
+
+
+def reconcile_rollups(hours=None, dimensions=None):
+    """
+    Rebuild closed hours whose rollup total no longer matches the raw events.
+    
+    Covers the ``hours`` whole hours before the high-water mark (never hours that
+    have been compacted into days). Returns the buckets that were rebuilt.
+    """
+    hours = hours or getattr(settings, 'EVENTS_ROLLUP_RECONCILE_HOURS', 24)
+    if dimensions is None:
+        dimensions = getattr(settings, 'EVENTS_ROLLUP_DIMENSIONS', {})
+    
+    rebuilt = []
+    with transaction.atomic():
+        state = EventRollupState.objects.select_for_update().filter(name=STATE_NAME).first()
+        if state is None:
+            return rebuilt
+        end = _floor_hour(state.high_water_mark)
+        start = max(end - timedelta(hours=hours), _compaction_cutoff()[1])
+        if start >= end:
+            return rebuilt
+        
+        with connection.cursor() as cursor:
+            raw = _hourly_totals(
+                cursor,
+                "SELECT date_trunc('hour', created_at), count(*) FROM events "
+                "WHERE created_at >= %s AND created_at < %s GROUP BY 1",
+                start, end,
+            )
+            rolled = _hourly_totals(
+                cursor,
+                "SELECT bucket, sum(count) FROM event_rollups_hourly "
+                "WHERE dimension_key = '' AND bucket >= %s AND bucket < %s GROUP BY 1",
+                start, end,
+            )
+            for bucket in sorted(set(raw) | set(rolled)):
+                if raw.get(bucket, 0) == rolled.get(bucket, 0):
+                    continue
+                cursor.execute(
+                    "DELETE FROM event_rollups_hourly WHERE bucket >= %s AND bucket < %s",
+                    [bucket, bucket + timedelta(hours=1)],
+                )
+                _apply_window(bucket, bucket + timedelta(hours=1), dimensions)
+                rebuilt.append(bucket)
+    if rebuilt:
+        logger.warning(
+            f"Rebuilt {len(rebuilt)} hourly event rollups that missed late-committed events: "
+            f"{', '.join(bucket.isoformat() for bucket in rebuilt)}"
+        )
+    return rebuilt
+
+
+def compact_rollups(older_than_days=None):
+    """Move hourly rollups for whole local days older than the cutoff into daily rows."""
+    cutoff_day, cutoff = _compaction_cutoff(older_than_days)
+    
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "WITH moved AS ("
+                "    DELETE FROM event_rollups_hourly WHERE bucket < %s "
+                f"    RETURNING bucket, {BUCKET_COLUMNS}, count"
+                ") "
+                "INSERT INTO event_rollups_daily "
+                f"(id, day, {BUCKET_COLUMNS}, count, updated_at) "
+                f"SELECT gen_random_uuid(), (bucket AT TIME ZONE %s)::date, {BUCKET_COLUMNS}, "
+                "sum(count), NOW() FROM moved "
+                f"GROUP BY 2, {BUCKET_COLUMNS} "
+                f"ON CONFLICT (day, {BUCKET_COLUMNS}) DO UPDATE SET "
+                "count = event_rollups_daily.count + EXCLUDED.count, updated_at = NOW()",
+                [cutoff, settings.TIME_ZONE],
+            )
+            compacted = cursor.rowcount
+    logger.info(f"Compacted hourly event rollups before {cutoff_day} into {compacted} daily rows")
+    return compacted
+
+
+def _filtered(queryset, event_type, organization, dimension):
+    queryset = queryset.filter(event_type=event_type)
+    if organization is not None:
+        queryset = queryset.filter(organization=organization)
+    if dimension:
+        key, value = dimension if isinstance(dimension, tuple) else (dimension, None)
+        queryset = queryset.filter(dimension_key=key)
+        if value is not None:
+            queryset = queryset.filter(dimension_value=value)
+    else:
+        queryset = queryset.filter(dimension_key='')
+    return queryset
+
+
+def event_series(event_type, start, end, granularity='day', organization=None, dimension=None):
+    """
+    Counts of ``event_type`` over [start, end) as [(bucket, count)].
+    
+    ``dimension`` is a data key (one series summed over all values) or a
+    (key, value) pair. Hourly granularity is only available for periods that have
+    not been compacted yet; daily series combine both tables.
+    """
+    hourly = _filtered(
+        EventHourlyRollup.objects.filter(bucket__gte=start, bucket__lt=end),
+        event_type, organization, dimension,
+    )
+    if granularity == 'hour':
+        rows = hourly.values('bucket').annotate(total=Sum('count')).order_by('bucket')
+        return [(row['bucket'], row['total']) for row in rows]
+    
+    tz = _local_tz()
+    series = defaultdict(int)
+    by_day = (
+        hourly.annotate(day=TruncDate('bucket', tzinfo=tz))
+        .values('day')
+        .annotate(total=Sum('count'))
+        .order_by()
+    )
+    for row in by_day:
+        series[row['day']] += row['total']
+    daily = _filtered(
+        EventDailyRollup.objects.filter(
+            day__gte=timezone.localdate(start, tz), day__lt=timezone.localdate(end, tz),
+        ),
+        event_type, organization, dimension,
+    )
+    for row in daily.values('day').annotate(total=Sum('count')).order_by():
+        series[row['day']] += row['total']
+    return sorted(series.items())
+
+
+def event_totals(start, end, organization=None):
+    """Total count per event type over [start, end), from both rollup tables."""
+    tz = _local_tz()
+    totals = defaultdict(int)
+    querysets = (
+        EventHourlyRollup.objects.filter(bucket__gte=start, bucket__lt=end),
+        EventDailyRollup.objects.filter(
+            day__gte=timezone.localdate(start, tz), day__lt=timezone.localdate(end, tz),
+        ),
+    )
+    for queryset in querysets:
+        queryset = queryset.filter(dimension_key='')
+        if organization is not None:
+            queryset = queryset.filter(organization=organization)
+        for row in queryset.values('event_type').annotate(total=Sum('count')).order_by():
+            totals[row['event_type']] += row['total']
+    return dict(sorted(totals.items()))
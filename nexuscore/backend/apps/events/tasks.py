@@ -0,0 +1,54 @@
+"""
+Event writer tasks for NexusCore.
+"""
+
+from celery import shared_task
+from celery.signals import task_postrun
+
+
+@task_postrun.connect
+def flush_events_after_task(**kwargs):
+    """Write events buffered by a task before the worker picks up the next one."""
+    from apps.events.writer import flush_events
+    
+    flush_events()
+
+
+@shared_task
+def flush_event_spool():
+    """Drain the Redis event spool into Postgres."""
+    from apps.events.writer import flush_spool
+    
+    return flush_spool()
+
+
+@shared_task
+def maintain_event_partitions():
+    """Create upcoming monthly event partitions (the retention policy drops expired ones)."""
+    from apps.events.partitions import maintain_partitions
+    
+    return maintain_partitions()
+
+
+@shared_task
+def rollup_events():
+    """Fold events past the high-water mark into hourly analytics rollups."""
+    from apps.events.rollups import rollup_events as run_rollup
+    
+    return run_rollup()
+
+
+@shared_task
+def reconcile_event_rollups():
+    """Rebuild recent hourly rollups that missed events committed after the mark passed."""
+    from apps.events.rollups import reconcile_rollups
+    
+    return [bucket.isoformat() for bucket in reconcile_rollups()]
+
+
+@shared_task
+def compact_event_rollups():
+    """Compact aged hourly event rollups into daily rows."""
+    from apps.events.rollups import compact_rollups
+    
+    return compact_rollups()
@@ -0,0 +1,15 @@
+"""
+Event URLs for NexusCore.
+"""
+
+from django.urls import path
+
+from apps.events import views
+
+urlpatterns = [
+    path(
+        'organizations/<uuid:organization_id>/events/export/',
+        views.export_organization_events,
+        name='export_organization_events',
+    ),
+]
@@ -0,0 +1,45 @@
+"""
+Event endpoints for NexusCore.
+"""
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
+
+from apps.events.export import export_queryset, streaming_response
+from apps.organizations.models import OrganizationMembership
+
+EXPORT_ROLES = ('owner', 'admin')
+
+
+@login_required
+@require_GET
+def export_organization_events(request, organization_id):
+    """Stream an organization's event history as NDJSON (gzipped with ?gzip=1)."""
+    if not OrganizationMembership.objects.filter(
+        organization_id=organization_id, user=request.user, role__in=EXPORT_ROLES
+    ).exists():
+        return JsonResponse({'error': 'Not permitted to export this organization.'}, status=403)
+    
+    bounds = {}
+    for name in ('start', 'end'):
+        value = request.GET.get(name)
+        if value:
+            try:
+                bounds[name] = parse_datetime(value)
+            except ValueError:
+                bounds[name] = None  # Well formed but impossible, e.g. February 30th
+            if bounds[name] is None:
+                return JsonResponse({'error': f"Invalid {name} timestamp."}, status=400)
+    
+    queryset = export_queryset(
+        organization=organization_id,
+        event_types=request.GET.getlist('event_type'),
+        **bounds,
+    )
+    return streaming_response(
+        queryset,
+        filename=f"events-{organization_id}.ndjson",
+        compress=request.GET.get('gzip') in ('1', 'true'),
+    )
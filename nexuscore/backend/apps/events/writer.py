@@ -0,0 +1,260 @@
+"""
+Buffered Event writer.
+
+emit_event() queues a row in a per-thread buffer instead of inserting it inline.
+The buffer is written with one multi-row INSERT when it reaches EVENTS_BUFFER_SIZE
+rows or EVENTS_BUFFER_MAX_AGE_SECONDS, and at the end of every request and Celery
+task. Timestamps are taken at emission, not at flush.
+
+With EVENTS_SPOOL_ENABLED each event is pushed to a Redis list instead, so events
+survive a worker crash; flush_spool() drains the list into Postgres.
+
+Buffered and spooled batches are written under a savepoint, so a failed flush never
+aborts the caller's transaction, and a batch Postgres rejects is bisected to skip
+only the bad rows. Rejected spool rows go to a dead-letter list.
+
+audit=True events are written when the surrounding transaction commits and are
+dropped if it (or the savepoint they were emitted in) rolls back. Outside a
+transaction they are written immediately.
+"""
+
+import atexit
+import json
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DataError, IntegrityError, connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SPOOL_KEY = 'events:spool'
+SPOOL_FLUSHING_KEY = 'events:spool:flushing:{batch_id}'
+SPOOL_FLUSHING_SET_KEY = 'events:spool:flushing'
+SPOOL_DEAD_LETTER_KEY = 'events:spool:dead_letter'
+
+EVENT_COLUMNS = ('id', 'event_type', 'user_id', 'organization_id', 'data', 'created_at')
+
+# Move the spool aside under a batch key so new pushes start a fresh list
+CLAIM_SPOOL_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('RENAME', KEYS[1], KEYS[2])
+redis.call('SADD', KEYS[3], KEYS[2])
+return redis.call('LLEN', KEYS[2])
+"""
+
+_state = threading.local()
+_scripts = {}
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    
+    return get_redis_connection('default')
+
+
+def _pk(value):
+    value = getattr(value, 'pk', value)
+    return None if value is None else str(value)
+
+
+def build_row(event_type, user=None, organization=None, data=None):
+    """Event row as a JSON-serialisable dict in EVENT_COLUMNS order."""
+    return {
+        'id': str(uuid.uuid4()),
+        'event_type': event_type,
+        'user_id': _pk(user),
+        'organization_id': _pk(organization),
+        'data': json.dumps(data or {}, cls=DjangoJSONEncoder),
+        'created_at': timezone.now().isoformat(),
+    }
+
+
+def write_events(rows, batch_size=1000):
+    """
+    Insert event rows with multi-row INSERTs.
+    
+    ON CONFLICT DO NOTHING makes re-delivery of a spool batch harmless.
+    """
+    written = 0
+    placeholders = '(%s, %s, %s, %s, %s::jsonb, %s)'
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            params = []
+            for row in chunk:
+                params.extend(row[column] for column in EVENT_COLUMNS)
+            cursor.execute(
+                f"INSERT INTO events ({', '.join(EVENT_COLUMNS)}) "
+                f"VALUES {', '.join([placeholders] * len(chunk))} "
+                "ON CONFLICT DO NOTHING",
+                params,
+            )
+            written += cursor.rowcount
+    return written
+
+
+def write_events_isolated(rows):
+    """
+    write_events() under a savepoint, skipping rows Postgres rejects.
+    
+    Returns (written, rejected rows). A rejected batch is split in half until the
+    bad rows are found, so one invalid foreign key does not discard its neighbours.
+    """
+    if not rows:
+        return 0, []
+    try:
+        with transaction.atomic():
+            return write_events(rows), []
+    except (IntegrityError, DataError) as e:
+        if len(rows) == 1:
+            logger.error(f"Event {rows[0]['id']} ({rows[0]['event_type']}) rejected: {e}")
+            return 0, rows
+    middle = len(rows) // 2
+    left_written, left_rejected = write_events_isolated(rows[:middle])
+    right_written, right_rejected = write_events_isolated(rows[middle:])
+    return left_written + right_written, left_rejected + right_rejected
+
+
+class EventBuffer:
+    """Per-thread list of pending rows with size and age thresholds."""
+    
+    def __init__(self, max_size, max_age):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.rows = []
+        self.started = None
+    
+    def add(self, row):
+        if not self.rows:
+            self.started = time.monotonic()
+        self.rows.append(row)
+        if len(self.rows) >= self.max_size or time.monotonic() - self.started >= self.max_age:
+            self.flush()
+    
+    def flush(self):
+        rows, self.rows = self.rows, []
+        if not rows:
+            return 0
+        try:
+            written, rejected = write_events_isolated(rows)
+        except Exception:
+            logger.exception(f"Failed to write {len(rows)} buffered events")
+            return 0
+        if rejected:
+            logger.error(f"Dropped {len(rejected)} of {len(rows)} buffered events rejected by Postgres")
+        return written
+
+
+class AuditBatch:
+    """Audit rows emitted at one savepoint level, written by an on_commit hook."""
+    
+    def __init__(self):
+        self.rows = []
+        self.callback = self.flush
+    
+    def flush(self):
+        rows, self.rows = self.rows, []
+        if rows:
+            write_events(rows)
+
+
+def _buffer():
+    buffer = getattr(_state, 'buffer', None)
+    if buffer is None:
+        buffer = _state.buffer = EventBuffer(
+            getattr(settings, 'EVENTS_BUFFER_SIZE', 500),
+            getattr(settings, 'EVENTS_BUFFER_MAX_AGE_SECONDS', 2.0),
+        )
+    return buffer
+
+
+def _audit_batch():
+    """Batch for the current savepoint, registering its on_commit hook on first use."""
+    conn = transaction.get_connection()
+    batches = getattr(_state, 'audit_batches', None)
+    if batches is None:
+        batches = _state.audit_batches = {}
+    key = tuple(conn.savepoint_ids)
+    batch = batches.get(key)
+    # A batch whose hook is no longer pending was committed or rolled back
+    if batch is None or not any(hook is batch.callback for _, hook, _ in conn.run_on_commit):
+        batch = batches[key] = AuditBatch()
+        transaction.on_commit(batch.callback)
+    return batch
+
+
+def emit_event(event_type, user=None, organization=None, data=None, audit=False):
+    """Record an Event without an inline single-row INSERT."""
+    row = build_row(event_type, user, organization, data)
+    
+    if audit:
+        if transaction.get_connection().in_atomic_block:
+            _audit_batch().rows.append(row)
+        else:
+            write_events([row])
+        return row['id']
+    
+    if getattr(settings, 'EVENTS_SPOOL_ENABLED', False):
+        _redis().rpush(SPOOL_KEY, json.dumps(row))
+    else:
+        _buffer().add(row)
+    return row['id']
+
+
+def flush_events():
+    """Write this thread's buffered events now."""
+    buffer = getattr(_state, 'buffer', None)
+    return buffer.flush() if buffer is not None else 0
+
+
+def flush_spool(batch_size=None):
+    """Drain the Redis spool into Postgres. Safe to retry after a crash."""
+    redis = _redis()
+    batch_size = batch_size or getattr(settings, 'EVENTS_SPOOL_BATCH_SIZE', 5000)
+    if 'claim' not in _scripts:
+        _scripts['claim'] = redis.register_script(CLAIM_SPOOL_SCRIPT)
+    _scripts['claim'](keys=[
+        SPOOL_KEY,
+        SPOOL_FLUSHING_KEY.format(batch_id=uuid.uuid4().hex),
+        SPOOL_FLUSHING_SET_KEY,
+    ])
+    
+    # Includes batches left behind by a flush that crashed part-way
+    written = 0
+    for batch_key in redis.smembers(SPOOL_FLUSHING_SET_KEY):
+        batch_key = batch_key.decode() if isinstance(batch_key, bytes) else batch_key
+        start = 0
+        while True:
+            raw_rows = redis.lrange(batch_key, start, start + batch_size - 1)
+            if not raw_rows:
+                break
+            rows = []
+            rejected = []
+            for raw in raw_rows:
+                try:
+                    rows.append(json.loads(raw))
+                except ValueError:
+                    rejected.append(raw)
+            batch_written, bad_rows = write_events_isolated(rows)
+            written += batch_written
+            rejected.extend(json.dumps(row) for row in bad_rows)
+            if rejected:
+                redis.rpush(SPOOL_DEAD_LETTER_KEY, *rejected)
+                logger.error(f"Moved {len(rejected)} spooled events to {SPOOL_DEAD_LETTER_KEY}")
+            start += len(raw_rows)
+        redis.delete(batch_key)
+        redis.srem(SPOOL_FLUSHING_SET_KEY, batch_key)
+    
+    if written:
+        logger.info(f"Flushed {written} spooled events to Postgres")
+    return written
+
+
+atexit.register(flush_events)
@@ -65,6 +65,7 @@ class Lead(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['created_at']),
             models.Index(fields=['source', 'created_at']),
+            models.Index(fields=['updated_at']),
         ]
         ordering = ['-created_at']
     
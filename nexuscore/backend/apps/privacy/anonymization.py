@@ -0,0 +1,108 @@
+"""
+Set-based anonymization of inactive user accounts.
+
+Inactive users past the PDPA cutoff are walked in primary-key order in chunks. Each
+chunk is a single UPDATE that derives the anonymized email from the user id in SQL
+(the same sha256 prefix the per-row code produced), blanks the personal columns,
+writes an unusable password and skips owners of organizations with invoices inside
+the financial retention period. Progress is checkpointed in a RetentionRun after
+every chunk, so an interrupted run resumes where it stopped.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from apps.privacy.runs import checkpoint, finish_run, start_run
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = 'anonymize_inactive_users'
+ANONYMIZED_DOMAIN = 'deleted.nexuscore'
+MIN_UUID = '00000000-0000-0000-0000-000000000000'
+
+ANONYMIZE_SQL = """
+WITH candidates AS (
+    SELECT u.id FROM users u
+    WHERE u.is_active = FALSE
+      AND u.updated_at < %(user_cutoff)s
+      AND u.id > %(after)s
+      AND u.email NOT LIKE 'anonymized\\_%%@' || %(domain)s
+    ORDER BY u.id
+    LIMIT %(limit)s
+), eligible AS (
+    SELECT c.id FROM candidates c
+    WHERE NOT EXISTS (
+        SELECT 1 FROM organizations o
+        JOIN invoices i ON i.organization_id = o.id
+        WHERE o.owner_id = c.id AND i.created_at > %(financial_cutoff)s
+    )
+), updated AS (
+    UPDATE users u
+    SET email = 'anonymized_' || left(encode(sha256(convert_to(u.id::text, 'UTF8')), 'hex'), 16)
+                || '@' || %(domain)s,
+        name = 'Deleted User',
+        phone = '',
+        company = '',
+        password = '!' || replace(gen_random_uuid()::text, '-', ''),
+        updated_at = NOW()
+    FROM eligible e
+    WHERE u.id = e.id
+    RETURNING u.id
+)
+SELECT
+    (SELECT id FROM candidates ORDER BY id DESC LIMIT 1),
+    (SELECT count(*) FROM candidates),
+    (SELECT count(*) FROM updated)
+"""
+
+
+def anonymize_chunk(after, user_cutoff, financial_cutoff, limit):
+    """Anonymize the next chunk after ``after``; returns (last id, scanned, anonymized)."""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(ANONYMIZE_SQL, {
+                'after': after,
+                'user_cutoff': user_cutoff,
+                'financial_cutoff': financial_cutoff,
+                'limit': limit,
+                'domain': ANONYMIZED_DOMAIN,
+            })
+            return cursor.fetchone()
+
+
+def anonymize_inactive_users(user_cutoff, financial_cutoff, chunk_size=None, max_chunks=None, progress=None):
+    """
+    Anonymize inactive users not updated since ``user_cutoff`` in checkpointed chunks.
+    
+    Returns the RetentionRun for today, whose counters include chunks completed by
+    earlier, interrupted attempts.
+    """
+    chunk_size = chunk_size or getattr(settings, 'PDPA_ANONYMIZE_CHUNK_SIZE', 5000)
+    run = start_run(JOB_NAME, user_cutoff)
+    if run.status == 'completed':
+        return run
+    
+    after = run.last_key or MIN_UUID
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        started = time.perf_counter()
+        last_id, scanned, anonymized = anonymize_chunk(after, user_cutoff, financial_cutoff, chunk_size)
+        if not scanned:
+            finish_run(run)
+            break
+        elapsed_ms = int((time.perf_counter() - started) * 1000)
+        checkpoint(run, last_id, scanned, anonymized, elapsed_ms)
+        after = last_id
+        chunks += 1
+        logger.info(
+            f"Anonymization chunk {run.chunks + chunks}: scanned {scanned}, "
+            f"anonymized {anonymized} in {elapsed_ms}ms (last id {last_id})"
+        )
+        if progress:
+            progress(scanned, anonymized, elapsed_ms)
+    
+    run.refresh_from_db()
+    return run
@@ -0,0 +1,440 @@
+"""
+Declarative map of where personal data lives.
+
+Each PersonalDataSource names a model, the fields on it that hold personal data,
+how its rows link to a data subject (user FK, email column or JSON path) and what
+erasure and rectification mean for it. build_plan() compiles a DSAR of a given type
+into one step per source: a filtered queryset walked in keyset order along an
+indexed column, in batches. The same steps drive export, erasure and
+rectification, and can be costed with EXPLAIN before anything is executed.
+
+Sources are registered children first, so erasure runs in registration order
+without tripping foreign keys.
+"""
+
+import json
+import logging
+import time
+
+from django.apps import apps
+from django.db.models import Case, CharField, F, Func, Q, Value, When
+from django.db.models.functions import Concat
+from django.utils.dateparse import parse_datetime
+
+from apps.privacy.retention import delete_rows
+
+logger = logging.getLogger(__name__)
+
+ANONYMIZED_EMAIL_DOMAIN = 'deleted.nexuscore'
+
+# Erasure behaviours
+DELETE = 'delete'
+ANONYMIZE = 'anonymize'
+RETAIN = 'retain'
+
+
+class DataSubject:
+    """The person a request is about: a user account, an email address, or both."""
+    
+    def __init__(self, user=None, email=None):
+        self.user = user
+        self.email = email or (user.email if user is not None else None)
+    
+    @classmethod
+    def for_request(cls, dsar_request):
+        return cls(user=dsar_request.user, email=dsar_request.user_email)
+    
+    def __repr__(self):
+        return f"<DataSubject {self.email or '-'} user={getattr(self.user, 'pk', None)}>"
+
+
+# Subject links: callables returning a Q for the subject, or None if they cannot apply
+
+def by_user(path='user'):
+    def link(subject):
+        return Q(**{path: subject.user.pk}) if subject.user is not None else None
+    return link
+
+
+def by_email(*paths):
+    def link(subject):
+        if not subject.email:
+            return None
+        condition = Q()
+        for path in paths:
+            condition |= Q(**{path: subject.email})
+        return condition
+    return link
+
+
+def any_of(*links):
+    def link(subject):
+        conditions = [condition for condition in (each(subject) for each in links) if condition is not None]
+        if not conditions:
+            return None
+        combined = conditions[0]
+        for condition in conditions[1:]:
+            combined |= condition
+        return combined
+    return link
+
+
+class PersonalDataSource:
+    """Personal-data fields of one model and how requests treat them."""
+    
+    def __init__(self, name, model, fields, link, order_field=None, erase=RETAIN,
+                 erase_values=None, rectify=None, rectify_link=None, batch_size=1000, reason='',
+                 export_row=None, erase_batch=None):
+        self.name = name
+        self.model_label = model
+        # Exported columns; may follow relations ('plan__name'), which become joins
+        self.fields = tuple(fields)
+        self.link = link
+        # Indexed column walked together with pk; None walks the primary key alone
+        self.order_field = order_field
+        self.erase = erase
+        # Field -> value or expression written on anonymization, or a callable
+        # taking the subject for values that depend on who is being erased
+        self.erase_values = erase_values or {}
+        # Subject attribute -> model field updated on rectification
+        self.rectify = rectify or {}
+        # Narrower link for rectification, when not every linked row holds the subject's data
+        self.rectify_link = rectify_link or link
+        self.batch_size = batch_size
+        # Why data is kept when erase is RETAIN (e.g. statutory retention)
+        self.reason = reason
+        # Optional hooks: finish an exported row; delete a batch of pks (and any copies)
+        self.export_row = export_row
+        self.erase_batch = erase_batch
+    
+    def __repr__(self):
+        return f"<PersonalDataSource {self.name}: {self.model_label}>"
+    
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+    
+    def queryset(self, subject, link=None):
+        condition = (link or self.link)(subject)
+        if condition is None:
+            return None
+        return self.model._base_manager.filter(condition)
+
+
+_sources = {}
+
+
+def register(source):
+    _sources[source.name] = source
+    return source
+
+
+def sources():
+    return list(_sources.values())
+
+
+def get_source(name):
+    return _sources[name]
+
+
+class PlanStep:
+    """One source's share of a request: an action over a subject-filtered queryset."""
+    
+    def __init__(self, source, action, queryset, changes=None):
+        self.source = source
+        self.action = action
+        self.queryset = queryset
+        self.changes = changes or {}
+    
+    def __repr__(self):
+        return f"<PlanStep {self.action} {self.source.name}>"
+    
+    @property
+    def ordering(self):
+        if self.source.order_field:
+            return (self.source.order_field, 'pk')
+        return ('pk',)
+    
+    def key(self, row):
+        """JSON-safe keyset position of a row returned by pages()."""
+        if self.source.order_field:
+            return [row[self.source.order_field].isoformat(), str(row['pk'])]
+        return [str(row['pk'])]
+    
+    def pages(self, *fields, after=None):
+        """Lists of value rows in keyset order, one batch at a time, optionally resuming after a key()."""
+        order_field = self.source.order_field
+        columns = tuple(dict.fromkeys(('pk', *((order_field,) if order_field else ()), *fields)))
+        last = None
+        if after:
+            last = {'pk': after[-1]}
+            if order_field:
+                last[order_field] = parse_datetime(after[0])
+        while True:
+            page = self.queryset
+            if last is not None:
+                if order_field:
+                    page = page.filter(
+                        Q(**{f'{order_field}__gt': last[order_field]})
+                        | Q(**{order_field: last[order_field], 'pk__gt': last['pk']})
+                    )
+                else:
+                    page = page.filter(pk__gt=last['pk'])
+            rows = list(page.order_by(*self.ordering).values(*columns)[:self.source.batch_size])
+            if not rows:
+                return
+            yield rows
+            last = rows[-1]
+    
+    def iter_rows(self):
+        """Exported rows, without the keyset bookkeeping columns that are not personal fields."""
+        fields = self.source.fields
+        for rows in self.pages(*fields):
+            for row in rows:
+                row = {field: row[field] for field in fields}
+                yield self.source.export_row(row) if self.source.export_row else row
+    
+    def estimate(self):
+        """Planner estimate of rows and total cost for this step, via EXPLAIN."""
+        explained = json.loads(self.queryset.order_by(*self.ordering).explain(format='json'))
+        plan = explained[0]['Plan']
+        return {'rows': int(plan.get('Plan Rows', 0)), 'cost': float(plan.get('Total Cost', 0.0))}
+    
+    def apply_batch(self, pks):
+        """Delete or update one batch of rows in its own short statement; returns rows changed."""
+        if self.action == DELETE:
+            if self.source.erase_batch:
+                return self.source.erase_batch(pks)
+            return delete_rows(self.source.model, pks)
+        return self.source.model._base_manager.filter(pk__in=pks).update(**self.changes)
+    
+    def apply(self, progress=None):
+        """Run a mutating step in batches; returns (rows, batches)."""
+        rows_changed = 0
+        batches = 0
+        for rows in self.pages():
+            pks = [row['pk'] for row in rows]
+            rows_changed += self.apply_batch(pks)
+            batches += 1
+            if progress:
+                progress(self, len(pks))
+        return rows_changed, batches
+
+
+class QueryPlan:
+    """Steps compiled for one request; estimate() before execute()."""
+    
+    def __init__(self, request_type, subject, steps, retained):
+        self.request_type = request_type
+        self.subject = subject
+        self.steps = steps
+        # (source, reason) pairs the request leaves untouched
+        self.retained = retained
+    
+    def __repr__(self):
+        return f"<QueryPlan {self.request_type} {self.subject}: {len(self.steps)} steps>"
+    
+    def estimate(self):
+        estimates = {step.source.name: step.estimate() for step in self.steps}
+        return {
+            'steps': estimates,
+            'rows': sum(estimate['rows'] for estimate in estimates.values()),
+            'cost': round(sum(estimate['cost'] for estimate in estimates.values()), 2),
+        }
+    
+    def execute(self, progress=None):
+        """
+        Run every step and return {source: {'action', 'rows', 'batches', 'ms'}}.
+        
+        Export steps are only counted here; stream them with step.iter_rows().
+        """
+        results = {}
+        for step in self.steps:
+            started = time.perf_counter()
+            if step.action == 'export':
+                rows = sum(1 for _ in step.iter_rows())
+                batches = None
+            else:
+                rows, batches = step.apply(progress)
+            elapsed_ms = int((time.perf_counter() - started) * 1000)
+            results[step.source.name] = {
+                'action': step.action, 'rows': rows, 'batches': batches, 'ms': elapsed_ms,
+            }
+            logger.info(f"DSAR {self.request_type} {step.source.name}: {rows} rows in {elapsed_ms}ms")
+        return results
+
+
+def build_plan(request_type, subject, rectification=None):
+    """
+    Compile a request into steps over every source the subject appears in.
+    
+    ``request_type`` is 'export' (also used for 'access'), 'delete' or
+    'rectification'; the latter takes {attribute: new value}.
+    """
+    if request_type == 'access':
+        request_type = 'export'
+    steps = []
+    retained = []
+    for source in sources():
+        link = source.rectify_link if request_type == 'rectification' else source.link
+        queryset = source.queryset(subject, link)
+        if queryset is None:
+            continue
+        if request_type == 'export':
+            steps.append(PlanStep(source, 'export', queryset))
+        elif request_type == 'delete':
+            if source.erase == RETAIN:
+                retained.append((source, source.reason))
+            elif source.erase == ANONYMIZE:
+                values = {
+                    field: value(subject) if callable(value) else value
+                    for field, value in source.erase_values.items()
+                }
+                steps.append(PlanStep(source, ANONYMIZE, queryset, values))
+            else:
+                steps.append(PlanStep(source, DELETE, queryset))
+        elif request_type == 'rectification':
+            changes = {
+                field: rectification[attribute]
+                for attribute, field in source.rectify.items()
+                if attribute in (rectification or {})
+            }
+            if changes:
+                steps.append(PlanStep(source, 'rectify', queryset, changes))
+        else:
+            raise ValueError(f"Unsupported request type: {request_type}")
+    return QueryPlan(request_type, subject, steps, retained)
+
+
+# Declarations, children before parents
+
+def _anonymized_email():
+    return Concat(
+        Value('anonymized_'),
+        Func(
+            F('id'),
+            template="left(encode(sha256(convert_to(%(expressions)s::text, 'UTF8')), 'hex'), 16)",
+            output_field=CharField(),
+        ),
+        Value(f'@{ANONYMIZED_EMAIL_DOMAIN}'),
+        output_field=CharField(),
+    )
+
+
+def _anonymized_if_subject_email(field):
+    """Anonymize ``field`` only on rows where it holds the subject's own address."""
+    def value(subject):
+        if not subject.email:
+            return F(field)
+        return Case(
+            When(**{field: subject.email}, then=_anonymized_email()),
+            default=F(field),
+            output_field=CharField(),
+        )
+    return value
+
+
+register(PersonalDataSource(
+    'events', 'events.Event',
+    fields=('event_type', 'created_at', 'data'),
+    link=by_user('user'),
+    order_field='created_at',
+    erase=ANONYMIZE,
+    erase_values={'data': {}, 'user': None},
+    batch_size=5000,
+))
+
+def _rehydrate_webhook_row(row):
+    from apps.webhooks.offload import rehydrate_row
+    
+    return rehydrate_row(row)
+
+
+def _erase_webhook_events(pks):
+    from apps.webhooks.offload import erase_events
+    
+    return erase_events(pks)
+
+
+register(PersonalDataSource(
+    'webhook_events', 'webhooks.WebhookEvent',
+    fields=('service', 'event_type', 'created_at', 'stored_payload', 'payload_ref', 'payload_digest'),
+    # Extracted at ingest and indexed, so offloaded payloads are found too
+    link=by_email('subject_email'),
+    order_field='created_at',
+    erase=DELETE,
+    # Offloaded payloads are read back for export and cut out of their segments on erasure
+    export_row=_rehydrate_webhook_row,
+    erase_batch=_erase_webhook_events,
+))
+
+register(PersonalDataSource(
+    'leads', 'leads.Lead',
+    fields=('name', 'email', 'phone', 'company', 'job_title', 'notes', 'form_data', 'created_at'),
+    link=by_email('email'),
+    erase=DELETE,
+    rectify={'name': 'name', 'email': 'email', 'phone': 'phone', 'company': 'company'},
+))
+
+register(PersonalDataSource(
+    'invoices', 'billing.Invoice',
+    fields=('id', 'subtotal_cents', 'gst_amount_cents', 'total_amount_cents', 'status', 'created_at'),
+    link=by_user('organization__members'),
+    order_field='created_at',
+    reason='IRAS requires invoices to be kept for 7 years',
+))
+
+register(PersonalDataSource(
+    'subscriptions', 'billing.Subscription',
+    fields=('id', 'plan__name', 'status', 'current_period_start', 'current_period_end'),
+    link=by_user('organization__members'),
+    reason='Billing records belong to the organization',
+))
+
+register(PersonalDataSource(
+    'memberships', 'organizations.OrganizationMembership',
+    fields=('organization_id', 'organization__name', 'organization__uen', 'role', 'joined_at'),
+    link=by_user('user'),
+    erase=DELETE,
+))
+
+register(PersonalDataSource(
+    'organizations', 'organizations.Organization',
+    fields=('id', 'name', 'billing_email', 'billing_phone', 'billing_address'),
+    link=any_of(by_user('owner'), by_email('billing_email')),
+    erase=ANONYMIZE,
+    erase_values={
+        'billing_email': _anonymized_if_subject_email('billing_email'),
+        'billing_phone': '',
+        'billing_address': {},
+    },
+    rectify={'email': 'billing_email', 'phone': 'billing_phone'},
+    # Owning an organization does not make its billing contact the subject's own
+    rectify_link=by_email('billing_email'),
+))
+
+register(PersonalDataSource(
+    'dsar_requests', 'privacy.DSARRequest',
+    fields=('request_type', 'status', 'requested_at', 'processed_at'),
+    link=any_of(by_user('user'), by_email('user_email')),
+    reason='Evidence that the request was handled',
+))
+
+register(PersonalDataSource(
+    'user', 'users.User',
+    fields=('id', 'email', 'name', 'company', 'phone', 'is_verified', 'is_active',
+            'created_at', 'last_login', 'timezone'),
+    link=by_user('pk'),
+    erase=ANONYMIZE,
+    erase_values={
+        'email': _anonymized_email(),
+        'name': 'Deleted User',
+        'phone': '',
+        'company': '',
+        'is_active': False,
+        # verified_users_must_be_active: an inactive account cannot stay verified
+        'is_verified': False,
+        'password': Func(template="'!' || replace(gen_random_uuid()::text, '-', '')", output_field=CharField()),
+    },
+    rectify={'name': 'name', 'email': 'email', 'phone': 'phone', 'company': 'company'},
+))
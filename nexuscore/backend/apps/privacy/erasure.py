@@ -0,0 +1,225 @@
+"""
+Erasure of a data subject for an approved DSAR deletion.
+
+The personal-data map's delete plan is executed one table at a time: each batch
+is a single short DELETE or UPDATE by primary key, with a pause between batches,
+instead of one user.delete() that would cascade and SET NULL millions of
+Event.user rows under one long transaction. Per-step progress (keyset position,
+rows, batches, time) is saved in the request's metadata after every batch, so an
+interrupted or time-boxed erasure resumes at the next batch.
+
+The user row itself is anonymized and deactivated rather than deleted: invoices
+and organizations that must be retained still reference it. Export archives
+produced for the subject's earlier DSAR requests are deleted from storage first.
+
+schedule_erasure() queues the work once an approval has been committed; the admin
+calls it when deletion approval is recorded.
+
+dry_run() counts the affected rows per step and estimates the duration from the
+throughput of earlier erasures before anyone approves the request.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from apps.privacy.datamap import DataSubject, any_of, build_plan, by_email, by_user
+
+logger = logging.getLogger(__name__)
+
+THROUGHPUT_KEY = 'privacy:erasure:throughput'
+
+
+class ErasureNotAllowed(Exception):
+    """The request is not an approved deletion."""
+
+
+class ErasureFailed(Exception):
+    """A step of the erasure raised; the request is marked failed at that step."""
+    
+    def __init__(self, step, error):
+        self.step = step
+        super().__init__(f"{step}: {error}")
+
+
+def _check_approved(dsar_request):
+    if dsar_request.request_type != 'delete':
+        raise ErasureNotAllowed(f"DSAR {dsar_request.id} is a {dsar_request.request_type} request")
+    if not dsar_request.deletion_approved_by_id or not dsar_request.deletion_approved_at:
+        raise ErasureNotAllowed(f"DSAR {dsar_request.id} has not been approved for deletion")
+
+
+def _throughput():
+    """Observed rows per second per source, from earlier erasures."""
+    return cache.get(THROUGHPUT_KEY) or {}
+
+
+def _record_throughput(source_name, rows, elapsed_ms):
+    if not rows or not elapsed_ms:
+        return
+    throughput = _throughput()
+    observed = rows * 1000 / elapsed_ms
+    previous = throughput.get(source_name)
+    # Smooth towards recent runs without forgetting the history
+    throughput[source_name] = observed if previous is None else 0.7 * previous + 0.3 * observed
+    cache.set(THROUGHPUT_KEY, throughput, timeout=None)
+
+
+def dry_run(dsar_request):
+    """
+    Affected rows and estimated seconds per step, without changing anything.
+    
+    Counts are exact (index-backed subject filters); durations use the observed
+    throughput of earlier erasures, or PDPA_ERASURE_DEFAULT_ROWS_PER_SECOND.
+    """
+    plan = build_plan('delete', DataSubject.for_request(dsar_request))
+    throughput = _throughput()
+    pause = settings.PDPA_ERASURE_BATCH_PAUSE_SECONDS
+    steps = {}
+    for step in plan.steps:
+        started = time.perf_counter()
+        rows = step.queryset.count()
+        batches = -(-rows // step.source.batch_size)
+        rate = throughput.get(step.source.name, settings.PDPA_ERASURE_DEFAULT_ROWS_PER_SECOND)
+        steps[step.source.name] = {
+            'action': step.action,
+            'rows': rows,
+            'batches': batches,
+            'estimated_seconds': round(rows / rate + batches * pause, 1),
+            'count_ms': int((time.perf_counter() - started) * 1000),
+        }
+    return {
+        'steps': steps,
+        'retained': {source.name: reason for source, reason in plan.retained},
+        'rows': sum(step['rows'] for step in steps.values()),
+        'estimated_seconds': round(sum(step['estimated_seconds'] for step in steps.values()), 1),
+    }
+
+
+def schedule_erasure(dsar_request):
+    """Queue the erasure of an approved deletion once the current transaction commits."""
+    from apps.privacy.tasks import execute_dsar_erasure
+    
+    _check_approved(dsar_request)
+    dsar_id = str(dsar_request.pk)
+    transaction.on_commit(lambda: execute_dsar_erasure.delay(dsar_id=dsar_id))
+
+
+def delete_export_archives(subject):
+    """Delete stored DSAR export archives for the subject; returns how many were removed."""
+    from apps.privacy.models import DSARRequest
+    
+    condition = any_of(by_user('user'), by_email('user_email'))(subject)
+    if condition is None:
+        return 0
+    deleted = 0
+    for exported in DSARRequest.objects.filter(condition, metadata__has_key='export_name'):
+        if exported.metadata['export_name']:
+            default_storage.delete(exported.metadata['export_name'])
+            deleted += 1
+        exported.metadata = {k: v for k, v in exported.metadata.items() if k != 'export_name'}
+        exported.save(update_fields=['metadata'])
+    return deleted
+
+
+def _save_progress(dsar_request, progress):
+    dsar_request.metadata = {**dsar_request.metadata, 'erasure': progress}
+    dsar_request.save(update_fields=['metadata'])
+
+
+def _fail(dsar_request, progress, name, state, error):
+    """Record the failed step and fail the request; progress up to the last batch is kept."""
+    logger.exception(f"DSAR {dsar_request.id} erasure failed at {name}")
+    state['status'] = 'failed'
+    state['error'] = str(error)
+    dsar_request.metadata = {**dsar_request.metadata, 'erasure': progress}
+    dsar_request.status = 'failed'
+    dsar_request.failure_reason = f"Erasure failed at {name}: {error}"
+    dsar_request.save(update_fields=['metadata', 'status', 'failure_reason'])
+    return ErasureFailed(name, error)
+
+
+def execute_erasure(dsar_request, time_budget=None, pause=None):
+    """
+    Erase the subject of an approved deletion request, step by step.
+    
+    Returns True once every step has finished (the request is then completed), or
+    False if the time budget ran out first; calling again resumes. A step that
+    raises fails the request and raises ErasureFailed; calling again retries that
+    step from its last completed batch.
+    """
+    _check_approved(dsar_request)
+    time_budget = time_budget or settings.PDPA_ERASURE_TIME_BUDGET_SECONDS
+    pause = settings.PDPA_ERASURE_BATCH_PAUSE_SECONDS if pause is None else pause
+    deadline = time.monotonic() + time_budget
+    
+    if dsar_request.status != 'processing':
+        dsar_request.status = 'processing'
+        dsar_request.processing_started_at = dsar_request.processing_started_at or timezone.now()
+        dsar_request.failure_reason = ''
+        dsar_request.save(update_fields=['status', 'processing_started_at', 'failure_reason'])
+    
+    subject = DataSubject.for_request(dsar_request)
+    plan = build_plan('delete', subject)
+    progress = dict(dsar_request.metadata.get('erasure') or {})
+    archives = progress.setdefault('export_archives', {
+        'action': 'delete', 'status': 'pending', 'rows': 0, 'batches': 0, 'ms': 0, 'after': None,
+    })
+    if archives['status'] != 'completed':
+        started = time.perf_counter()
+        try:
+            archives['rows'] = delete_export_archives(subject)
+        except Exception as exc:
+            raise _fail(dsar_request, progress, 'export_archives', archives, exc) from exc
+        archives.update(status='completed', batches=1, ms=int((time.perf_counter() - started) * 1000))
+        archives.pop('error', None)
+        _save_progress(dsar_request, progress)
+    for step in plan.steps:
+        state = progress.setdefault(step.source.name, {
+            'action': step.action, 'status': 'pending', 'rows': 0, 'batches': 0, 'ms': 0, 'after': None,
+        })
+        if state['status'] == 'completed':
+            continue
+        
+        step_rows = 0
+        step_ms = 0
+        try:
+            for rows in step.pages(after=state['after']):
+                if time.monotonic() >= deadline:
+                    _save_progress(dsar_request, progress)
+                    logger.info(f"DSAR {dsar_request.id} erasure paused at {step.source.name}; will resume")
+                    return False
+                started = time.perf_counter()
+                changed = step.apply_batch([row['pk'] for row in rows])
+                elapsed_ms = int((time.perf_counter() - started) * 1000)
+                state['rows'] += changed
+                state['batches'] += 1
+                state['ms'] += elapsed_ms
+                state['after'] = step.key(rows[-1])
+                step_rows += changed
+                step_ms += elapsed_ms
+                _save_progress(dsar_request, progress)
+                if pause:
+                    time.sleep(pause)
+        except Exception as exc:
+            raise _fail(dsar_request, progress, step.source.name, state, exc) from exc
+        
+        state['status'] = 'completed'
+        state.pop('error', None)
+        _save_progress(dsar_request, progress)
+        _record_throughput(step.source.name, step_rows, step_ms)
+        logger.info(
+            f"DSAR {dsar_request.id} erasure {step.action} {step.source.name}: "
+            f"{state['rows']} rows in {state['batches']} batches, {state['ms']}ms"
+        )
+    
+    dsar_request.status = 'completed'
+    dsar_request.processed_at = timezone.now()
+    dsar_request.save(update_fields=['status', 'processed_at'])
+    logger.info(f"DSAR {dsar_request.id} erasure completed")
+    return True
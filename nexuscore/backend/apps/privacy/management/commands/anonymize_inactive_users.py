@@ -0,0 +1,47 @@
+"""
+Anonymize inactive users past the PDPA cutoff in checkpointed chunks.
+
+Uses the same cutoffs as enforce_pdpa_retention and resumes today's run if an
+earlier attempt was interrupted. Prints timings and row counts for every chunk.
+"""
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.privacy.anonymization import anonymize_inactive_users
+
+
+class Command(BaseCommand):
+    help = 'Anonymize inactive user accounts in chunked set-based UPDATEs.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Users per chunk (default: PDPA_ANONYMIZE_CHUNK_SIZE)')
+        parser.add_argument('--max-chunks', type=int, default=None,
+                            help='Stop after this many chunks; the next run resumes')
+        parser.add_argument('--inactive-years', type=int, default=2)
+        parser.add_argument('--financial-years', type=int, default=7)
+    
+    def handle(self, *args, **options):
+        now = timezone.now()
+        chunk = [0]
+        
+        def progress(scanned, anonymized, elapsed_ms):
+            chunk[0] += 1
+            self.stdout.write(
+                f"chunk {chunk[0]:>5}: scanned {scanned:>6}, anonymized {anonymized:>6}, {elapsed_ms}ms"
+            )
+        
+        run = anonymize_inactive_users(
+            now - relativedelta(years=options['inactive_years']),
+            now - relativedelta(years=options['financial_years']),
+            chunk_size=options['chunk_size'],
+            max_chunks=options['max_chunks'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{run.job} {run.run_date} {run.status}: {run.rows_affected} anonymized of "
+            f"{run.rows_scanned} scanned in {run.chunks} chunks, {run.elapsed_ms}ms total, "
+            f"slowest chunk {run.slowest_chunk_ms}ms"
+        ))
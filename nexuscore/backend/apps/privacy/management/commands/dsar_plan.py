@@ -0,0 +1,60 @@
+"""
+Show, cost and optionally run the personal-data plan for a DSAR.
+
+Without --execute only the planner's per-table row and cost estimates are printed.
+--execute runs export counting or rectification; erasure is left to the approved
+deletion flow.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.privacy.datamap import DataSubject, build_plan
+from apps.privacy.models import DSARRequest
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Plan a DSAR over the personal-data map and estimate its cost.'
+    
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--dsar', help='DSAR request id')
+        target.add_argument('--email', help='Plan for this email address')
+        parser.add_argument('--type', default=None, help='export, delete or rectification')
+        parser.add_argument('--execute', action='store_true')
+    
+    def handle(self, *args, **options):
+        changes = {}
+        if options['dsar']:
+            try:
+                dsar_request = DSARRequest.objects.select_related('user').get(pk=options['dsar'])
+            except DSARRequest.DoesNotExist:
+                raise CommandError(f"DSAR request {options['dsar']} not found")
+            subject = DataSubject.for_request(dsar_request)
+            request_type = options['type'] or dsar_request.request_type
+            changes = dsar_request.metadata.get('rectification') or {}
+        else:
+            subject = DataSubject(
+                user=User.objects.filter(email=options['email']).first(), email=options['email'],
+            )
+            request_type = options['type'] or 'export'
+        
+        plan = build_plan(request_type, subject, changes)
+        estimate = plan.estimate()
+        self.stdout.write(f"{plan.request_type} plan for {subject}")
+        for step in plan.steps:
+            step_estimate = estimate['steps'][step.source.name]
+            self.stdout.write(
+                f"  {step.action:<10} {step.source.name:<16} ~{step_estimate['rows']:>10} rows  "
+                f"cost {step_estimate['cost']:>12.1f}"
+            )
+        for source, reason in plan.retained:
+            self.stdout.write(f"  {'retain':<10} {source.name:<16} {reason}")
+        self.stdout.write(f"Estimated {estimate['rows']} rows, total cost {estimate['cost']}")
+        
+        if not options['execute']:
+            return
+        if plan.request_type == 'delete':
+            raise CommandError("Erasure runs only through the approved deletion flow")
+        for name, result in plan.execute().items():
+            self.stdout.write(f"  {name:<16} {result['rows']:>10} rows in {result['ms']}ms")
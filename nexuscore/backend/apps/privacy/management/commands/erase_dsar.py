@@ -0,0 +1,57 @@
+"""
+Preview or run the erasure for an approved DSAR deletion.
+
+--dry-run prints affected rows and the estimated duration per table. Without it the
+erasure runs (or resumes) in batches and reports per-step progress.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.privacy.erasure import ErasureFailed, ErasureNotAllowed, dry_run, execute_erasure
+from apps.privacy.models import DSARRequest
+
+
+class Command(BaseCommand):
+    help = 'Erase the data subject of an approved DSAR deletion in resumable batches.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('dsar_id')
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--time-budget', type=int, default=None, help='Seconds before pausing')
+        parser.add_argument('--pause', type=float, default=None, help='Seconds between batches')
+    
+    def handle(self, *args, **options):
+        try:
+            dsar_request = DSARRequest.objects.select_related('user').get(pk=options['dsar_id'])
+        except DSARRequest.DoesNotExist:
+            raise CommandError(f"DSAR request {options['dsar_id']} not found")
+        
+        if options['dry_run']:
+            estimate = dry_run(dsar_request)
+            for name, step in estimate['steps'].items():
+                self.stdout.write(
+                    f"  {step['action']:<10} {name:<16} {step['rows']:>10} rows "
+                    f"{step['batches']:>6} batches  ~{step['estimated_seconds']}s"
+                )
+            for name, reason in estimate['retained'].items():
+                self.stdout.write(f"  {'retain':<10} {name:<16} {reason}")
+            self.stdout.write(f"Total {estimate['rows']} rows, ~{estimate['estimated_seconds']}s")
+            return
+        
+        try:
+            finished = execute_erasure(
+                dsar_request, time_budget=options['time_budget'], pause=options['pause'],
+            )
+        except ErasureNotAllowed as exc:
+            raise CommandError(str(exc))
+        except ErasureFailed as exc:
+            raise CommandError(f"DSAR {dsar_request.id} erasure failed at {exc}; run again to retry")
+        for name, step in dsar_request.metadata.get('erasure', {}).items():
+            self.stdout.write(
+                f"  {step['action']:<10} {name:<16} {step['status']:<10} {step['rows']:>10} rows "
+                f"{step['batches']:>6} batches {step['ms']:>8}ms"
+            )
+        if finished:
+            self.stdout.write(self.style.SUCCESS(f"DSAR {dsar_request.id} erasure completed"))
+        else:
+            self.stdout.write(self.style.WARNING("Time budget used; run again to resume"))
@@ -0,0 +1,66 @@
+"""
+Run, preview or inspect retention policies.
+
+--dry-run counts the rows each policy would purge without deleting anything.
+--report prints the checkpointed metrics of recent runs.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.privacy.models import RetentionRun
+from apps.privacy.retention import count_expired, get_policy, policies, run_policy
+
+
+class Command(BaseCommand):
+    help = 'Purge rows past their retention period in small, resumable batches.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('policies', nargs='*', help='Policy names (default: all)')
+        parser.add_argument('--dry-run', action='store_true', help='Only count expired rows')
+        parser.add_argument('--report', action='store_true', help='Show recent run metrics')
+        parser.add_argument('--max-batches', type=int, default=None)
+        parser.add_argument('--time-budget', type=int, default=None, help='Seconds per policy')
+        parser.add_argument('--pause', type=float, default=None,
+                            help='Seconds between batches (default: RETENTION_BATCH_PAUSE_SECONDS)')
+        parser.add_argument('--verbose-batches', action='store_true')
+    
+    def handle(self, *args, **options):
+        try:
+            selected = [get_policy(name) for name in options['policies']] or policies()
+        except KeyError as exc:
+            raise CommandError(f"Unknown retention policy {exc}")
+        
+        if options['report']:
+            runs = RetentionRun.objects.filter(job__in=[policy.job for policy in selected])[:30]
+            for run in runs:
+                rate = run.rows_affected * 1000 / run.elapsed_ms if run.elapsed_ms else 0
+                self.stdout.write(
+                    f"{run.run_date} {run.job:<40} {run.status:<10} deleted {run.rows_affected:>10} "
+                    f"batches {run.chunks:>6} {run.elapsed_ms:>8}ms slowest {run.slowest_chunk_ms}ms "
+                    f"({rate:.0f} rows/s)"
+                )
+            return
+        
+        if options['dry_run']:
+            for policy in selected:
+                self.stdout.write(
+                    f"{policy.name:<30} {count_expired(policy):>12} rows older than "
+                    f"{policy.cutoff():%Y-%m-%d %H:%M}"
+                )
+            return
+        
+        def progress(policy, scanned, deleted, elapsed):
+            self.stdout.write(f"  {policy.name}: batch deleted {deleted}/{scanned} in {elapsed * 1000:.0f}ms")
+        
+        for policy in selected:
+            run = run_policy(
+                policy,
+                max_batches=options['max_batches'],
+                time_budget=options['time_budget'],
+                pause=options['pause'],
+                progress=progress if options['verbose_batches'] else None,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"{policy.name}: {run.status}, deleted {run.rows_affected} rows in {run.chunks} batches, "
+                f"{run.elapsed_ms}ms (slowest batch {run.slowest_chunk_ms}ms)"
+            ))
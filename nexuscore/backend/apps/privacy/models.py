@@ -3,12 +3,75 @@ Privacy and PDPA compliance models for NexusCore.
 """
 
 import uuid
+from datetime import timedelta
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 
 from apps.users.models import User
 
+# Requests still running against the SLA clock
+OPEN_DSAR_STATUSES = ['pending', 'verifying', 'processing']
+
+
+def sla_thresholds(now=None):
+    """(approaching, breached) cut-offs on requested_at for the current time."""
+    now = now or timezone.now()
+    sla = timedelta(hours=settings.PDPA_DSAR_SLA_HOURS)
+    warning = timedelta(hours=settings.PDPA_DSAR_SLA_WARNING_HOURS)
+    return now - (sla - warning), now - sla
+
+
+class DSARRequestQuerySet(models.QuerySet):
+    """SLA bucketing in SQL, as plain ranges on requested_at over open requests."""
+    
+    def open(self):
+        return self.filter(status__in=OPEN_DSAR_STATUSES)
+    
+    def within_sla(self, now=None):
+        approaching, _ = sla_thresholds(now)
+        return self.open().filter(requested_at__gt=approaching)
+    
+    def approaching_sla(self, now=None):
+        approaching, breached = sla_thresholds(now)
+        return self.open().filter(requested_at__lte=approaching, requested_at__gt=breached)
+    
+    def breached_sla(self, now=None):
+        _, breached = sla_thresholds(now)
+        return self.open().filter(requested_at__lte=breached)
+    
+    def with_sla(self, now=None):
+        """Annotate sla_bucket and sla_deadline so both can be filtered and sorted on."""
+        approaching, breached = sla_thresholds(now)
+        return self.annotate(
+            sla_bucket=models.Case(
+                models.When(status='completed', then=models.Value('completed')),
+                models.When(~models.Q(status__in=OPEN_DSAR_STATUSES), then=models.F('status')),
+                models.When(requested_at__lte=breached, then=models.Value('breached_sla')),
+                models.When(requested_at__lte=approaching, then=models.Value('approaching_sla')),
+                default=models.Value('within_sla'),
+                output_field=models.CharField(),
+            ),
+            sla_deadline=models.ExpressionWrapper(
+                models.F('requested_at') + timedelta(hours=settings.PDPA_DSAR_SLA_HOURS),
+                output_field=models.DateTimeField(),
+            ),
+        )
+    
+    def sla_counts(self, now=None):
+        """Open requests per SLA bucket, counted in one query."""
+        approaching, breached = sla_thresholds(now)
+        return self.open().aggregate(
+            within_sla=models.Count('id', filter=models.Q(requested_at__gt=approaching)),
+            approaching_sla=models.Count(
+                'id', filter=models.Q(requested_at__lte=approaching, requested_at__gt=breached)
+            ),
+            breached_sla=models.Count('id', filter=models.Q(requested_at__lte=breached)),
+            oldest_requested_at=models.Min('requested_at'),
+        )
+
 
 class DSARRequest(models.Model):
     """Data Subject Access Request tracking for PDPA compliance."""
@@ -49,8 +112,7 @@ class DSARRequest(models.Model):
     verified_at = models.DateTimeField(null=True, blank=True)
     verification_method = models.CharField(max_length=50, blank=True)
     
-    # Processing
-    export_url = models.URLField(blank=True)
+    # Processing; the archive's storage key is metadata['export_name'], presigned on demand
     export_expires_at = models.DateTimeField(null=True, blank=True)
     
     # Metadata
@@ -72,6 +134,11 @@ class DSARRequest(models.Model):
     )
     deletion_approved_at = models.DateTimeField(null=True, blank=True)
     
+    # Set once the breach alert has gone out, so each breach is reported once
+    sla_breach_alerted_at = models.DateTimeField(null=True, blank=True)
+    
+    objects = DSARRequestQuerySet.as_manager()
+    
     class Meta:
         db_table = 'dsar_requests'
         indexes = [
@@ -79,10 +146,10 @@ class DSARRequest(models.Model):
             models.Index(fields=['status', 'requested_at']),
             models.Index(fields=['request_type', 'status']),
             models.Index(fields=['requested_at']),
-            # Partial index for pending requests (SLA monitoring)
+            # Partial index for open requests (SLA monitoring)
             models.Index(
-                fields=['status'],
-                condition=models.Q(status='pending'),
+                fields=['requested_at'],
+                condition=models.Q(status__in=OPEN_DSAR_STATUSES),
                 name='idx_pending_dsar'
             ),
         ]
@@ -102,24 +169,39 @@ class DSARRequest(models.Model):
     
     @property
     def sla_status(self):
-        """Check if request is within 72-hour SLA."""
+        """SLA bucket for this request; querysets use with_sla() for the same buckets in SQL."""
+        if getattr(self, 'sla_bucket', None):
+            return self.sla_bucket
         if self.status == 'completed':
             return 'completed'
+        if self.status not in OPEN_DSAR_STATUSES:
+            return self.status
         
-        hours_since_request = (timezone.now() - self.requested_at).total_seconds() / 3600
-        
-        if hours_since_request < 48:
-            return 'within_sla'
-        elif hours_since_request < 72:
+        approaching, breached = sla_thresholds()
+        if self.requested_at <= breached:
+            return 'breached_sla'
+        elif self.requested_at <= approaching:
             return 'approaching_sla'
         else:
-            return 'breached_sla'
+            return 'within_sla'
     
     @property
     def hours_remaining_in_sla(self):
-        """Hours remaining in 72-hour SLA."""
+        """Hours remaining in the SLA window."""
         hours_elapsed = (timezone.now() - self.requested_at).total_seconds() / 3600
-        return max(0, 72 - hours_elapsed)
+        return max(0, settings.PDPA_DSAR_SLA_HOURS - hours_elapsed)
+    
+    def export_download_url(self):
+        """Short-lived presigned link to the export archive, or '' once the export has expired."""
+        export_name = self.metadata.get('export_name')
+        now = timezone.now()
+        if not export_name or not self.export_expires_at or self.export_expires_at <= now:
+            return ''
+        from apps.privacy.export import export_link
+        
+        ttl = min(timedelta(seconds=settings.PDPA_EXPORT_LINK_TTL_SECONDS), self.export_expires_at - now)
+        url, _ = export_link(export_name, ttl=ttl)
+        return url
     
     def clean(self):
         """Validate DSAR data."""
@@ -133,4 +215,41 @@ class DSARRequest(models.Model):
                 'processed_at': 'Processed date cannot be before request date.'
             })
         
-        super().clean()
\ No newline at end of file
+        super().clean()
+
+
+class RetentionRun(models.Model):
+    """Checkpointed progress of one retention job for one day, so it can resume."""
+    
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    job = models.CharField(max_length=100)
+    run_date = models.DateField()
+    cutoff = models.DateTimeField(help_text="Rows older than this are in scope for the run")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    
+    # Keyset position of the last processed chunk
+    last_key = models.CharField(max_length=255, blank=True, default='')
+    chunks = models.PositiveIntegerField(default=0)
+    rows_scanned = models.BigIntegerField(default=0)
+    rows_affected = models.BigIntegerField(default=0)
+    elapsed_ms = models.BigIntegerField(default=0)
+    slowest_chunk_ms = models.PositiveIntegerField(default=0)
+    
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'retention_runs'
+        ordering = ['-run_date', 'job']
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'run_date'], name='unique_retention_run'),
+        ]
+    
+    def __str__(self):
+        return f"{self.job} {self.run_date} ({self.status})"
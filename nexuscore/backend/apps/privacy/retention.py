@@ -0,0 +1,305 @@
+"""
+Declarative retention policies for large tables.
+
+A RetentionPolicy names a model, the timestamp field that ages its rows, how old a
+row must be, an optional extra predicate and how fast to purge. The runner walks
+matching rows in (age field, pk) order along the age index and deletes them in
+small batches, one short transaction each, sleeping between batches so replicas and
+disks keep up. Progress is checkpointed in a RetentionRun per policy per day, which
+also serves as the policy's metrics, so an interrupted purge resumes where it
+stopped.
+
+Models with reverse relations are deleted through the ORM a batch at a time so
+cascades and signals still run; everything else is removed with a plain
+DELETE ... WHERE pk = ANY(...). Both also bound the batch's age range so that a
+partitioned table only scans the partitions the batch lies in. A policy may
+instead hand whole expired ranges to a ``bulk_purge`` callable, which is how the
+partitioned events table drops months.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.privacy.runs import checkpoint, finish_run, start_run
+
+logger = logging.getLogger(__name__)
+
+KEY_SEPARATOR = '|'
+
+
+class RetentionPolicy:
+    """How long rows of one model are kept and how quickly they are purged."""
+    
+    def __init__(self, name, model, age_field, age, predicate=None, batch_size=1000,
+                 max_rows_per_second=None, archive=None, bulk_purge=None):
+        self.name = name
+        self.model_label = model
+        self.age_field = age_field
+        # timedelta/relativedelta, or a callable returning one so settings are read late
+        self.age = age
+        self.predicate = predicate
+        self.batch_size = batch_size
+        self.max_rows_per_second = max_rows_per_second
+        # Called with each batch's primary keys inside the deleting transaction
+        self.archive = archive
+        # Called with the cutoff before row batches to purge whole ranges; returns rows purged
+        self.bulk_purge = bulk_purge
+    
+    def __repr__(self):
+        return f"<RetentionPolicy {self.name}: {self.model_label}.{self.age_field}>"
+    
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+    
+    @property
+    def job(self):
+        return f"retention:{self.name}"
+    
+    def cutoff(self, now=None):
+        age = self.age() if callable(self.age) else self.age
+        return (now or timezone.now()) - age
+    
+    def queryset(self, cutoff):
+        queryset = self.model._base_manager.filter(**{f'{self.age_field}__lt': cutoff})
+        if self.predicate is not None:
+            queryset = queryset.filter(self.predicate)
+        return queryset
+
+
+_registry = {}
+
+
+def register(policy):
+    _registry[policy.name] = policy
+    return policy
+
+
+def get_policy(name):
+    return _registry[name]
+
+
+def policies():
+    return list(_registry.values())
+
+
+def _encode_key(age_value, pk):
+    return f"{age_value.isoformat()}{KEY_SEPARATOR}{pk}"
+
+
+def _decode_key(key):
+    age_value, pk = key.split(KEY_SEPARATOR, 1)
+    return parse_datetime(age_value), pk
+
+
+def delete_rows(model, pks, age_field=None, age_range=None):
+    """
+    Delete rows by primary key, through the ORM only when cascades need collecting.
+    
+    ``age_range`` (first, last) on ``age_field`` is added to the predicate so a table
+    partitioned on that field is pruned to the batch's partitions.
+    """
+    if model._meta.related_objects:
+        # Let the collector handle cascades for this (small) batch
+        queryset = model._base_manager.filter(pk__in=pks)
+        if age_range:
+            queryset = queryset.filter(**{f'{age_field}__range': age_range})
+        deleted, _ = queryset.delete()
+        return deleted
+    sql = f"DELETE FROM {model._meta.db_table} WHERE {model._meta.pk.column} = ANY(%s)"
+    params = [list(pks)]
+    if age_range:
+        age_column = model._meta.get_field(age_field).column
+        sql += f" AND {age_column} >= %s AND {age_column} <= %s"
+        params.extend(age_range)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def purge_batch(policy, cutoff, after=None):
+    """Delete the next batch after the keyset position; returns (last key, scanned, deleted)."""
+    queryset = policy.queryset(cutoff)
+    if after is not None:
+        age_value, pk = after
+        queryset = queryset.filter(
+            Q(**{f'{policy.age_field}__gt': age_value})
+            | Q(**{policy.age_field: age_value, 'pk__gt': pk})
+        )
+    with transaction.atomic():
+        rows = list(
+            queryset.order_by(policy.age_field, 'pk')
+            .values_list('pk', policy.age_field)[:policy.batch_size]
+        )
+        if not rows:
+            return None, 0, 0
+        pks = [pk for pk, _ in rows]
+        if policy.archive:
+            policy.archive(pks)
+        # Rows come in age order, so the first and last bound the whole batch
+        deleted = delete_rows(policy.model, pks, policy.age_field, (rows[0][1], rows[-1][1]))
+    last_pk, last_age = rows[-1]
+    return (last_age, last_pk), len(rows), deleted
+
+
+def count_expired(policy, now=None):
+    """Dry run: rows the policy would purge right now."""
+    return policy.queryset(policy.cutoff(now)).count()
+
+
+def _throttle(policy, rows, elapsed, pause):
+    delay = pause
+    if policy.max_rows_per_second:
+        delay = max(delay, rows / policy.max_rows_per_second - elapsed)
+    if delay > 0:
+        time.sleep(delay)
+
+
+def run_policy(policy, max_batches=None, time_budget=None, pause=None, progress=None):
+    """
+    Purge rows past the policy's cutoff in checkpointed batches.
+    
+    Stops when nothing is left (the day's run is then completed), after
+    ``max_batches`` or when ``time_budget`` seconds have passed; a later call the
+    same day resumes from the checkpoint. Returns the RetentionRun.
+    """
+    if isinstance(policy, str):
+        policy = get_policy(policy)
+    if pause is None:
+        pause = settings.RETENTION_BATCH_PAUSE_SECONDS
+    time_budget = time_budget or settings.RETENTION_TIME_BUDGET_SECONDS
+    deadline = time.monotonic() + time_budget
+    
+    run = start_run(policy.job, policy.cutoff())
+    if run.status == 'completed':
+        return run
+    cutoff = run.cutoff
+    
+    if policy.bulk_purge and not run.last_key:
+        started = time.perf_counter()
+        purged = policy.bulk_purge(cutoff)
+        if purged:
+            checkpoint(run, '', 0, purged, int((time.perf_counter() - started) * 1000))
+    
+    after = _decode_key(run.last_key) if run.last_key else None
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        if time.monotonic() >= deadline:
+            logger.info(f"{policy.name}: time budget used, resuming on the next run")
+            break
+        started = time.perf_counter()
+        last, scanned, deleted = purge_batch(policy, cutoff, after)
+        if last is None:
+            finish_run(run)
+            break
+        elapsed = time.perf_counter() - started
+        checkpoint(run, _encode_key(*last), scanned, deleted, int(elapsed * 1000))
+        after = last
+        batches += 1
+        if progress:
+            progress(policy, scanned, deleted, elapsed)
+        _throttle(policy, deleted, elapsed, pause)
+    
+    run.refresh_from_db()
+    logger.info(
+        f"Retention {policy.name}: {run.rows_affected} rows purged in {run.chunks} batches "
+        f"({run.elapsed_ms}ms, slowest {run.slowest_chunk_ms}ms), {run.status}"
+    )
+    return run
+
+
+def run_policies(names=None, time_budget=None, **kwargs):
+    """
+    Run the named policies (default: all registered) within one shared time budget
+    and return {name: metrics}.
+    """
+    selected = [get_policy(name) for name in names] if names else policies()
+    deadline = time.monotonic() + (time_budget or settings.RETENTION_TIME_BUDGET_SECONDS)
+    results = {}
+    for policy in selected:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        run = run_policy(policy, time_budget=remaining, **kwargs)
+        results[policy.name] = {
+            'status': run.status,
+            'rows_deleted': run.rows_affected,
+            'batches': run.chunks,
+            'elapsed_ms': run.elapsed_ms,
+            'slowest_batch_ms': run.slowest_chunk_ms,
+        }
+    return results
+
+
+# Partitioned events: whole months are dropped, the current partial month is left to row batches
+
+def _drop_event_partitions(cutoff):
+    """Drop months that end by the cutoff; returns the planner's row estimate for what was dropped."""
+    from apps.events.partitions import drop_expired_partitions, is_partitioned
+    
+    if not is_partitioned():
+        return 0
+    expired = drop_expired_partitions(dry_run=True, cutoff=cutoff)
+    if not expired:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT coalesce(sum(greatest(reltuples, 0)), 0)::bigint FROM pg_class WHERE relname = ANY(%s)",
+            [expired],
+        )
+        rows = cursor.fetchone()[0]
+    drop_expired_partitions(cutoff=cutoff)
+    return rows
+
+
+# Offloaded webhook payloads: segments are deleted once none of their rows remain
+
+def _release_payload_segments(pks):
+    """archive hook: after the batch commits, delete the segments it emptied."""
+    from apps.webhooks.offload import delete_unreferenced_segments, segments_for
+    
+    segment_names = segments_for(pks)
+    if segment_names:
+        transaction.on_commit(lambda: delete_unreferenced_segments(segment_names))
+
+
+register(RetentionPolicy(
+    'marketing_leads', 'leads.Lead',
+    age_field='updated_at',
+    age=relativedelta(years=2),  # PDPA
+    batch_size=1000,
+))
+
+register(RetentionPolicy(
+    'idempotency_records', 'billing.IdempotencyRecord',
+    age_field='expires_at',
+    age=timedelta(days=1),
+    batch_size=5000,
+))
+
+register(RetentionPolicy(
+    'processed_webhook_events', 'webhooks.WebhookEvent',
+    age_field='created_at',
+    age=lambda: timedelta(days=settings.WEBHOOK_EVENT_RETENTION_DAYS),
+    predicate=Q(processed=True),
+    batch_size=2000,
+    archive=_release_payload_segments,
+))
+
+register(RetentionPolicy(
+    'events', 'events.Event',
+    age_field='created_at',
+    age=lambda: relativedelta(months=settings.EVENTS_RETENTION_MONTHS),
+    batch_size=5000,
+    max_rows_per_second=20000,
+    bulk_purge=_drop_event_partitions,
+))
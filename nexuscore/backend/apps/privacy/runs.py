@@ -0,0 +1,54 @@
+"""
+Checkpoint helpers shared by chunked privacy and retention jobs.
+
+A job's progress for a day lives in one RetentionRun row. Each chunk advances the
+keyset position and counters with a single UPDATE, so an interrupted job resumes
+after its last completed chunk instead of starting over.
+"""
+
+import logging
+
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from apps.privacy.models import RetentionRun
+
+logger = logging.getLogger(__name__)
+
+
+def start_run(job, cutoff, as_of=None):
+    """Return today's RetentionRun for ``job``, resuming it if it was interrupted."""
+    run, created = RetentionRun.objects.get_or_create(
+        job=job,
+        run_date=timezone.localdate(as_of or timezone.now()),
+        defaults={'cutoff': cutoff},
+    )
+    if not created and run.status == 'running':
+        logger.info(
+            f"Resuming {job} run {run.run_date} after key {run.last_key or '-'} "
+            f"({run.rows_affected} rows already processed)"
+        )
+    return run
+
+
+def checkpoint(run, last_key, scanned, affected, elapsed_ms):
+    """Record one completed chunk."""
+    RetentionRun.objects.filter(pk=run.pk).update(
+        last_key=str(last_key),
+        chunks=F('chunks') + 1,
+        rows_scanned=F('rows_scanned') + scanned,
+        rows_affected=F('rows_affected') + affected,
+        elapsed_ms=F('elapsed_ms') + elapsed_ms,
+        slowest_chunk_ms=Greatest('slowest_chunk_ms', elapsed_ms),
+        updated_at=timezone.now(),
+    )
+    run.last_key = str(last_key)
+
+
+def finish_run(run):
+    RetentionRun.objects.filter(pk=run.pk).update(
+        status='completed', finished_at=timezone.now(), updated_at=timezone.now(),
+    )
+    run.refresh_from_db()
+    return run
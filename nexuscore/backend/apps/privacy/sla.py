@@ -0,0 +1,95 @@
+"""
+DSAR SLA monitoring.
+
+Bucket counts come from one aggregate over open requests (idx_pending_dsar covers
+requested_at for open statuses) and are published to the cache for dashboards.
+Newly breached requests are claimed with a single UPDATE ... RETURNING that stamps
+sla_breach_alerted_at, in the same transaction as the alert is sent: concurrent
+monitors wait on the row locks and find nothing left to claim, and a failed send
+rolls the stamp back so the breach is reported again on the next run.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.privacy.models import OPEN_DSAR_STATUSES, DSARRequest, sla_thresholds
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = 'privacy:dsar_sla:metrics'
+
+
+def collect_sla_metrics(now=None):
+    """Open DSAR counts per SLA bucket, plus the age of the oldest open request."""
+    now = now or timezone.now()
+    counts = DSARRequest.objects.sla_counts(now)
+    oldest = counts.pop('oldest_requested_at')
+    metrics = {
+        **counts,
+        'open': sum(counts.values()),
+        'oldest_open_hours': round((now - oldest).total_seconds() / 3600, 1) if oldest else 0.0,
+        'collected_at': now.isoformat(),
+    }
+    cache.set(METRICS_KEY, metrics, timeout=None)
+    return metrics
+
+
+def claim_new_breaches(now=None):
+    """Mark breached requests that have not been alerted yet and return them as dicts."""
+    _, breached = sla_thresholds(now)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE dsar_requests SET sla_breach_alerted_at = NOW() "
+            "WHERE status = ANY(%s) AND requested_at <= %s AND sla_breach_alerted_at IS NULL "
+            "RETURNING id, user_email, request_type, status, requested_at",
+            [OPEN_DSAR_STATUSES, breached],
+        )
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return sorted(rows, key=lambda row: row['requested_at'])
+
+
+def send_breach_alert(breaches):
+    recipient = settings.PDPA_DPO_EMAIL
+    lines = [
+        f"{dsar['id']}  {dsar['request_type']:<14} {dsar['status']:<11} {dsar['user_email']}  "
+        f"requested {dsar['requested_at']:%Y-%m-%d %H:%M}"
+        for dsar in breaches
+    ]
+    logger.error(f"{len(breaches)} DSAR requests breached the {settings.PDPA_DSAR_SLA_HOURS}h SLA")
+    if not recipient:
+        for line in lines:
+            logger.error(f"DSAR SLA breach: {line}")
+        return
+    EmailMessage(
+        subject=f"[NexusCore] {len(breaches)} DSAR request(s) breached the PDPA SLA",
+        body='\n'.join([
+            f"The following requests are past the {settings.PDPA_DSAR_SLA_HOURS}-hour SLA:",
+            '',
+            *lines,
+        ]),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient],
+    ).send()
+
+
+def monitor_sla(now=None):
+    metrics = collect_sla_metrics(now)
+    breaches = []
+    if metrics['breached_sla']:
+        try:
+            with transaction.atomic():
+                breaches = claim_new_breaches(now)
+                if breaches:
+                    send_breach_alert(breaches)
+        except Exception:
+            logger.exception("DSAR SLA breach alert failed; breaches will be reported on the next run")
+            breaches = []
+    metrics['new_breaches'] = len(breaches)
+    logger.info(f"DSAR SLA: {metrics}")
+    return metrics
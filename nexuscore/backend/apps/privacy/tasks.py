@@ -2,11 +2,14 @@
 Privacy and PDPA compliance tasks for NexusCore.
 """
 
+from datetime import timedelta
+
 from celery import shared_task
+from django.conf import settings
+from django.core.files.storage import default_storage
 from django.utils import timezone
 from dateutil.relativedelta import relativedelta
 import logging
-import hashlib
 
 logger = logging.getLogger(__name__)
 
@@ -23,46 +26,35 @@ def enforce_pdpa_retention():
     """
     logger.info("Starting PDPA data retention enforcement")
     
-    from apps.leads.models import Lead
-    from apps.users.models import User
-    from apps.billing.models import Invoice
+    from apps.privacy.retention import run_policy
     
-    # 1. Marketing Data: Delete after 2 years of inactivity
-    marketing_cutoff = timezone.now() - relativedelta(years=2)
-    deleted_marketing, _ = Lead.objects.filter(
-        updated_at__lt=marketing_cutoff
-    ).delete()
+    # 1. Marketing Data: Delete after 2 years of inactivity, in small batches
+    deleted_marketing = run_policy('marketing_leads').rows_affected
     
     # 2. Financial Data: Keep for 7 years (IRAS requirement)
     financial_cutoff = timezone.now() - relativedelta(years=7)
     
     # 3. User Data: Anonymize after 2 years of inactivity if no financial data
     user_cutoff = timezone.now() - relativedelta(years=2)
-    old_users = User.objects.filter(
-        is_active=False,
-        updated_at__lt=user_cutoff
-    ).exclude(
-        # Keep users who have financial data within retention period
-        owned_organizations__invoices__created_at__gt=financial_cutoff
-    )
+    from apps.privacy.anonymization import anonymize_inactive_users
     
-    anonymized_count = 0
-    for user in old_users:
-        # Anonymize personal data but keep account structure
-        user.email = f"anonymized_{hashlib.sha256(str(user.id).encode()).hexdigest()[:16]}@deleted.nexuscore"
-        user.name = "Deleted User"
-        user.phone = ""
-        user.company = ""
-        user.set_unusable_password()
-        user.save()
-        anonymized_count += 1
+    # Chunked, checkpointed UPDATEs; resumes today's run if it was interrupted
+    run = anonymize_inactive_users(user_cutoff, financial_cutoff)
+    anonymized_count = run.rows_affected
     
     # 4. DSAR Exports: Delete after 30 days
     from apps.privacy.models import DSARRequest
     dsar_cutoff = timezone.now() - relativedelta(days=30)
-    deleted_dsar_exports, _ = DSARRequest.objects.filter(
-        export_expires_at__lt=dsar_cutoff
-    ).update(export_url='')
+    expired_exports = DSARRequest.objects.filter(
+        export_expires_at__lt=dsar_cutoff, metadata__has_key='export_name'
+    )
+    deleted_dsar_exports = 0
+    for expired in expired_exports.iterator():
+        if expired.metadata['export_name']:
+            default_storage.delete(expired.metadata['export_name'])
+        expired.metadata = {k: v for k, v in expired.metadata.items() if k != 'export_name'}
+        expired.save(update_fields=['metadata'])
+        deleted_dsar_exports += 1
     
     logger.info(f"PDPA Retention Enforcement Complete:")
     logger.info(f"- Deleted {deleted_marketing} marketing records")
@@ -76,6 +68,25 @@ def enforce_pdpa_retention():
     }
 
 
+@shared_task
+def run_retention_policies(names=None):
+    """Purge rows past their retention period for every registered policy."""
+    from apps.privacy.retention import run_policies
+    
+    results = run_policies(names)
+    for name, metrics in results.items():
+        logger.info(f"Retention {name}: {metrics}")
+    return results
+
+
+@shared_task
+def monitor_dsar_sla():
+    """Publish DSAR SLA bucket counts and alert on newly breached requests."""
+    from apps.privacy.sla import monitor_sla
+    
+    return monitor_sla()
+
+
 @shared_task
 def send_dsar_verification_email(dsar_id, user_email, verification_token):
     """Send DSAR verification email."""
@@ -106,12 +117,28 @@ def process_dsar_request(dsar_id):
         dsar_request = DSARRequest.objects.get(id=dsar_id)
         
         if dsar_request.request_type == 'export':
-            # Generate data export
-            export_data = generate_user_data_export(dsar_request.user)
+            dsar_request.status = 'processing'
+            dsar_request.processing_started_at = timezone.now()
+            dsar_request.save(update_fields=['status', 'processing_started_at'])
             
-            # Store export (in production, upload to secure S3)
-            dsar_request.export_url = "https://example.com/export-file.zip"
-            dsar_request.export_expires_at = timezone.now() + timezone.timedelta(days=30)
+            try:
+                export_name, counts = generate_user_data_export(dsar_request.user)
+            except Exception as e:
+                logger.exception(f"DSAR export failed for {dsar_request.user_email}")
+                dsar_request.status = 'failed'
+                dsar_request.failure_reason = str(e)
+                dsar_request.save(update_fields=['status', 'failure_reason'])
+                return False
+            
+            if export_name is None:
+                dsar_request.status = 'failed'
+                dsar_request.failure_reason = 'No user account is linked to this request'
+                dsar_request.save(update_fields=['status', 'failure_reason'])
+                return False
+            
+            # Only the storage key is kept; links are presigned when served (export_download_url)
+            dsar_request.export_expires_at = timezone.now() + timedelta(days=settings.PDPA_EXPORT_TTL_DAYS)
+            dsar_request.metadata = {**dsar_request.metadata, 'export_name': export_name, 'export_rows': counts}
             dsar_request.status = 'completed'
             dsar_request.processed_at = timezone.now()
             dsar_request.save()
@@ -119,8 +146,37 @@ def process_dsar_request(dsar_id):
             logger.info(f"DSAR export completed for {dsar_request.user_email}")
             
         elif dsar_request.request_type == 'delete':
-            # Send approval notification to admin
-            notify_admin_dsar_deletion.delay(dsar_id=str(dsar_id))
+            if dsar_request.deletion_approved_by_id and dsar_request.deletion_approved_at:
+                from apps.privacy.erasure import schedule_erasure
+                
+                schedule_erasure(dsar_request)
+            else:
+                # Send approval notification to admin
+                notify_admin_dsar_deletion.delay(dsar_id=str(dsar_id))
+            
+        elif dsar_request.request_type == 'rectification':
+            from apps.privacy.datamap import DataSubject, build_plan
+            
+            # Corrected values, e.g. {'name': ..., 'phone': ...}, captured with the request
+            changes = dsar_request.metadata.get('rectification') or {}
+            plan = build_plan('rectification', DataSubject.for_request(dsar_request), changes)
+            if not plan.steps:
+                dsar_request.status = 'failed'
+                dsar_request.failure_reason = (
+                    'No corrected values were supplied with the request' if not changes
+                    else f"No personal data matched the correctable fields: {', '.join(sorted(changes))}"
+                )
+                dsar_request.save(update_fields=['status', 'failure_reason'])
+                logger.error(f"DSAR rectification {dsar_id} failed: {dsar_request.failure_reason}")
+                return False
+            results = plan.execute()
+            
+            dsar_request.metadata = {**dsar_request.metadata, 'rectification_results': results}
+            dsar_request.status = 'completed'
+            dsar_request.processed_at = timezone.now()
+            dsar_request.save()
+            
+            logger.info(f"DSAR rectification completed for {dsar_request.user_email}")
             
         return True
         
@@ -140,10 +196,20 @@ def notify_admin_dsar_deletion(dsar_id):
     try:
         dsar_request = DSARRequest.objects.get(id=dsar_id)
         
+        # Affected rows and expected duration, for the approver to review
+        from apps.privacy.erasure import dry_run
+        
+        estimate = dry_run(dsar_request)
+        dsar_request.metadata = {**dsar_request.metadata, 'erasure_estimate': estimate}
+        dsar_request.save(update_fields=['metadata'])
+        
         # TODO: Send email to admin for approval
         # In production, this would send an email to the data protection officer
         
-        logger.info(f"Admin notification sent for DSAR deletion {dsar_id}")
+        logger.info(
+            f"Admin notification sent for DSAR deletion {dsar_id} "
+            f"({estimate['rows']} rows, ~{estimate['estimated_seconds']}s)"
+        )
         
         return True
         
@@ -152,77 +218,46 @@ def notify_admin_dsar_deletion(dsar_id):
         return False
 
 
+@shared_task
+def execute_dsar_erasure(dsar_id):
+    """
+    Erase the subject of an approved deletion, re-queuing itself until every step is done.
+    
+    A failed step leaves the request 'failed' with the step in its erasure progress and
+    is not re-queued; erase_dsar resumes it from that step.
+    """
+    from apps.privacy.erasure import ErasureFailed, ErasureNotAllowed, execute_erasure
+    from apps.privacy.models import DSARRequest
+    
+    try:
+        dsar_request = DSARRequest.objects.select_related('user').get(id=dsar_id)
+    except DSARRequest.DoesNotExist:
+        logger.error(f"DSAR request {dsar_id} not found")
+        return False
+    if dsar_request.status == 'completed':
+        return True
+    
+    try:
+        finished = execute_erasure(dsar_request)
+    except ErasureNotAllowed as e:
+        logger.error(str(e))
+        return False
+    except ErasureFailed:
+        return False
+    if not finished:
+        execute_dsar_erasure.delay(dsar_id=str(dsar_id))
+    return finished
+
+
 def generate_user_data_export(user):
-    """Generate user data export for DSAR."""
-    from apps.users.models import User
-    from apps.organizations.models import Organization, OrganizationMembership
-    from apps.billing.models import Invoice, Subscription
-    from apps.events.models import Event
+    """
+    Stream the user's data into a zip of NDJSON sections and upload it.
+    
+    Returns (storage name, {section: rows}), or (None, {}) without a user.
+    """
+    from apps.privacy.export import export_user_data
     
     if not user:
-        return {}
-    
-    export_data = {
-        'user': {
-            'id': str(user.id),
-            'email': user.email,
-            'name': user.name,
-            'company': user.company,
-            'phone': user.phone,
-            'is_verified': user.is_verified,
-            'is_active': user.is_active,
-            'created_at': user.created_at.isoformat(),
-            'last_login': user.last_login.isoformat() if user.last_login else None,
-            'timezone': user.timezone,
-        },
-        'organizations': [],
-        'subscriptions': [],
-        'invoices': [],
-        'events': [],
-    }
+        return None, {}
     
-    # Organizations
-    organizations = Organization.objects.filter(members=user)
-    for org in organizations:
-        membership = OrganizationMembership.objects.get(organization=org, user=user)
-        export_data['organizations'].append({
-            'id': str(org.id),
-            'name': org.name,
-            'uen': org.uen,
-            'role': membership.role,
-            'joined_at': membership.joined_at.isoformat(),
-        })
-    
-    # Subscriptions
-    subscriptions = Subscription.objects.filter(organization__members=user)
-    for sub in subscriptions:
-        export_data['subscriptions'].append({
-            'id': str(sub.id),
-            'plan': sub.plan.name,
-            'status': sub.status,
-            'current_period_start': sub.current_period_start.isoformat(),
-            'current_period_end': sub.current_period_end.isoformat(),
-        })
-    
-    # Invoices
-    invoices = Invoice.objects.filter(organization__members=user)
-    for invoice in invoices:
-        export_data['invoices'].append({
-            'id': str(invoice.id),
-            'subtotal_cents': invoice.subtotal_cents,
-            'gst_amount_cents': invoice.gst_amount_cents,
-            'total_amount_cents': invoice.total_amount_cents,
-            'status': invoice.status,
-            'created_at': invoice.created_at.isoformat(),
-        })
-    
-    # Events
-    events = Event.objects.filter(user=user)
-    for event in events:
-        export_data['events'].append({
-            'event_type': event.event_type,
-            'created_at': event.created_at.isoformat(),
-            'data': event.data,
-        })
-    
-    return export_data
\ No newline at end of file
+    return export_user_data(user)
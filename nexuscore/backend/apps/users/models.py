@@ -76,6 +76,12 @@ class User(AbstractBaseUser, PermissionsMixin):
             models.Index(fields=['email']),
             models.Index(fields=['created_at']),
             models.Index(fields=['is_verified', 'is_active']),
+            # Keyset scan over inactive accounts for PDPA anonymization
+            models.Index(
+                fields=['id'],
+                condition=models.Q(is_active=False),
+                name='idx_inactive_users'
+            ),
         ]
         constraints = [
             models.CheckConstraint(
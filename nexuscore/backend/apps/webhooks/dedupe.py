@@ -0,0 +1,104 @@
+"""
+Redis pre-filter for duplicate incoming webhook events.
+
+Each (service, event_id) is marked seen, with a TTL covering the provider's retry
+window, only after its row has been committed. A marked event is acknowledged
+without touching Postgres. An unmarked event only means "maybe new": the unique
+event_id index remains the source of truth, catching concurrent deliveries and
+duplicates whose key has expired or was never written. Because the mark follows
+the insert, a request that dies before storing its event leaves no mark behind
+and the provider's retry is processed normally.
+
+Counters in a Redis hash track how often the filter saved a database round trip
+and how often the database still found a duplicate. If Redis is unavailable the
+filter fails open and every event goes to the database.
+"""
+
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SEEN_KEY = 'webhooks:seen:{service}:{event_id}'
+STATS_KEY = 'webhooks:dedupe:stats'
+
+# Check and count in one round trip: returns 1 if already seen, 0 otherwise
+CHECK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBY', KEYS[2], 'hits', 1)
+    return 1
+end
+redis.call('HINCRBY', KEYS[2], 'misses', 1)
+return 0
+"""
+
+_scripts = {}
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    
+    return get_redis_connection('default')
+
+
+def _key(service, event_id):
+    return SEEN_KEY.format(service=service, event_id=event_id)
+
+
+def is_known(service, event_id):
+    """True if the event is a known duplicate; False if it may be new (or Redis is down)."""
+    if not getattr(settings, 'WEBHOOK_DEDUPE_ENABLED', True):
+        return False
+    try:
+        if 'check' not in _scripts:
+            _scripts['check'] = _redis().register_script(CHECK_SCRIPT)
+        seen = _scripts['check'](keys=[_key(service, event_id), STATS_KEY])
+    except Exception:
+        logger.warning(f"Webhook dedupe filter unavailable; checking {event_id} in the database")
+        return False
+    return bool(seen)
+
+
+def mark_seen(service, event_id, created):
+    """
+    Remember an event whose row is committed, and count whether Postgres found it new.
+    
+    Only call this after store_event() has returned.
+    """
+    if not getattr(settings, 'WEBHOOK_DEDUPE_ENABLED', True):
+        return
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        pipe.set(_key(service, event_id), '1', ex=settings.WEBHOOK_DEDUPE_TTL_SECONDS)
+        pipe.hincrby(STATS_KEY, 'stored' if created else 'db_duplicates', 1)
+        pipe.execute()
+    except Exception:
+        logger.warning(f"Could not mark webhook event {event_id} as seen")
+
+
+def dedupe_stats(reset=False):
+    """Filter counters plus derived hit rate and database round trips saved."""
+    redis = _redis()
+    if reset:
+        raw = redis.pipeline().hgetall(STATS_KEY).delete(STATS_KEY).execute()[0]
+    else:
+        raw = redis.hgetall(STATS_KEY)
+    counters = {
+        (key.decode() if isinstance(key, bytes) else key): int(value)
+        for key, value in raw.items()
+    }
+    hits = counters.get('hits', 0)
+    misses = counters.get('misses', 0)
+    duplicates = hits + counters.get('db_duplicates', 0)
+    checks = hits + misses
+    return {
+        'checks': checks,
+        'filter_hits': hits,
+        'filter_misses': misses,
+        'stored': counters.get('stored', 0),
+        'db_duplicates': counters.get('db_duplicates', 0),
+        'hit_rate': round(hits / checks, 4) if checks else 0.0,
+        'duplicates_caught_by_filter': round(hits / duplicates, 4) if duplicates else 0.0,
+        'db_round_trips_saved': hits,
+    }
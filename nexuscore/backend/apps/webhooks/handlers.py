@@ -0,0 +1,27 @@
+"""
+Stripe event handlers, registered by event type.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+STRIPE_EVENT_HANDLERS = {}
+
+
+def handles(*event_types):
+    """Register a function as the handler for one or more Stripe event types."""
+    def decorator(func):
+        for event_type in event_types:
+            STRIPE_EVENT_HANDLERS[event_type] = func
+        return func
+    return decorator
+
+
+def dispatch(webhook_event):
+    """Run the handler for an event. Unhandled types are acknowledged as no-ops."""
+    handler = STRIPE_EVENT_HANDLERS.get(webhook_event.event_type)
+    if handler is None:
+        logger.debug(f"No handler for Stripe event type {webhook_event.event_type}")
+        return
+    handler(webhook_event)
@@ -0,0 +1,169 @@
+"""
+Benchmark outbound webhook delivery against a local stand-in receiver.
+
+Starts a threaded HTTP server on localhost that verifies signatures, sleeps for a
+configurable latency and fails a configurable share of requests. Events for N
+synthetic endpoints are then delivered with the production send path (signed
+batches over a pooled keep-alive session, bounded concurrency per endpoint) and
+compared with one unpooled request per event. No database or Redis is used.
+"""
+
+import json
+import queue
+import random
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from apps.webhooks.ingest import SignatureVerificationError, verify_stripe_signature
+from apps.webhooks.outbound import SIGNATURE_HEADER, build_body, send_batch
+
+SECRET = 'whsec_benchmark'
+
+
+class ReceiverHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+    latency_ms = 0.0
+    failure_rate = 0.0
+    received = 0
+    lock = threading.Lock()
+    
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        status = 200
+        try:
+            verify_stripe_signature(body, self.headers.get(SIGNATURE_HEADER, ''), SECRET)
+        except SignatureVerificationError:
+            status = 400
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if status == 200 and random.random() < self.failure_rate:
+            status = 503
+        if status == 200:
+            with self.lock:
+                type(self).received += len(json.loads(body)['data'])
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def _event(index):
+    return {
+        'event_id': uuid.uuid4(),
+        'event_type': 'invoice.paid',
+        'created_at': timezone.now(),
+        'payload': {'invoice': f"in_{index}", 'amount_cents': 12900, 'currency': 'SGD'},
+    }
+
+
+class Command(BaseCommand):
+    help = 'Measure outbound webhook throughput and p99 latency against a local receiver.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoints', type=int, default=10)
+        parser.add_argument('--events', type=int, default=500, help='Events per endpoint')
+        parser.add_argument('--concurrency', type=int, default=2, help='Workers per endpoint')
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--latency-ms', type=float, default=20.0, help='Receiver latency')
+        parser.add_argument('--failure-rate', type=float, default=0.0)
+        parser.add_argument('--skip-baseline', action='store_true')
+    
+    def _run(self, url, endpoints, events, concurrency, batch_size, session_factory):
+        queues = []
+        for endpoint in range(endpoints):
+            work = queue.Queue()
+            for index in range(events):
+                work.put(_event(index))
+            queues.append((f"{url}/endpoint/{endpoint}", work))
+        
+        latencies = []
+        failed = [0]
+        lock = threading.Lock()
+        
+        def worker(endpoint_url, work):
+            session = session_factory()
+            while True:
+                batch = []
+                try:
+                    batch.append(work.get_nowait())
+                    while len(batch) < batch_size:
+                        batch.append(work.get_nowait())
+                except queue.Empty:
+                    pass
+                if not batch:
+                    return
+                result = send_batch(endpoint_url, SECRET, build_body(batch), session=session)
+                with lock:
+                    latencies.append(result.latency_ms)
+                    if not result.ok:
+                        failed[0] += len(batch)
+        
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=endpoints * concurrency) as executor:
+            for endpoint_url, work in queues:
+                for _ in range(concurrency):
+                    executor.submit(worker, endpoint_url, work)
+        elapsed = time.perf_counter() - started
+        return elapsed, sorted(latencies), failed[0]
+    
+    def _report(self, label, total, elapsed, latencies, failed):
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0
+        self.stdout.write(
+            f"{label:<10} {total} events in {elapsed:.2f}s = {total / elapsed:9.1f} events/s, "
+            f"{len(latencies)} requests, p50 {statistics.median(latencies or [0]):.0f}ms, "
+            f"p99 {p99:.0f}ms, failed {failed}"
+        )
+    
+    def handle(self, *args, **options):
+        ReceiverHandler.latency_ms = options['latency_ms']
+        ReceiverHandler.failure_rate = options['failure_rate']
+        server = ThreadingHTTPServer(('127.0.0.1', 0), ReceiverHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+        total = options['endpoints'] * options['events']
+        
+        def pooled_session():
+            session = requests.Session()
+            session.mount('http://', HTTPAdapter(pool_maxsize=options['concurrency'], max_retries=0))
+            return session
+        
+        class UnpooledSession:
+            def post(self, *args, **kwargs):
+                kwargs.setdefault('headers', {})['Connection'] = 'close'
+                return requests.post(*args, **kwargs)
+        
+        try:
+            with override_settings(WEBHOOK_OUTBOUND_CONNECT_TIMEOUT_SECONDS=3, WEBHOOK_OUTBOUND_TIMEOUT_SECONDS=30):
+                if not options['skip_baseline']:
+                    ReceiverHandler.received = 0
+                    elapsed, latencies, failed = self._run(
+                        url, options['endpoints'], options['events'], 1, 1, UnpooledSession,
+                    )
+                    self._report('baseline', total, elapsed, latencies, failed)
+                    baseline_rate = total / elapsed
+                
+                ReceiverHandler.received = 0
+                elapsed, latencies, failed = self._run(
+                    url, options['endpoints'], options['events'],
+                    options['concurrency'], options['batch_size'], pooled_session,
+                )
+                self._report('engine', total, elapsed, latencies, failed)
+                if not options['skip_baseline']:
+                    self.stdout.write(f"Speed-up: x{(total / elapsed) / baseline_rate:.1f}")
+                self.stdout.write(f"Receiver accepted {ReceiverHandler.received} events")
+        finally:
+            server.shutdown()
@@ -0,0 +1,91 @@
+"""
+Benchmark retry throughput as the number of SKIP LOCKED workers grows.
+
+Seeds synthetic unprocessed events whose handler simulates I/O latency, then drains
+them with 1..N worker processes and reports events per second for each count. The
+synthetic events are deleted afterwards.
+"""
+
+import multiprocessing
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from apps.webhooks.handlers import handles
+from apps.webhooks.models import WebhookEvent
+from apps.webhooks.retry import drain_retries
+
+BENCHMARK_SERVICE = 'benchmark'
+BENCHMARK_EVENT_TYPE = 'benchmark.noop'
+
+
+def _worker(work_ms, results):
+    connections.close_all()  # Never share the parent's connection across fork
+    
+    @handles(BENCHMARK_EVENT_TYPE)
+    def simulated_handler(event):
+        time.sleep(work_ms / 1000)
+    
+    with override_settings(WEBHOOK_RETRY_GRACE_SECONDS=0):
+        results.put(drain_retries(time_budget=3600)['claimed'])
+
+
+class Command(BaseCommand):
+    help = 'Measure webhook retry throughput for increasing worker counts.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=2000)
+        parser.add_argument('--workers', default='1,2,4,8',
+                            help='Comma-separated worker counts to test')
+        parser.add_argument('--work-ms', type=float, default=5.0,
+                            help='Simulated handler latency per event')
+    
+    def _seed(self, count):
+        WebhookEvent.objects.filter(service=BENCHMARK_SERVICE).delete()
+        created = timezone.now() - timezone.timedelta(hours=1)
+        WebhookEvent.objects.bulk_create([
+            WebhookEvent(
+                service=BENCHMARK_SERVICE,
+                event_id=f"bench_{uuid.uuid4().hex}",
+                event_type=BENCHMARK_EVENT_TYPE,
+                payload={},
+            )
+            for _ in range(count)
+        ], batch_size=1000)
+        # created_at is auto_now_add; backdate so the grace period does not apply
+        WebhookEvent.objects.filter(service=BENCHMARK_SERVICE).update(created_at=created)
+    
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        baseline = None
+        try:
+            for workers in [int(value) for value in options['workers'].split(',')]:
+                self._seed(options['events'])
+                connection.close()
+                
+                results = context.Queue()
+                processes = [
+                    context.Process(target=_worker, args=(options['work_ms'], results))
+                    for _ in range(workers)
+                ]
+                started = time.perf_counter()
+                for process in processes:
+                    process.start()
+                claimed = [results.get() for _ in processes]
+                for process in processes:
+                    process.join()
+                elapsed = time.perf_counter() - started
+                
+                rate = sum(claimed) / elapsed
+                baseline = baseline or rate
+                self.stdout.write(
+                    f"{workers:>3} workers: {sum(claimed)} events in {elapsed:.2f}s "
+                    f"= {rate:8.1f} events/s  (x{rate / baseline:.2f}, "
+                    f"per-worker spread {min(claimed)}-{max(claimed)})"
+                )
+        finally:
+            WebhookEvent.objects.filter(service=BENCHMARK_SERVICE).delete()
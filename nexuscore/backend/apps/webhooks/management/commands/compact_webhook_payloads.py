@@ -0,0 +1,69 @@
+"""
+Offload old processed webhook payloads to cold segments and report the effect.
+
+Prints table, heap and TOAST sizes plus timings of a hot-path scan and a full
+payload scan before and after compaction. Dropped TOAST values are only returned
+to the table once vacuumed, so pass --vacuum to see the reduction immediately.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.webhooks.offload import backfill_subject_emails, compact_payloads, measure_table
+
+
+def _mb(value):
+    return f"{value / (1024 * 1024):.1f} MB"
+
+
+class Command(BaseCommand):
+    help = 'Compact processed webhook payloads into cold storage segments.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--age-days', type=int, default=None,
+                            help='Offload events older than this (default: WEBHOOK_PAYLOAD_OFFLOAD_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Payloads per segment (default: WEBHOOK_PAYLOAD_SEGMENT_SIZE)')
+        parser.add_argument('--max-batches', type=int, default=None)
+        parser.add_argument('--vacuum', action='store_true',
+                            help='Run VACUUM ANALYZE on webhook_events afterwards')
+        parser.add_argument('--measure-only', action='store_true')
+        parser.add_argument('--backfill-subject-emails', action='store_true',
+                            help='Fill subject_email on events stored before it was extracted, then exit')
+    
+    def _report(self, label, stats):
+        self.stdout.write(
+            f"{label}: total {_mb(stats['total_bytes'])}, heap {_mb(stats['heap_bytes'])}, "
+            f"toast {_mb(stats['toast_bytes'])}; "
+            + ', '.join(f"{name} {ms}ms" for name, ms in stats['scan_ms'].items())
+        )
+    
+    def handle(self, *args, **options):
+        if options['backfill_subject_emails']:
+            updated = backfill_subject_emails()
+            self.stdout.write(self.style.SUCCESS(f"Set subject_email on {updated} webhook events"))
+            return
+        
+        before = measure_table()
+        self._report('Before', before)
+        if options['measure_only']:
+            return
+        
+        started = time.perf_counter()
+        compacted = compact_payloads(
+            age_days=options['age_days'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(f"Offloaded {compacted} payloads in {time.perf_counter() - started:.2f}s")
+        
+        if options['vacuum']:
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM ANALYZE webhook_events")
+        
+        after = measure_table()
+        self._report('After', after)
+        saved = before['total_bytes'] - after['total_bytes']
+        self.stdout.write(self.style.SUCCESS(f"Table size reduced by {_mb(saved)}"))
@@ -0,0 +1,76 @@
+"""
+Replay a recorded burst of Stripe events against a running webhook endpoint.
+
+The input is an NDJSON file with one Stripe event per line (for example exported
+from the Stripe dashboard or ``stripe events list``). Each event is re-signed with
+STRIPE_WEBHOOK_SECRET and posted concurrently; acknowledgement latency and
+throughput are reported.
+"""
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.webhooks.ingest import sign_stripe_payload
+
+
+class Command(BaseCommand):
+    help = 'Load test the Stripe webhook endpoint by replaying recorded events.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('events_file', help='NDJSON file of recorded Stripe events')
+        parser.add_argument('--url', default='http://localhost:8000/api/v1/webhooks/stripe/')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--repeat', type=int, default=1,
+                            help='Send each event this many times (exercises dedupe)')
+    
+    def handle(self, *args, **options):
+        secret = settings.STRIPE_WEBHOOK_SECRET
+        if not secret:
+            raise CommandError('STRIPE_WEBHOOK_SECRET must be set to sign replayed events')
+        
+        with open(options['events_file'], 'rb') as fh:
+            events = [line.strip() for line in fh if line.strip()]
+        events = events * options['repeat']
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=options['concurrency'],
+            pool_maxsize=options['concurrency'],
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        
+        def send(payload):
+            headers = {
+                'Content-Type': 'application/json',
+                'Stripe-Signature': sign_stripe_payload(payload, secret),
+            }
+            started = time.perf_counter()
+            response = session.post(options['url'], data=payload, headers=headers, timeout=30)
+            return response.status_code, time.perf_counter() - started
+        
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(send, events))
+        elapsed = time.perf_counter() - started
+        
+        latencies = sorted(latency for _, latency in results)
+        statuses = {}
+        for status, _ in results:
+            statuses[status] = statuses.get(status, 0) + 1
+        
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+        
+        self.stdout.write(f"status codes: {statuses}")
+        self.stdout.write(
+            f"latency ms: p50 {pct(0.5):.1f}  p95 {pct(0.95):.1f}  p99 {pct(0.99):.1f}  "
+            f"max {latencies[-1] * 1000:.1f}  mean {statistics.fmean(latencies) * 1000:.1f}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(results)} events in {elapsed:.2f}s ({len(results) / elapsed:.0f} events/s)"
+        ))
@@ -0,0 +1,19 @@
+"""
+Report how effective the Redis duplicate pre-filter is for incoming webhooks.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.webhooks.dedupe import dedupe_stats
+
+
+class Command(BaseCommand):
+    help = 'Show webhook dedupe filter hit rate and database round trips saved.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset counters after reading')
+    
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(dedupe_stats(reset=options['reset']), indent=2))
@@ -2,10 +2,15 @@
 Webhook models for external service integrations (from PRD-d-3).
 """
 
+import secrets
 import uuid
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 
+from apps.organizations.models import Organization
+from apps.webhooks.validators import validate_endpoint_url
+
 
 class WebhookEvent(models.Model):
     """Webhook events from external services."""
@@ -15,14 +20,23 @@ class WebhookEvent(models.Model):
     event_id = models.CharField(max_length=255, unique=True, db_index=True)
     event_type = models.CharField(max_length=100)
     
-    # Raw payload and processed status
-    payload = models.JSONField()
+    # Raw payload and processed status. Once compacted the JSON lives in a
+    # compressed cold segment and only the pointer and digest stay in the row;
+    # the ``payload`` property rehydrates it transparently.
+    stored_payload = models.JSONField(null=True, blank=True, db_column='payload')
+    payload_ref = models.CharField(max_length=255, blank=True, default='')
+    payload_digest = models.CharField(max_length=64, blank=True, default='')
+    payload_offloaded_at = models.DateTimeField(null=True, blank=True)
+    # Customer email from the payload, extracted at ingest so DSARs can find the
+    # event even after its payload has been offloaded
+    subject_email = models.CharField(max_length=254, blank=True, default='')
     processed = models.BooleanField(default=False)
     processing_error = models.TextField(blank=True)
     
     # Retry tracking
     retry_count = models.PositiveIntegerField(default=0)
     last_retry_at = models.DateTimeField(null=True, blank=True)
+    dead_lettered_at = models.DateTimeField(null=True, blank=True)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -34,8 +48,135 @@ class WebhookEvent(models.Model):
             models.Index(fields=['service', 'event_type']),
             models.Index(fields=['processed', 'created_at']),
             models.Index(fields=['created_at']),
+            # Prefix lookups for rows still pointing into a cold segment
+            models.Index(
+                fields=['payload_ref'],
+                opclasses=['varchar_pattern_ops'],
+                condition=~models.Q(payload_ref=''),
+                name='idx_webhook_payload_ref'
+            ),
+            models.Index(
+                fields=['subject_email'],
+                condition=~models.Q(subject_email=''),
+                name='idx_webhook_subject_email'
+            ),
         ]
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"Webhook: {self.service} - {self.event_type}"
\ No newline at end of file
+        return f"Webhook: {self.service} - {self.event_type}"
+    
+    @property
+    def payload(self):
+        """Event payload, read back from cold storage if it has been offloaded."""
+        if self.stored_payload is None and self.payload_ref:
+            # Cached off-field so a later save() does not write it back to the row
+            if getattr(self, '_rehydrated_payload', None) is None:
+                from apps.webhooks.offload import load_payload
+                
+                self._rehydrated_payload = load_payload(self.payload_ref, self.payload_digest)
+            return self._rehydrated_payload
+        return self.stored_payload
+    
+    @payload.setter
+    def payload(self, value):
+        self.stored_payload = value
+        self._rehydrated_payload = None
+        self.payload_ref = ''
+        self.payload_digest = ''
+        self.payload_offloaded_at = None
+    
+    @property
+    def is_dead_lettered(self):
+        """Whether retries were abandoned after the maximum number of attempts."""
+        return self.dead_lettered_at is not None
+
+
+def generate_endpoint_secret():
+    return f"whsec_{secrets.token_urlsafe(32)}"
+
+
+class WebhookEndpoint(models.Model):
+    """A customer URL subscribed to NexusCore event types."""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='webhook_endpoints'
+    )
+    url = models.URLField(max_length=500, validators=[validate_endpoint_url])
+    secret = models.CharField(max_length=100, default=generate_endpoint_secret)
+    # Empty means every event type
+    event_types = models.JSONField(default=list, blank=True)
+    is_active = models.BooleanField(default=True)
+    
+    # Delivery tuning
+    max_concurrency = models.PositiveSmallIntegerField(default=2)
+    max_batch_size = models.PositiveSmallIntegerField(default=20)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'webhook_endpoints'
+        indexes = [
+            models.Index(fields=['organization', 'is_active']),
+        ]
+    
+    def __str__(self):
+        return f"Endpoint: {self.url} ({self.organization_id})"
+    
+    def save(self, *args, **kwargs):
+        # Enforced on every save, not only in forms: the URL is fetched from inside our network
+        validate_endpoint_url(self.url)
+        super().save(*args, **kwargs)
+    
+    def subscribes_to(self, event_type):
+        return not self.event_types or event_type in self.event_types
+
+
+class WebhookDelivery(models.Model):
+    """One event queued for delivery to one endpoint."""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('delivering', 'Delivering'),
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    endpoint = models.ForeignKey(
+        WebhookEndpoint,
+        on_delete=models.CASCADE,
+        related_name='deliveries'
+    )
+    event_id = models.UUIDField(default=uuid.uuid4)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # Due time while pending; lease expiry while delivering
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    last_latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'webhook_deliveries'
+        indexes = [
+            models.Index(
+                fields=['endpoint', 'next_attempt_at'],
+                condition=models.Q(status__in=['pending', 'delivering']),
+                name='idx_due_webhook_deliveries'
+            ),
+            models.Index(fields=['endpoint', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Delivery: {self.event_type} -> {self.endpoint_id} ({self.status})"
@@ -0,0 +1,293 @@
+"""
+Cold offload of processed webhook payloads.
+
+Processed events older than WEBHOOK_PAYLOAD_OFFLOAD_AFTER_DAYS have their JSON
+moved into compressed segment files in the configured storage backend. Each
+payload is compressed on its own and appended to the segment, so a single event
+can be read back with its offset and length. The row keeps only a pointer
+(``<segment>@<offset>+<length>``) and a SHA-256 digest; the column is set to NULL,
+which releases its TOAST storage on the next vacuum.
+
+When retention deletes offloaded rows, segments that no remaining row points
+into are deleted as well, so raw payloads do not outlive their rows. Erasing
+specific events (a DSAR deletion) rewrites each affected segment without their
+payloads and deletes the original.
+"""
+
+import hashlib
+import json
+import logging
+import time
+import uuid
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = 'webhook-segments'
+
+
+class PayloadIntegrityError(Exception):
+    """A rehydrated payload does not match the digest stored on the row."""
+
+
+def encode_payload(payload):
+    """Canonical JSON bytes used for both the digest and the segment record."""
+    return json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def make_ref(segment_name, offset, length):
+    return f"{segment_name}@{offset}+{length}"
+
+
+def parse_ref(ref):
+    segment_name, _, span = ref.rpartition('@')
+    offset, _, length = span.partition('+')
+    return segment_name, int(offset), int(length)
+
+
+@lru_cache(maxsize=8)
+def _read_segment(segment_name):
+    """Segments are immutable, so recently used ones are kept in memory."""
+    with default_storage.open(segment_name, 'rb') as fh:
+        return fh.read()
+
+
+def load_payload(ref, digest):
+    """Read one payload back from its segment and verify it against ``digest``."""
+    segment_name, offset, length = parse_ref(ref)
+    raw = zlib.decompress(_read_segment(segment_name)[offset:offset + length])
+    if digest and hashlib.sha256(raw).hexdigest() != digest:
+        raise PayloadIntegrityError(f"Digest mismatch for {ref}")
+    return json.loads(raw)
+
+
+def build_segment(rows, level=6):
+    """Compress (id, payload) rows into one segment. Returns (bytes, [(id, offset, length, digest)])."""
+    chunks = []
+    index = []
+    offset = 0
+    for event_id, payload in rows:
+        raw = encode_payload(payload)
+        compressed = zlib.compress(raw, level)
+        chunks.append(compressed)
+        index.append((event_id, offset, len(compressed), hashlib.sha256(raw).hexdigest()))
+        offset += len(compressed)
+    return b''.join(chunks), index
+
+
+def _write_segment(rows):
+    """Store (id, payload) rows as a new segment and point their events at it."""
+    from apps.webhooks.models import WebhookEvent
+    
+    data, index = build_segment(rows)
+    now = timezone.now()
+    segment_name = default_storage.save(
+        f"{SEGMENT_PREFIX}/{now:%Y/%m/%d}/{uuid.uuid4().hex}.seg",
+        ContentFile(data),
+    )
+    WebhookEvent.objects.bulk_update(
+        [
+            WebhookEvent(
+                id=event_id,
+                payload_ref=make_ref(segment_name, offset, length),
+                payload_digest=digest,
+                payload_offloaded_at=now,
+            )
+            for event_id, offset, length, digest in index
+        ],
+        ['payload_ref', 'payload_digest', 'payload_offloaded_at'],
+    )
+    return segment_name, len(data), [event_id for event_id, _, _, _ in index]
+
+
+def compact_batch(cutoff, batch_size):
+    """Offload one batch of eligible payloads. Returns the number of rows compacted."""
+    from apps.webhooks.models import WebhookEvent
+    
+    with transaction.atomic():
+        rows = list(
+            WebhookEvent.objects
+            .filter(
+                processed=True,
+                created_at__lt=cutoff,
+                processed_at__lt=cutoff,
+                stored_payload__isnull=False,
+                payload_ref='',
+            )
+            .order_by('created_at')
+            .select_for_update(skip_locked=True)
+            .values_list('id', 'stored_payload')[:batch_size]
+        )
+        if not rows:
+            return 0
+        
+        segment_name, size, ids = _write_segment(rows)
+        # Plain SQL NULL (not JSON null) so the TOAST value is released
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE webhook_events SET payload = NULL WHERE id = ANY(%s)", [ids])
+    
+    logger.info(f"Offloaded {len(ids)} webhook payloads to {segment_name} ({size} bytes)")
+    return len(ids)
+
+
+def segments_for(event_ids):
+    """Segment names referenced by the given webhook events."""
+    from apps.webhooks.models import WebhookEvent
+    
+    refs = (
+        WebhookEvent.objects.filter(id__in=event_ids)
+        .exclude(payload_ref='')
+        .values_list('payload_ref', flat=True)
+    )
+    return {parse_ref(ref)[0] for ref in refs}
+
+
+def delete_unreferenced_segments(segment_names):
+    """Delete the segments no webhook event points into any more; returns how many."""
+    from apps.webhooks.models import WebhookEvent
+    
+    deleted = 0
+    for segment_name in segment_names:
+        if WebhookEvent.objects.filter(payload_ref__startswith=f"{segment_name}@").exists():
+            continue  # Still holds payloads of rows that are not expired yet
+        default_storage.delete(segment_name)
+        deleted += 1
+    if deleted:
+        _read_segment.cache_clear()
+        logger.info(f"Deleted {deleted} webhook payload segments with no remaining events")
+    return deleted
+
+
+def erase_events(event_ids):
+    """
+    Delete webhook events and every copy of their payloads; returns rows deleted.
+    
+    Segments holding any of the payloads are rewritten with the remaining events
+    only, and the originals are deleted once the transaction commits.
+    """
+    from apps.webhooks.models import WebhookEvent
+    
+    event_ids = list(event_ids)
+    segment_names = segments_for(event_ids)
+    with transaction.atomic():
+        for segment_name in segment_names:
+            remaining = list(
+                WebhookEvent.objects
+                .filter(payload_ref__startswith=f"{segment_name}@")
+                .exclude(id__in=event_ids)
+                .select_for_update()
+                .values_list('id', 'payload_ref', 'payload_digest')
+            )
+            if remaining:
+                _write_segment([
+                    (event_id, load_payload(ref, digest)) for event_id, ref, digest in remaining
+                ])
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM webhook_events WHERE id = ANY(%s)", [event_ids])
+            deleted = cursor.rowcount
+        
+        def drop_segments():
+            for segment_name in segment_names:
+                default_storage.delete(segment_name)
+            _read_segment.cache_clear()
+        
+        if segment_names:
+            transaction.on_commit(drop_segments)
+    return deleted
+
+
+def rehydrate_row(row):
+    """Replace the segment pointer of an exported row with the payload it points to."""
+    ref = row.pop('payload_ref', '')
+    digest = row.pop('payload_digest', '')
+    if row.get('stored_payload') is None and ref:
+        row['stored_payload'] = load_payload(ref, digest)
+    return row
+
+
+def backfill_subject_emails(batch_size=1000):
+    """Fill subject_email for events stored before it existed, offloaded ones included."""
+    from apps.webhooks.ingest import subject_email_from
+    from apps.webhooks.models import WebhookEvent
+    
+    updated = 0
+    last = None
+    while True:
+        page = WebhookEvent.objects.filter(subject_email='')
+        if last is not None:
+            page = page.filter(id__gt=last)
+        rows = list(
+            page.order_by('id')
+            .values_list('id', 'stored_payload', 'payload_ref', 'payload_digest')[:batch_size]
+        )
+        if not rows:
+            return updated
+        changed = []
+        for event_id, payload, ref, digest in rows:
+            if payload is None and ref:
+                payload = load_payload(ref, digest)
+            email = subject_email_from(payload) if isinstance(payload, dict) else ''
+            if email:
+                changed.append(WebhookEvent(id=event_id, subject_email=email))
+        WebhookEvent.objects.bulk_update(changed, ['subject_email'])
+        updated += len(changed)
+        last = rows[-1][0]
+
+
+def compact_payloads(age_days=None, batch_size=None, max_batches=None):
+    """Offload payloads of processed events older than ``age_days``."""
+    age_days = age_days if age_days is not None else settings.WEBHOOK_PAYLOAD_OFFLOAD_AFTER_DAYS
+    batch_size = batch_size or settings.WEBHOOK_PAYLOAD_SEGMENT_SIZE
+    cutoff = timezone.now() - timezone.timedelta(days=age_days)
+    
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        compacted = compact_batch(cutoff, batch_size)
+        if not compacted:
+            break
+        total += compacted
+        batches += 1
+    return total
+
+
+def measure_table():
+    """Table/TOAST sizes and timings of representative scans over webhook_events."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_total_relation_size('webhook_events'), "
+            "pg_relation_size('webhook_events'), "
+            "COALESCE(pg_total_relation_size(reltoastrelid), 0) "
+            "FROM pg_class WHERE relname = 'webhook_events'"
+        )
+        total_bytes, heap_bytes, toast_bytes = cursor.fetchone()
+        
+        timings = {}
+        scans = {
+            'unprocessed_scan': (
+                "SELECT id FROM webhook_events WHERE processed = FALSE "
+                "ORDER BY created_at LIMIT 1000"
+            ),
+            'full_payload_scan': (
+                "SELECT count(*), sum(octet_length(payload::text)) FROM webhook_events"
+            ),
+        }
+        for name, sql in scans.items():
+            started = time.perf_counter()
+            cursor.execute(sql)
+            cursor.fetchall()
+            timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    
+    return {
+        'total_bytes': total_bytes,
+        'heap_bytes': heap_bytes,
+        'toast_bytes': toast_bytes,
+        'scan_ms': timings,
+    }
@@ -0,0 +1,363 @@
+"""
+Outbound webhook delivery to customer endpoints.
+
+Each WebhookEndpoint has its own queue of WebhookDelivery rows. Workers take one of
+the endpoint's max_concurrency Redis slots, lease up to max_batch_size due
+deliveries with SKIP LOCKED, and POST them as one signed batch over a pooled
+keep-alive session. No row locks are held during the HTTP call; a worker that dies
+mid-request leaves a lease that expires and is picked up again.
+
+Failed batches back off exponentially and fail permanently after
+WEBHOOK_OUTBOUND_MAX_ATTEMPTS. A per-endpoint circuit breaker opens after
+consecutive failures or slow responses and keeps workers away until it cools down.
+
+Every send re-checks the endpoint URL (apps.webhooks.validators) and redirects are
+not followed, so an endpoint cannot be pointed at an internal address after it
+was registered.
+
+The billing signals and the renewal run call publish_event()/publish_events() for
+subscription.* and invoice.* changes.
+"""
+
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict, namedtuple
+
+import requests
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from requests.adapters import HTTPAdapter
+
+from apps.webhooks.ingest import sign_stripe_payload
+from apps.webhooks.validators import endpoint_url_error
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'NexusCore-Signature'
+
+SLOT_KEY = 'webhooks:outbound:slot:{endpoint_id}:{slot}'
+FAILURES_KEY = 'webhooks:outbound:failures:{endpoint_id}'
+CIRCUIT_KEY = 'webhooks:outbound:circuit:{endpoint_id}'
+
+# Delete the slot only if this worker still holds it
+RELEASE_SLOT_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+CLAIM_SQL = """
+UPDATE webhook_deliveries
+SET status = 'delivering', next_attempt_at = NOW() + make_interval(secs => %(lease)s)
+WHERE id IN (
+    SELECT id FROM webhook_deliveries
+    WHERE endpoint_id = %(endpoint_id)s
+      AND status IN ('pending', 'delivering')
+      AND next_attempt_at <= NOW()
+    ORDER BY next_attempt_at
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING id, event_id, event_type, payload, created_at
+"""
+
+FAILURE_SQL = """
+UPDATE webhook_deliveries
+SET attempts = attempts + 1,
+    status = CASE WHEN attempts + 1 >= %(max_attempts)s THEN 'failed' ELSE 'pending' END,
+    next_attempt_at = NOW() + make_interval(
+        secs => LEAST(%(base)s * power(2, attempts), %(cap)s)
+    ),
+    last_status_code = %(status_code)s,
+    last_latency_ms = %(latency_ms)s,
+    last_error = %(error)s
+WHERE id = ANY(%(ids)s)
+"""
+
+SUCCESS_SQL = """
+UPDATE webhook_deliveries
+SET attempts = attempts + 1, status = 'delivered', delivered_at = NOW(),
+    last_status_code = %(status_code)s, last_latency_ms = %(latency_ms)s, last_error = ''
+WHERE id = ANY(%(ids)s)
+"""
+
+DeliveryResult = namedtuple('DeliveryResult', ['ok', 'status_code', 'latency_ms', 'error'])
+
+_session = None
+_scripts = {}
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    
+    return get_redis_connection('default')
+
+
+def get_session():
+    """Process-wide keep-alive session; connections are pooled per endpoint host."""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=settings.WEBHOOK_OUTBOUND_POOL_HOSTS,
+            pool_maxsize=settings.WEBHOOK_OUTBOUND_POOL_SIZE,
+            max_retries=0,
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['User-Agent'] = 'NexusCore-Webhooks/1.0'
+        _session = session
+    return _session
+
+
+def build_body(deliveries):
+    """JSON envelope for a batch: {"data": [event, ...]} in queue order."""
+    return json.dumps({
+        'data': [
+            {
+                'id': str(delivery['event_id']),
+                'type': delivery['event_type'],
+                'created_at': delivery['created_at'],
+                'data': delivery['payload'],
+            }
+            for delivery in deliveries
+        ],
+    }, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+
+
+def send_batch(url, secret, body, session=None, timeout=None):
+    """POST a signed body. Any 2xx is success; anything else, redirects included, is a failed attempt."""
+    blocked = endpoint_url_error(url)
+    if blocked:
+        return DeliveryResult(False, None, 0, f"Blocked: {blocked}")
+    session = session or get_session()
+    timeout = timeout or (
+        settings.WEBHOOK_OUTBOUND_CONNECT_TIMEOUT_SECONDS,
+        settings.WEBHOOK_OUTBOUND_TIMEOUT_SECONDS,
+    )
+    headers = {
+        'Content-Type': 'application/json',
+        SIGNATURE_HEADER: sign_stripe_payload(body, secret),
+    }
+    started = time.perf_counter()
+    try:
+        response = session.post(url, data=body, headers=headers, timeout=timeout, allow_redirects=False)
+        # Drain the body so the connection goes back to the pool
+        response.content
+    except requests.RequestException as exc:
+        latency_ms = int((time.perf_counter() - started) * 1000)
+        return DeliveryResult(False, None, latency_ms, f"{type(exc).__name__}: {exc}"[:2000])
+    latency_ms = int((time.perf_counter() - started) * 1000)
+    if 200 <= response.status_code < 300:
+        return DeliveryResult(True, response.status_code, latency_ms, '')
+    return DeliveryResult(False, response.status_code, latency_ms, response.text[:2000])
+
+
+# Circuit breaker
+
+def circuit_is_open(endpoint_id):
+    return bool(_redis().exists(CIRCUIT_KEY.format(endpoint_id=endpoint_id)))
+
+
+def record_circuit_result(endpoint_id, result):
+    """Count consecutive failures (slow responses included) and open the circuit at the threshold."""
+    redis = _redis()
+    failures_key = FAILURES_KEY.format(endpoint_id=endpoint_id)
+    slow = result.latency_ms >= settings.WEBHOOK_OUTBOUND_SLOW_MS
+    if result.ok and not slow:
+        redis.delete(failures_key)
+        return False
+    
+    failures = redis.incr(failures_key)
+    redis.expire(failures_key, settings.WEBHOOK_OUTBOUND_CIRCUIT_OPEN_SECONDS * 10)
+    if failures >= settings.WEBHOOK_OUTBOUND_CIRCUIT_THRESHOLD:
+        redis.set(
+            CIRCUIT_KEY.format(endpoint_id=endpoint_id), failures,
+            ex=settings.WEBHOOK_OUTBOUND_CIRCUIT_OPEN_SECONDS,
+        )
+        # One trial batch after the cool-down decides whether it stays closed
+        redis.set(failures_key, settings.WEBHOOK_OUTBOUND_CIRCUIT_THRESHOLD - 1)
+        logger.warning(f"Opened circuit for webhook endpoint {endpoint_id} after {failures} failures")
+        return True
+    return False
+
+
+# Concurrency slots
+
+def acquire_slot(endpoint):
+    """Take one of the endpoint's concurrency slots; returns (key, token) or None."""
+    redis = _redis()
+    token = uuid.uuid4().hex
+    ttl = settings.WEBHOOK_OUTBOUND_TIME_BUDGET_SECONDS + settings.WEBHOOK_OUTBOUND_TIMEOUT_SECONDS + 5
+    for slot in range(max(endpoint.max_concurrency, 1)):
+        key = SLOT_KEY.format(endpoint_id=endpoint.pk, slot=slot)
+        if redis.set(key, token, nx=True, ex=ttl):
+            return key, token
+    return None
+
+
+def release_slot(key, token):
+    if 'release' not in _scripts:
+        _scripts['release'] = _redis().register_script(RELEASE_SLOT_SCRIPT)
+    _scripts['release'](keys=[key], args=[token])
+
+
+# Queue
+
+def claim_batch(endpoint, lease_seconds=None):
+    lease_seconds = lease_seconds or (
+        settings.WEBHOOK_OUTBOUND_TIMEOUT_SECONDS + settings.WEBHOOK_OUTBOUND_CONNECT_TIMEOUT_SECONDS + 30
+    )
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(CLAIM_SQL, {
+                'endpoint_id': endpoint.pk,
+                'lease': lease_seconds,
+                'limit': max(endpoint.max_batch_size, 1),
+            })
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return sorted(rows, key=lambda row: row['created_at'])
+
+
+def record_outcome(ids, result):
+    with connection.cursor() as cursor:
+        if result.ok:
+            cursor.execute(SUCCESS_SQL, {
+                'ids': ids,
+                'status_code': result.status_code,
+                'latency_ms': result.latency_ms,
+            })
+        else:
+            cursor.execute(FAILURE_SQL, {
+                'ids': ids,
+                'max_attempts': settings.WEBHOOK_OUTBOUND_MAX_ATTEMPTS,
+                'base': settings.WEBHOOK_OUTBOUND_BACKOFF_BASE_SECONDS,
+                'cap': settings.WEBHOOK_OUTBOUND_MAX_BACKOFF_SECONDS,
+                'status_code': result.status_code,
+                'latency_ms': result.latency_ms,
+                'error': result.error,
+            })
+
+
+def drain_endpoint(endpoint, time_budget=None):
+    """Deliver due batches for one endpoint until it is empty, its circuit opens or time runs out."""
+    time_budget = time_budget or settings.WEBHOOK_OUTBOUND_TIME_BUDGET_SECONDS
+    deadline = time.monotonic() + time_budget
+    stats = {'batches': 0, 'delivered': 0, 'failed': 0}
+    while time.monotonic() < deadline:
+        if circuit_is_open(endpoint.pk):
+            break
+        deliveries = claim_batch(endpoint)
+        if not deliveries:
+            break
+        result = send_batch(endpoint.url, endpoint.secret, build_body(deliveries))
+        record_outcome([delivery['id'] for delivery in deliveries], result)
+        record_circuit_result(endpoint.pk, result)
+        stats['batches'] += 1
+        stats['delivered' if result.ok else 'failed'] += len(deliveries)
+    return stats
+
+
+def deliver_for_endpoint(endpoint_id):
+    """Drain an endpoint while holding one of its concurrency slots."""
+    from apps.webhooks.models import WebhookEndpoint
+    
+    endpoint = WebhookEndpoint.objects.filter(pk=endpoint_id, is_active=True).first()
+    if endpoint is None:
+        return None
+    slot = acquire_slot(endpoint)
+    if slot is None:
+        return None  # Already at max_concurrency; the running workers will get to it
+    try:
+        return drain_endpoint(endpoint)
+    finally:
+        release_slot(*slot)
+
+
+def due_endpoints():
+    """(endpoint_id, due deliveries) for endpoints with work and a closed circuit."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT endpoint_id, count(*) FROM webhook_deliveries "
+            "WHERE status IN ('pending', 'delivering') AND next_attempt_at <= NOW() "
+            "GROUP BY endpoint_id"
+        )
+        rows = cursor.fetchall()
+    return [(endpoint_id, due) for endpoint_id, due in rows if not circuit_is_open(endpoint_id)]
+
+
+# Publishing
+
+def _subscribed_endpoints(event_type, organization_ids):
+    """{organization_id: [active endpoints subscribed to event_type]} in one query."""
+    from apps.webhooks.models import WebhookEndpoint
+    
+    endpoints = defaultdict(list)
+    for endpoint in WebhookEndpoint.objects.filter(organization_id__in=organization_ids, is_active=True):
+        if endpoint.subscribes_to(event_type):
+            endpoints[endpoint.organization_id].append(endpoint)
+    return endpoints
+
+
+def _queue(deliveries):
+    """Insert deliveries and kick their endpoints' workers once the transaction commits."""
+    from apps.webhooks.models import WebhookDelivery
+    
+    if not deliveries:
+        return 0
+    WebhookDelivery.objects.bulk_create(deliveries)
+    endpoint_ids = {str(delivery.endpoint_id) for delivery in deliveries}
+    
+    def kick():
+        from apps.webhooks.tasks import deliver_endpoint_webhooks
+        
+        for endpoint_id in endpoint_ids:
+            deliver_endpoint_webhooks.delay(endpoint_id)
+    
+    transaction.on_commit(kick)
+    return len(deliveries)
+
+
+def enqueue_deliveries(event_type, organization, payload, event_id=None):
+    """
+    Queue ``payload`` for every active endpoint of the organization subscribed to
+    ``event_type``. Workers are kicked once the surrounding transaction commits.
+    """
+    from apps.webhooks.models import WebhookDelivery
+    
+    organization_id = uuid.UUID(str(getattr(organization, 'pk', organization)))
+    event_id = event_id or uuid.uuid4()
+    return _queue([
+        WebhookDelivery(endpoint=endpoint, event_id=event_id, event_type=event_type, payload=payload)
+        for endpoint in _subscribed_endpoints(event_type, [organization_id])[organization_id]
+    ])
+
+
+def publish_event(event_type, organization, data=None, user=None):
+    """Record an Event and deliver it to the organization's subscribed endpoints."""
+    from apps.events.writer import emit_event
+    
+    event_id = emit_event(event_type, user=user, organization=organization, data=data)
+    return enqueue_deliveries(event_type, organization, data or {}, event_id=event_id)
+
+
+def publish_events(event_type, items):
+    """publish_event() for many (organization_id, data) pairs, looking endpoints up once."""
+    from apps.events.writer import emit_event
+    from apps.webhooks.models import WebhookDelivery
+    
+    items = list(items)
+    endpoints = _subscribed_endpoints(event_type, {organization_id for organization_id, _ in items})
+    deliveries = []
+    for organization_id, data in items:
+        event_id = emit_event(event_type, organization=organization_id, data=data)
+        deliveries.extend(
+            WebhookDelivery(endpoint=endpoint, event_id=event_id, event_type=event_type, payload=data)
+            for endpoint in endpoints.get(organization_id, ())
+        )
+    return _queue(deliveries)
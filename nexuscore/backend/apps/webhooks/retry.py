@@ -0,0 +1,116 @@
+"""
+Concurrent retry scheduler for unprocessed webhook events.
+
+Workers claim batches with SELECT ... FOR UPDATE SKIP LOCKED, so any number of them
+can drain the table without processing an event twice. An event becomes eligible
+again after an exponential backoff derived from retry_count and last_retry_at, and
+is dead-lettered once it has failed WEBHOOK_RETRY_MAX_ATTEMPTS times.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CLAIM_SQL = """
+SELECT id FROM webhook_events
+WHERE processed = FALSE
+  AND dead_lettered_at IS NULL
+  AND created_at < NOW() - make_interval(secs => %(grace)s)
+  AND (
+    last_retry_at IS NULL
+    OR last_retry_at + make_interval(
+      secs => LEAST(%(base)s * power(2, retry_count), %(cap)s)
+    ) <= NOW()
+  )
+ORDER BY created_at
+LIMIT %(limit)s
+FOR UPDATE SKIP LOCKED
+"""
+
+
+def backoff_seconds(retry_count):
+    """Delay before the next attempt after ``retry_count`` failures."""
+    base = settings.WEBHOOK_RETRY_BASE_SECONDS
+    return min(base * (2 ** retry_count), settings.WEBHOOK_RETRY_MAX_BACKOFF_SECONDS)
+
+
+def _claim_batch(batch_size):
+    with connection.cursor() as cursor:
+        cursor.execute(CLAIM_SQL, {
+            'grace': settings.WEBHOOK_RETRY_GRACE_SECONDS,
+            'base': settings.WEBHOOK_RETRY_BASE_SECONDS,
+            'cap': settings.WEBHOOK_RETRY_MAX_BACKOFF_SECONDS,
+            'limit': batch_size,
+        })
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _attempt(event, max_attempts):
+    """Run one event's handler inside a savepoint and record the outcome."""
+    from apps.webhooks.handlers import dispatch
+    
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            dispatch(event)
+    except Exception as exc:
+        event.retry_count += 1
+        event.last_retry_at = now
+        event.processing_error = str(exc)[:2000]
+        fields = ['retry_count', 'last_retry_at', 'processing_error']
+        if event.retry_count >= max_attempts:
+            event.dead_lettered_at = now
+            fields.append('dead_lettered_at')
+            logger.error(
+                f"Dead-lettered webhook {event.event_id} ({event.event_type}) "
+                f"after {event.retry_count} attempts: {exc}"
+            )
+        event.save(update_fields=fields)
+        return False
+    
+    event.processed = True
+    event.processed_at = now
+    event.processing_error = ''
+    event.save(update_fields=['processed', 'processed_at', 'processing_error'])
+    return True
+
+
+def process_retry_batch(batch_size=None):
+    """
+    Claim and process one batch. Returns (claimed, succeeded).
+    
+    Row locks are held for the duration of the batch, which is what keeps other
+    workers off these events; keep batches small enough to finish quickly.
+    """
+    from apps.webhooks.models import WebhookEvent
+    
+    batch_size = batch_size or settings.WEBHOOK_RETRY_BATCH_SIZE
+    max_attempts = settings.WEBHOOK_RETRY_MAX_ATTEMPTS
+    with transaction.atomic():
+        ids = _claim_batch(batch_size)
+        if not ids:
+            return 0, 0
+        events = WebhookEvent.objects.filter(pk__in=ids).order_by('created_at')
+        succeeded = sum(1 for event in events if _attempt(event, max_attempts))
+    return len(ids), succeeded
+
+
+def drain_retries(time_budget=None, batch_size=None):
+    """Process batches until none are eligible or the time budget is spent."""
+    time_budget = time_budget or settings.WEBHOOK_RETRY_TIME_BUDGET_SECONDS
+    deadline = time.monotonic() + time_budget
+    claimed = succeeded = 0
+    while time.monotonic() < deadline:
+        batch_claimed, batch_succeeded = process_retry_batch(batch_size)
+        if not batch_claimed:
+            break
+        claimed += batch_claimed
+        succeeded += batch_succeeded
+    if claimed:
+        logger.info(f"Webhook retries: {succeeded}/{claimed} succeeded")
+    return {'claimed': claimed, 'succeeded': succeeded}
@@ -0,0 +1,103 @@
+"""
+Webhook processing tasks for NexusCore.
+"""
+
+from celery import shared_task
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def process_webhook_event(webhook_event_id):
+    """
+    Process one stored event exactly once.
+    
+    The row is locked with SKIP LOCKED so a concurrent worker holding it is not
+    waited on, and the handler plus the processed flag commit together.
+    Returns True when processed, False when skipped or failed.
+    """
+    from apps.webhooks.handlers import dispatch
+    from apps.webhooks.models import WebhookEvent
+    
+    try:
+        with transaction.atomic():
+            event = (
+                WebhookEvent.objects
+                .select_for_update(skip_locked=True)
+                .filter(pk=webhook_event_id, processed=False)
+                .first()
+            )
+            if event is None:
+                return False
+            dispatch(event)
+            event.processed = True
+            event.processed_at = timezone.now()
+            event.processing_error = ''
+            event.save(update_fields=['processed', 'processed_at', 'processing_error'])
+        return True
+    except Exception as exc:
+        logger.exception(f"Failed to process webhook event {webhook_event_id}")
+        WebhookEvent.objects.filter(pk=webhook_event_id).update(
+            processing_error=str(exc)[:2000],
+            retry_count=F('retry_count') + 1,
+            last_retry_at=timezone.now(),
+        )
+        return False
+
+
+@shared_task
+def process_stripe_webhook(webhook_event_id):
+    """Process a stored Stripe event."""
+    return process_webhook_event(webhook_event_id)
+
+
+@shared_task
+def drain_webhook_retries():
+    """Claim and retry eligible webhook events until none remain or time runs out."""
+    from apps.webhooks.retry import drain_retries
+    
+    return drain_retries()
+
+
+@shared_task
+def schedule_webhook_retries():
+    """Fan out retry workers; SKIP LOCKED claims keep them from overlapping."""
+    from django.conf import settings
+    
+    for _ in range(settings.WEBHOOK_RETRY_CONCURRENCY):
+        drain_webhook_retries.delay()
+
+
+@shared_task
+def compact_webhook_payloads():
+    """Move payloads of old processed events into compressed cold segments."""
+    from apps.webhooks.offload import compact_payloads
+    
+    return compact_payloads()
+
+
+@shared_task
+def deliver_endpoint_webhooks(endpoint_id):
+    """Deliver queued outbound webhooks for one endpoint within its concurrency limit."""
+    from apps.webhooks.outbound import deliver_for_endpoint
+    
+    return deliver_for_endpoint(endpoint_id)
+
+
+@shared_task
+def schedule_outbound_webhooks():
+    """Start workers for endpoints with due deliveries, up to each one's concurrency."""
+    from apps.webhooks.models import WebhookEndpoint
+    from apps.webhooks.outbound import due_endpoints
+    
+    due = dict(due_endpoints())
+    endpoints = WebhookEndpoint.objects.filter(pk__in=due, is_active=True).only(
+        'id', 'max_concurrency', 'max_batch_size'
+    )
+    for endpoint in endpoints:
+        batches = -(-due[endpoint.pk] // max(endpoint.max_batch_size, 1))
+        for _ in range(min(endpoint.max_concurrency, batches)):
+            deliver_endpoint_webhooks.delay(str(endpoint.pk))
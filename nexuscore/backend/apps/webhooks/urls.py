@@ -0,0 +1,11 @@
+"""
+Webhook URLs for NexusCore.
+"""
+
+from django.urls import path
+
+from apps.webhooks import views
+
+urlpatterns = [
+    path('webhooks/stripe/', views.stripe_webhook, name='stripe_webhook'),
+]
@@ -0,0 +1,49 @@
+"""
+Outbound webhook URL checks.
+
+Endpoint URLs are customer-supplied and fetched from inside our network, so they
+must be https and every address the host resolves to must be publicly routable:
+private, loopback, link-local (including the 169.254.169.254 metadata service),
+shared, reserved and multicast ranges are rejected. The check runs when an
+endpoint is saved and again before every delivery, because DNS can change after
+the endpoint was registered.
+"""
+
+import ipaddress
+import socket
+from urllib.parse import urlsplit
+
+from django.core.exceptions import ValidationError
+
+
+def _is_public(address):
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def endpoint_url_error(url):
+    """Why ``url`` may not receive webhooks, or None if it may."""
+    parsed = urlsplit(url)
+    if parsed.scheme != 'https':
+        return 'Webhook endpoints must use https.'
+    if not parsed.hostname:
+        return 'Webhook endpoint URL has no host.'
+    try:
+        port = parsed.port or 443
+        addresses = socket.getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+    except ValueError:
+        return 'Webhook endpoint URL has an invalid port.'
+    except OSError:
+        return f"{parsed.hostname} does not resolve."
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if not _is_public(address):
+            return f"{parsed.hostname} resolves to a non-public address ({address})."
+    return None
+
+
+def validate_endpoint_url(url):
+    error = endpoint_url_error(url)
+    if error:
+        raise ValidationError(error)
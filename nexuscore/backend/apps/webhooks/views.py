@@ -0,0 +1,65 @@
+"""
+Webhook endpoints for NexusCore.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from apps.webhooks.dedupe import is_known, mark_seen
+from apps.webhooks.ingest import (
+    SignatureVerificationError,
+    parse_event_envelope,
+    store_event,
+    verify_stripe_signature,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    """Verify, persist and acknowledge a Stripe event; processing is queued."""
+    started = time.perf_counter()
+    payload = request.body
+    
+    try:
+        verify_stripe_signature(
+            payload,
+            request.META.get('HTTP_STRIPE_SIGNATURE', ''),
+            settings.STRIPE_WEBHOOK_SECRET,
+            tolerance=settings.STRIPE_WEBHOOK_TOLERANCE_SECONDS,
+        )
+        event_id, event_type = parse_event_envelope(payload)
+    except SignatureVerificationError as exc:
+        logger.warning(f"Rejected Stripe webhook: {exc}")
+        return JsonResponse({'error': 'Invalid signature'}, status=400)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid payload'}, status=400)
+    
+    # Known duplicates are acknowledged without a database round trip
+    if is_known('stripe', event_id):
+        return JsonResponse({'received': True, 'duplicate': True})
+    
+    # Marked only once the row is committed, so a failed insert never hides the retry
+    webhook_event_id = store_event('stripe', event_id, event_type, payload)
+    mark_seen('stripe', event_id, webhook_event_id is not None)
+    if webhook_event_id is not None:
+        from apps.webhooks.tasks import process_stripe_webhook
+        
+        try:
+            process_stripe_webhook.delay(str(webhook_event_id))
+        except Exception:
+            # The row is durable; the retry scheduler will pick it up
+            logger.exception(f"Could not enqueue Stripe event {event_id}")
+    
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms > settings.WEBHOOK_ACK_BUDGET_MS:
+        logger.warning(f"Stripe webhook {event_id} acknowledged in {elapsed_ms:.1f}ms (over budget)")
+    
+    return JsonResponse({'received': True, 'duplicate': webhook_event_id is None})
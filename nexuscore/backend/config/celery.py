@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.schedules import crontab
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.development')
@@ -16,8 +17,25 @@ app.autodiscover_tasks()
 # Configure task routing
 app.conf.task_routes = {
     'apps.webhooks.tasks.process_stripe_webhook': {'queue': 'high'},
+    'apps.webhooks.tasks.drain_webhook_retries': {'queue': 'default'},
+    'apps.webhooks.tasks.schedule_webhook_retries': {'queue': 'default'},
+    'apps.webhooks.tasks.compact_webhook_payloads': {'queue': 'low'},
+    'apps.webhooks.tasks.deliver_endpoint_webhooks': {'queue': 'default'},
+    'apps.webhooks.tasks.schedule_outbound_webhooks': {'queue': 'default'},
     'apps.billing.tasks.generate_invoice_pdf': {'queue': 'default'},
+    'apps.billing.tasks.generate_invoice_pdfs': {'queue': 'default'},
+    'apps.billing.tasks.renew_due_subscriptions': {'queue': 'default'},
+    'apps.billing.tasks.persist_idempotency_record': {'queue': 'default'},
+    'apps.billing.tasks.flush_usage_counters': {'queue': 'default'},
+    'apps.events.tasks.flush_event_spool': {'queue': 'default'},
+    'apps.events.tasks.maintain_event_partitions': {'queue': 'low'},
+    'apps.events.tasks.rollup_events': {'queue': 'default'},
+    'apps.events.tasks.reconcile_event_rollups': {'queue': 'low'},
+    'apps.events.tasks.compact_event_rollups': {'queue': 'low'},
     'apps.privacy.tasks.enforce_pdpa_retention': {'queue': 'low'},
+    'apps.privacy.tasks.run_retention_policies': {'queue': 'low'},
+    'apps.privacy.tasks.monitor_dsar_sla': {'queue': 'default'},
+    'apps.privacy.tasks.execute_dsar_erasure': {'queue': 'low'},
     'apps.billing.tasks.send_dunning_emails': {'queue': 'low'},
 }
 
@@ -33,4 +51,60 @@ app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
-)
\ No newline at end of file
+)
+
+# Periodic tasks (synced into django_celery_beat's DatabaseScheduler)
+app.conf.beat_schedule = {
+    'renew-due-subscriptions': {
+        'task': 'apps.billing.tasks.renew_due_subscriptions',
+        'schedule': crontab(minute=5),
+    },
+    'flush-usage-counters': {
+        'task': 'apps.billing.tasks.flush_usage_counters',
+        'schedule': 60.0,
+    },
+    'flush-event-spool': {
+        'task': 'apps.events.tasks.flush_event_spool',
+        'schedule': 5.0,
+    },
+    'maintain-event-partitions': {
+        'task': 'apps.events.tasks.maintain_event_partitions',
+        'schedule': crontab(hour=2, minute=15),
+    },
+    'rollup-events': {
+        'task': 'apps.events.tasks.rollup_events',
+        'schedule': crontab(minute='*/5'),
+    },
+    'reconcile-event-rollups': {
+        'task': 'apps.events.tasks.reconcile_event_rollups',
+        'schedule': crontab(minute=20),
+    },
+    'compact-event-rollups': {
+        'task': 'apps.events.tasks.compact_event_rollups',
+        'schedule': crontab(hour=2, minute=45),
+    },
+    'schedule-webhook-retries': {
+        'task': 'apps.webhooks.tasks.schedule_webhook_retries',
+        'schedule': 30.0,
+    },
+    'schedule-outbound-webhooks': {
+        'task': 'apps.webhooks.tasks.schedule_outbound_webhooks',
+        'schedule': 10.0,
+    },
+    'compact-webhook-payloads': {
+        'task': 'apps.webhooks.tasks.compact_webhook_payloads',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'monitor-dsar-sla': {
+        'task': 'apps.privacy.tasks.monitor_dsar_sla',
+        'schedule': crontab(minute='*/15'),
+    },
+    'run-retention-policies': {
+        'task': 'apps.privacy.tasks.run_retention_policies',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'send-dunning-emails': {
+        'task': 'apps.billing.tasks.send_dunning_emails',
+        'schedule': crontab(hour=9, minute=0),
+    },
+}
\ No newline at end of file
@@ -86,6 +86,8 @@ MIDDLEWARE = [
     # Custom middleware
     'apps.core.middleware.SecurityHeadersMiddleware',
     'apps.core.middleware.RateLimitMiddleware',
+    'apps.core.middleware.IdempotencyMiddleware',
+    'apps.core.middleware.EventFlushMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -148,6 +150,48 @@ CACHES = {
     }
 }
 
+# Plan catalog: seconds between checks of the shared Redis catalog version
+PLAN_CATALOG_VERSION_CHECK_SECONDS = int(get_env_variable('PLAN_CATALOG_VERSION_CHECK_SECONDS', '5'))
+
+# Compiled per-organization entitlements
+ENTITLEMENTS_VERSION_CHECK_SECONDS = int(get_env_variable('ENTITLEMENTS_VERSION_CHECK_SECONDS', '5'))
+ENTITLEMENTS_CACHE_TIMEOUT = int(get_env_variable('ENTITLEMENTS_CACHE_TIMEOUT', str(24 * 3600)))
+DEFAULT_ENTITLEMENTS = {'features': {}, 'limits': {}}
+
+# Usage metering: 'month' metrics reset each calendar month, 'total' are gauges
+METERED_METRICS = {
+    'api_calls': 'month',
+    'seats': 'total',
+    'storage_bytes': 'total',
+}
+METERING_COUNTER_TTL_SECONDS = int(get_env_variable('METERING_COUNTER_TTL_SECONDS', str(62 * 24 * 3600)))
+
+# Idempotency-Key handling (IdempotencyMiddleware)
+IDEMPOTENCY_TTL_SECONDS = int(get_env_variable('IDEMPOTENCY_TTL_SECONDS', str(24 * 3600)))
+IDEMPOTENCY_LOCK_SECONDS = int(get_env_variable('IDEMPOTENCY_LOCK_SECONDS', '60'))
+IDEMPOTENCY_WAIT_SECONDS = float(get_env_variable('IDEMPOTENCY_WAIT_SECONDS', '10'))
+
+# Rate limiting (RateLimitMiddleware). 'key' combines 'ip', 'user' and
+# 'organization'; an empty key limits the route as a whole. 'burst' defaults to
+# the rate's count.
+RATE_LIMIT_ENABLED = get_env_variable('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+RATE_LIMIT_RULES = [
+    {'name': 'auth-login', 'path': r'^/api/v1/auth/login/$', 'key': 'ip', 'rate': '5/m'},
+    {'name': 'auth-register', 'path': r'^/api/v1/auth/register/$', 'key': 'ip', 'rate': '5/m'},
+    {
+        'name': 'events-export',
+        'path': r'/organizations/(?P<organization_id>[0-9a-f-]+)/events/export/$',
+        'key': 'organization',
+        'rate': '10/h',
+        'burst': 3,
+    },
+]
+
+# Plan-tiered API quotas (PlanQuotaThrottle). Plans override these through
+# Plan.limits['api_rate'], e.g. {'default': '6000/h', 'exports': '20/h'}.
+API_QUOTA_DEFAULT_RATES = {'default': '1000/h'}
+API_QUOTA_MEMBERSHIP_CACHE_SECONDS = int(get_env_variable('API_QUOTA_MEMBERSHIP_CACHE_SECONDS', '60'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -216,11 +260,10 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_THROTTLE_CLASSES': [
         'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'apps.billing.throttling.PlanQuotaThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/hour',
-        'user': '1000/hour',
     },
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
@@ -257,6 +300,26 @@ CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 CELERY_TASK_REJECT_ON_WORKER_LOST = True
 CELERY_TASK_TRACK_STARTED = True
 
+# Subscription renewal invoicing
+BILLING_RENEWAL_CHUNK_SIZE = int(get_env_variable('BILLING_RENEWAL_CHUNK_SIZE', '500'))
+BILLING_RENEWAL_DUE_DAYS = int(get_env_variable('BILLING_RENEWAL_DUE_DAYS', '7'))
+
+# GST rollup verify/rebuild scans of the invoices table outlast the 5s statement_timeout
+GST_ROLLUP_SCAN_TIMEOUT_MS = int(get_env_variable('GST_ROLLUP_SCAN_TIMEOUT_MS', '600000'))
+
+# Dunning reminders for overdue invoices
+DUNNING_EMAIL_BATCH_SIZE = int(get_env_variable('DUNNING_EMAIL_BATCH_SIZE', '100'))
+
+# Invoice PDF rendering
+INVOICE_PDF_BATCH_SIZE = int(get_env_variable('INVOICE_PDF_BATCH_SIZE', '200'))
+INVOICE_PDF_UPLOAD_CONCURRENCY = int(get_env_variable('INVOICE_PDF_UPLOAD_CONCURRENCY', '8'))
+INVOICE_PDF_LINK_TTL_SECONDS = int(get_env_variable('INVOICE_PDF_LINK_TTL_SECONDS', '900'))  # Each presigned download link
+INVOICE_SUPPLIER = {
+    'name': get_env_variable('INVOICE_SUPPLIER_NAME', 'NexusCore Pte. Ltd.'),
+    'uen': get_env_variable('INVOICE_SUPPLIER_UEN', ''),
+    'gst_reg_no': get_env_variable('INVOICE_SUPPLIER_GST_REG_NO', ''),
+}
+
 # AWS S3 Configuration (Singapore Region REQUIRED)
 DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
 AWS_ACCESS_KEY_ID = get_env_variable('AWS_ACCESS_KEY_ID', '')
@@ -280,6 +343,67 @@ EMAIL_HOST_USER = get_env_variable('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = get_env_variable('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = get_env_variable('DEFAULT_FROM_EMAIL', 'noreply@nexuscore.sg')
 
+# Stripe webhooks
+STRIPE_WEBHOOK_SECRET = get_env_variable('STRIPE_WEBHOOK_SECRET', '')
+STRIPE_WEBHOOK_TOLERANCE_SECONDS = int(get_env_variable('STRIPE_WEBHOOK_TOLERANCE_SECONDS', '300'))
+WEBHOOK_ACK_BUDGET_MS = int(get_env_variable('WEBHOOK_ACK_BUDGET_MS', '50'))
+WEBHOOK_DEDUPE_ENABLED = get_env_variable('WEBHOOK_DEDUPE_ENABLED', 'True').lower() == 'true'
+# Stripe retries for up to three days
+WEBHOOK_DEDUPE_TTL_SECONDS = int(get_env_variable('WEBHOOK_DEDUPE_TTL_SECONDS', str(4 * 24 * 3600)))
+
+# Webhook retry scheduler
+WEBHOOK_RETRY_CONCURRENCY = int(get_env_variable('WEBHOOK_RETRY_CONCURRENCY', '4'))
+WEBHOOK_RETRY_BATCH_SIZE = int(get_env_variable('WEBHOOK_RETRY_BATCH_SIZE', '50'))
+WEBHOOK_RETRY_MAX_ATTEMPTS = int(get_env_variable('WEBHOOK_RETRY_MAX_ATTEMPTS', '8'))
+WEBHOOK_RETRY_BASE_SECONDS = int(get_env_variable('WEBHOOK_RETRY_BASE_SECONDS', '30'))
+WEBHOOK_RETRY_MAX_BACKOFF_SECONDS = int(get_env_variable('WEBHOOK_RETRY_MAX_BACKOFF_SECONDS', '21600'))
+WEBHOOK_RETRY_GRACE_SECONDS = int(get_env_variable('WEBHOOK_RETRY_GRACE_SECONDS', '60'))
+WEBHOOK_RETRY_TIME_BUDGET_SECONDS = int(get_env_variable('WEBHOOK_RETRY_TIME_BUDGET_SECONDS', '25'))
+
+# Buffered event writer
+EVENTS_BUFFER_SIZE = int(get_env_variable('EVENTS_BUFFER_SIZE', '500'))
+EVENTS_BUFFER_MAX_AGE_SECONDS = float(get_env_variable('EVENTS_BUFFER_MAX_AGE_SECONDS', '2.0'))
+EVENTS_SPOOL_ENABLED = get_env_variable('EVENTS_SPOOL_ENABLED', 'False').lower() == 'true'
+EVENTS_SPOOL_BATCH_SIZE = int(get_env_variable('EVENTS_SPOOL_BATCH_SIZE', '5000'))
+
+# Event table partitioning and retention
+EVENTS_PARTITION_MONTHS_AHEAD = int(get_env_variable('EVENTS_PARTITION_MONTHS_AHEAD', '3'))
+EVENTS_RETENTION_MONTHS = int(get_env_variable('EVENTS_RETENTION_MONTHS', '24'))
+EVENTS_MIGRATION_CHUNK_SIZE = int(get_env_variable('EVENTS_MIGRATION_CHUNK_SIZE', '10000'))
+# ms; partition counts and detaches outlast the connection-wide 5s statement_timeout
+EVENTS_MAINTENANCE_STATEMENT_TIMEOUT_MS = int(get_env_variable('EVENTS_MAINTENANCE_STATEMENT_TIMEOUT_MS', '900000'))
+
+# Event analytics rollups
+EVENTS_ROLLUP_LAG_SECONDS = int(get_env_variable('EVENTS_ROLLUP_LAG_SECONDS', '120'))
+EVENTS_ROLLUP_WINDOW_HOURS = int(get_env_variable('EVENTS_ROLLUP_WINDOW_HOURS', '6'))
+# Closed hours re-checked against raw events for late-committed (buffered/spooled) writes
+EVENTS_ROLLUP_RECONCILE_HOURS = int(get_env_variable('EVENTS_ROLLUP_RECONCILE_HOURS', '24'))
+EVENTS_ROLLUP_HOURLY_RETENTION_DAYS = int(get_env_variable('EVENTS_ROLLUP_HOURLY_RETENTION_DAYS', '14'))
+# Event types whose data keys get per-value counts, e.g. {'feature.used': ['feature']}
+EVENTS_ROLLUP_DIMENSIONS = {}
+
+# Outbound customer webhooks
+WEBHOOK_OUTBOUND_CONNECT_TIMEOUT_SECONDS = float(get_env_variable('WEBHOOK_OUTBOUND_CONNECT_TIMEOUT_SECONDS', '3'))
+WEBHOOK_OUTBOUND_TIMEOUT_SECONDS = float(get_env_variable('WEBHOOK_OUTBOUND_TIMEOUT_SECONDS', '10'))
+WEBHOOK_OUTBOUND_TIME_BUDGET_SECONDS = int(get_env_variable('WEBHOOK_OUTBOUND_TIME_BUDGET_SECONDS', '25'))
+WEBHOOK_OUTBOUND_MAX_ATTEMPTS = int(get_env_variable('WEBHOOK_OUTBOUND_MAX_ATTEMPTS', '12'))
+WEBHOOK_OUTBOUND_BACKOFF_BASE_SECONDS = int(get_env_variable('WEBHOOK_OUTBOUND_BACKOFF_BASE_SECONDS', '30'))
+WEBHOOK_OUTBOUND_MAX_BACKOFF_SECONDS = int(get_env_variable('WEBHOOK_OUTBOUND_MAX_BACKOFF_SECONDS', '21600'))
+WEBHOOK_OUTBOUND_SLOW_MS = int(get_env_variable('WEBHOOK_OUTBOUND_SLOW_MS', '5000'))
+WEBHOOK_OUTBOUND_CIRCUIT_THRESHOLD = int(get_env_variable('WEBHOOK_OUTBOUND_CIRCUIT_THRESHOLD', '5'))
+WEBHOOK_OUTBOUND_CIRCUIT_OPEN_SECONDS = int(get_env_variable('WEBHOOK_OUTBOUND_CIRCUIT_OPEN_SECONDS', '60'))
+WEBHOOK_OUTBOUND_POOL_HOSTS = int(get_env_variable('WEBHOOK_OUTBOUND_POOL_HOSTS', '100'))
+WEBHOOK_OUTBOUND_POOL_SIZE = int(get_env_variable('WEBHOOK_OUTBOUND_POOL_SIZE', '10'))
+
+# Webhook payload cold offload
+WEBHOOK_PAYLOAD_OFFLOAD_AFTER_DAYS = int(get_env_variable('WEBHOOK_PAYLOAD_OFFLOAD_AFTER_DAYS', '30'))
+WEBHOOK_PAYLOAD_SEGMENT_SIZE = int(get_env_variable('WEBHOOK_PAYLOAD_SEGMENT_SIZE', '500'))
+
+# Retention purges
+RETENTION_BATCH_PAUSE_SECONDS = float(get_env_variable('RETENTION_BATCH_PAUSE_SECONDS', '0.2'))
+RETENTION_TIME_BUDGET_SECONDS = int(get_env_variable('RETENTION_TIME_BUDGET_SECONDS', '1200'))
+WEBHOOK_EVENT_RETENTION_DAYS = int(get_env_variable('WEBHOOK_EVENT_RETENTION_DAYS', '90'))
+
 # Sentry Configuration
 SENTRY_DSN = get_env_variable('SENTRY_DSN', '')
 SENTRY_ENVIRONMENT = get_env_variable('SENTRY_ENVIRONMENT', 'development')
@@ -375,4 +499,13 @@ SITE_URL = get_env_variable('SITE_URL', 'http://localhost:3000')
 # Feature Flags
 FEATURE_PAYNOW_ENABLED = get_env_variable('FEATURE_PAYNOW_ENABLED', 'True').lower() == 'true'
 FEATURE_DEMO_MODE = get_env_variable('FEATURE_DEMO_MODE', 'False').lower() == 'true'
-PDPA_DSAR_SLA_HOURS = int(get_env_variable('PDPA_DSAR_SLA_HOURS', '72'))
\ No newline at end of file
+PDPA_DSAR_SLA_HOURS = int(get_env_variable('PDPA_DSAR_SLA_HOURS', '72'))
+PDPA_DSAR_SLA_WARNING_HOURS = int(get_env_variable('PDPA_DSAR_SLA_WARNING_HOURS', '24'))  # 'approaching' window before the deadline
+PDPA_DPO_EMAIL = get_env_variable('PDPA_DPO_EMAIL', '')  # Breach alerts; logged only when empty
+PDPA_EXPORT_TTL_DAYS = int(get_env_variable('PDPA_EXPORT_TTL_DAYS', '7'))  # How long a finished export stays downloadable
+PDPA_EXPORT_LINK_TTL_SECONDS = int(get_env_variable('PDPA_EXPORT_LINK_TTL_SECONDS', '900'))  # Each presigned link; STS credentials expire sooner than 7 days
+PDPA_EXPORT_PART_SIZE = int(get_env_variable('PDPA_EXPORT_PART_SIZE', str(8 * 1024 * 1024)))
+PDPA_ANONYMIZE_CHUNK_SIZE = int(get_env_variable('PDPA_ANONYMIZE_CHUNK_SIZE', '5000'))
+PDPA_ERASURE_BATCH_PAUSE_SECONDS = float(get_env_variable('PDPA_ERASURE_BATCH_PAUSE_SECONDS', '0.1'))
+PDPA_ERASURE_TIME_BUDGET_SECONDS = int(get_env_variable('PDPA_ERASURE_TIME_BUDGET_SECONDS', '1200'))
+PDPA_ERASURE_DEFAULT_ROWS_PER_SECOND = int(get_env_variable('PDPA_ERASURE_DEFAULT_ROWS_PER_SECOND', '2000'))